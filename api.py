@@ -0,0 +1,191 @@
+# api.py
+# JSON API /api/v1 для мобильного приложения и киоска запчастей.
+# Поля ресурсов те же, что отдают to_dict() моделей; выбираются только
+# запрошенные колонки (?fields=), строки читаются как кортежи Core без
+# создания ORM-объектов и сразу сериализуются (orjson, если установлен).
+# Списки — курсорная пагинация, ?ids=1,2,3 — пачка записей одним запросом.
+import json
+from datetime import date, datetime
+from quart import Blueprint, request, session, Response
+from sqlalchemy import select
+from models import reader, Client, Car, Part, Order, StockSnapshot, ORDER_STATUSES
+from inventory import SNAPSHOT_STOCK
+from pagination import PAGE_SIZE, MAX_PAGE_SIZE, apply_keyset, split_page, parse_limit
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson не обязателен
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+STAFF = ('admin', 'manager', 'master')
+
+# Ресурс: модель, поля (как в to_dict), роли, фильтры ?name=int;
+# columns/join — поля из других таблиц
+RESOURCES = {
+    'clients': {
+        'model': Client,
+        'fields': ('id', 'full_name', 'phone', 'email', 'address'),
+        'roles': STAFF,
+        'filters': (),
+    },
+    'cars': {
+        'model': Car,
+        'fields': ('id', 'client_id', 'make', 'model', 'year', 'vin'),
+        'roles': STAFF,
+        'filters': ('client_id',),
+    },
+    'parts': {
+        'model': Part,
+        'fields': ('id', 'sku', 'name', 'price', 'stock'),
+        'roles': STAFF + ('client',),
+        'filters': (),
+        # Остаток — из снимка склада, не из журнала движений
+        'columns': {'stock': SNAPSHOT_STOCK},
+        'join': (StockSnapshot, StockSnapshot.part_id == Part.id),
+    },
+    'orders': {
+        'model': Order,
+        'fields': ('id', 'client_id', 'user_id', 'assignee_id', 'status', 'created_at', 'description',
+                   'total'),
+        'roles': STAFF,
+        'filters': ('client_id', 'user_id', 'assignee_id'),
+        # Заказы листаются по (created_at, id) — как веб-списки, по тем же индексам
+        'keyset': 'created_at',
+    },
+}
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def json_response(payload, status: int = 200) -> Response:
+    return Response(dumps(payload), status=status, content_type='application/json')
+
+
+def error(message: str, status: int) -> Response:
+    return json_response({'error': message}, status)
+
+
+def parse_ids(value: str) -> list:
+    ids = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if part.isdigit() and int(part) not in ids:
+            ids.append(int(part))
+    return ids
+
+
+def select_fields(spec: dict, requested: str = None) -> list:
+    names = [f.strip() for f in (requested or '').split(',') if f.strip() in spec['fields']]
+    return names or list(spec['fields'])
+
+
+def _select(spec: dict, names: list):
+    table = spec['model'].__table__
+    computed = spec.get('columns', {})
+    stmt = select(*((computed[n] if n in computed else table.c[n]).label(n) for n in names))
+    if spec.get('join') is not None and any(n in computed for n in names):
+        stmt = stmt.select_from(spec['model']).outerjoin(*spec['join'])
+    return stmt
+
+
+def _check_access(spec: dict):
+    if not session.get('user_id'):
+        return error('Требуется вход', 401)
+    if session.get('user_role') not in spec['roles']:
+        return error('Доступ запрещён', 403)
+    return None
+
+
+@api.route('/<resource>')
+async def list_resource(resource):
+    spec = RESOURCES.get(resource)
+    if spec is None:
+        return error('Неизвестный ресурс', 404)
+    denied = _check_access(spec)
+    if denied is not None:
+        return denied
+
+    model = spec['model']
+    fields = select_fields(spec, request.args.get('fields'))
+    table = model.__table__
+
+    ids = parse_ids(request.args.get('ids'))
+    if ids:
+        if len(ids) > MAX_PAGE_SIZE:
+            return error(f'Не больше {MAX_PAGE_SIZE} id за запрос', 400)
+        # id нужен, чтобы вернуть записи в порядке запроса
+        columns = fields if 'id' in fields else ['id'] + fields
+        async with reader() as s:
+            rows = await s.execute(_select(spec, columns).where(table.c.id.in_(ids)))
+            by_id = {row[columns.index('id')]: row for row in rows}
+        found = [dict(zip(columns, by_id[i])) for i in ids if i in by_id]
+        if 'id' not in fields:
+            for item in found:
+                del item['id']
+        return json_response({'data': found, 'missing': [i for i in ids if i not in by_id]})
+
+    limit = parse_limit(request.args.get('limit'), default=PAGE_SIZE)
+    stmt_filters = []
+    for name in spec['filters']:
+        value = request.args.get(name, '')
+        if value:
+            if not value.isdigit():
+                return error(f'{name} должен быть числом', 400)
+            stmt_filters.append(table.c[name] == int(value))
+    if resource == 'orders' and request.args.get('status'):
+        if request.args['status'] not in ORDER_STATUSES:
+            return error('Неизвестный статус', 400)
+        stmt_filters.append(table.c.status == request.args['status'])
+
+    # Ключ курсора выбираем всегда, даже если поле не запрошено
+    keyset = spec.get('keyset')
+    key_fields = ['id', keyset] if keyset else ['id']
+    columns = fields + [f for f in key_fields if f not in fields]
+    stmt = _select(spec, columns).where(*stmt_filters)
+    cursor = request.args.get('cursor')
+    if keyset:
+        stmt = apply_keyset(stmt, table.c[keyset], table.c.id, cursor, limit)
+    else:
+        if cursor and cursor.isdigit():
+            stmt = stmt.where(table.c.id > int(cursor))
+        stmt = stmt.order_by(table.c.id).limit(limit + 1)
+
+    async with reader() as s:
+        rows = (await s.execute(stmt)).all()
+    if keyset:
+        rows, next_cursor = split_page(rows, limit, keyset)
+    else:
+        next_cursor = str(rows[limit - 1].id) if len(rows) > limit else None
+        rows = rows[:limit]
+    data = [dict(zip(fields, row)) for row in rows]
+    return json_response({'data': data, 'next_cursor': next_cursor})
+
+
+@api.route('/<resource>/<int:item_id>')
+async def get_resource(resource, item_id):
+    spec = RESOURCES.get(resource)
+    if spec is None:
+        return error('Неизвестный ресурс', 404)
+    denied = _check_access(spec)
+    if denied is not None:
+        return denied
+
+    fields = select_fields(spec, request.args.get('fields'))
+    table = spec['model'].__table__
+    async with reader() as s:
+        row = (await s.execute(_select(spec, fields).where(table.c.id == item_id))).first()
+    if row is None:
+        return error('Не найдено', 404)
+    return json_response({'data': dict(zip(fields, row))})
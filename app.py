@@ -1,9 +1,7 @@
 # app.py
-from quart import Quart
+from quart import Quart, jsonify
 from config import Config
 from routes import bp
-from models import async_session, User, create_all_tables
-from werkzeug.security import generate_password_hash
 import logging
 logging.basicConfig(level=logging.WARNING)
 
@@ -15,28 +13,88 @@ def create_app():
     from routes import bp
     app.register_blueprint(bp)
 
+    # JSON API для мобильного приложения и киоска
+    from api import api
+    app.register_blueprint(api)
+
+    # Хэши в URL статики и долгий Cache-Control для них
+    import httpcache
+    httpcache.init_app(app)
+
+    # Счётчики SQL-запросов на каждый HTTP-запрос
+    import instrumentation
+    from models import engine, read_engine
+    instrumentation.init_app(app, engine, read_engine)
+
+    # Метрики Prometheus на /metrics
+    import metrics
+    from reports import renderer
+    from mailer import pending_count
+    metrics.init_app(app, engine)
+    metrics.register_queue('reports', lambda: renderer.pending)
+    metrics.register_queue('outbox', pending_count)
+    import tasks
+    for queue in tasks.runner.queues:
+        metrics.register_queue(f'jobs_{queue}', lambda queue=queue: tasks.queue_depth(queue))
+
+    # Проба для балансировщика: только состояние пула, соединение не занимается
+    @app.route('/healthz')
+    async def healthz():
+        from models import engine, pool_status
+        pool = pool_status(engine)
+        saturated = bool(pool) and pool['in_use'] >= pool['size'] + pool['max_overflow']
+        return jsonify(status='saturated' if saturated else 'ok', pool=pool), 503 if saturated else 200
+
     @app.before_serving
     async def startup():
-        from models import create_all_tables, async_session, User
-        from sqlalchemy import select
-
-        await create_all_tables()
-
-        # Проверяем, есть ли админ
-        async with async_session() as s:
-            result = await s.execute(select(User).where(User.email == 'admin@autoservice.ru'))
-            admin = result.scalar_one_or_none()
-            if not admin:
-                new_admin = User(
-                    full_name='Админ Админович',
-                    email='admin@autoservice.ru',
-                    phone='+79990000000',
-                    password_hash=generate_password_hash('admin'),
-                    role='admin'
-                )
-                s.add(new_admin)
-                await s.commit()
+        import migrations
+
+        # В рабочем режиме только сверяем версию схемы; миграции, админ и
+        # счётчики — однократно через `python init_db.py`
+        if app.config['DB_STARTUP_MODE'] == 'bootstrap':
+            applied, created_admin = await migrations.bootstrap()
+            if created_admin:
                 print(" Админ создан.")
+        else:
+            await migrations.check_schema()
+
+        from models import engine, warm_up_pool
+        await warm_up_pool(engine, app.config['DB_POOL_WARMUP'])
+
+        # Фоновая отправка писем из очереди
+        from mailer import sender
+        sender.start()
+
+        # Рассылка событий по заказам между воркерами
+        from events import broker
+        await broker.start()
+
+        # Фоновые задачи (отчёты и т.п.), в том числе недоделанные до перезапуска
+        from tasks import runner
+        await runner.start()
+
+        # Периодическая свёртка складского журнала в снимок остатков
+        from inventory import compactor
+        compactor.start()
+
+        # Просроченные ключи повторной отправки заказов
+        import idempotency
+        await idempotency.purge()
+
+    @app.after_serving
+    async def shutdown():
+        from reports import renderer
+        from mailer import sender
+        import passwords
+        from events import broker
+        from tasks import runner
+        from inventory import compactor
+        await runner.stop()
+        await compactor.stop()
+        renderer.shutdown()
+        await sender.stop()
+        await broker.stop()
+        passwords.shutdown()
 
     return app
             
@@ -0,0 +1,100 @@
+# bench_list_rows.py
+# Чтение списка клиентов тремя способами на одной и той же выборке:
+#   orm        — select(Client).scalars().all(): сущности в identity map сессии
+#   core       — select(колонки).all(): строки Core, как list_rows() в routes.py
+#   namedtuple — те же строки, переложенные в collections.namedtuple
+# Для каждого: медиана времени выборки и память на строку (tracemalloc,
+# отдельным проходом — трассировка сама замедляет выборку).
+# Запуск: python bench_list_rows.py --rows 100000 [--runs 5]
+import argparse
+import asyncio
+import gc
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+
+
+async def load_orm(s, columns):
+    from sqlalchemy import select
+    from models import Client
+    return (await s.execute(select(Client))).scalars().all()
+
+
+async def load_core(s, columns):
+    from sqlalchemy import select
+    return (await s.execute(select(*columns))).all()
+
+
+ClientRow = namedtuple('ClientRow', 'id full_name phone email address')
+
+
+async def load_namedtuple(s, columns):
+    from sqlalchemy import select
+    return [ClientRow._make(row) for row in (await s.execute(select(*columns))).tuples()]
+
+
+MODES = {'orm': load_orm, 'core': load_core, 'namedtuple': load_namedtuple}
+
+
+async def measure(load, columns, runs: int) -> dict:
+    from models import async_session
+    timings = []
+    for _ in range(runs):
+        async with async_session() as s:
+            started = time.perf_counter()
+            rows = await load(s, columns)
+            timings.append(time.perf_counter() - started)
+            count = len(rows)
+            del rows
+    gc.collect()
+
+    # Память: то, что остаётся живым вместе со списком (сессия ORM держит identity map)
+    async with async_session() as s:
+        tracemalloc.start()
+        rows = await load(s, columns)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del rows
+    return {'rows': count, 'ms': statistics.median(timings) * 1000,
+            'bytes_per_row': current / count, 'peak_per_row': peak / count}
+
+
+async def main(args):
+    from sqlalchemy import insert
+    from models import async_session, create_all_tables, engine, Client
+    from routes import CLIENT_LIST_COLUMNS
+
+    await create_all_tables()
+    async with async_session() as s:
+        await s.execute(insert(Client), [
+            {'full_name': f'Клиент {i}', 'phone': f'+7{9000000000 + i}',
+             'email': f'client{i}@bench.local' if i % 2 else None, 'address': None}
+            for i in range(args.rows)
+        ])
+        await s.commit()
+
+    results = {mode: await measure(MODES[mode], CLIENT_LIST_COLUMNS, args.runs) for mode in MODES}
+    await engine.dispose()
+
+    base = results['orm']
+    print(f"{'режим':11} {'строк':>8} {'мс':>8} {'мкс/стр':>8} {'байт/стр':>9} {'пик/стр':>8}")
+    for mode, r in results.items():
+        print(f"{mode:11} {r['rows']:8} {r['ms']:8.0f} {r['ms'] * 1000 / r['rows']:8.2f} "
+              f"{r['bytes_per_row']:9.0f} {r['peak_per_row']:8.0f}"
+              + ('' if mode == 'orm' else
+                 f"   время {r['ms'] / base['ms'] - 1:+.0%}, память {r['bytes_per_row'] / base['bytes_per_row'] - 1:+.0%}"))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ORM-сущности против строк Core в списках')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    # Отдельная временная SQLite-база, чтобы не трогать рабочую
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_list_rows.db')
+    os.environ['DATABASE_URL'] = f'sqlite+aiosqlite:///{db_path}'
+    asyncio.run(main(args))
@@ -0,0 +1,254 @@
+# bench_load.py
+# Нагрузочный прогон основных страниц на данных из seed_data.py.
+# Параллельные "пользователи" (клиенты и менеджеры вперемешку) входят
+# и до конца прогона выполняют свои сценарии: вход, список заказов,
+# создание заказа, дашборд. Итог по каждому маршруту: запросы, ошибки,
+# rps и p50/p95/p99.
+# Режимы:
+#   по умолчанию — Quart test client в этом же процессе, база из DATABASE_URL
+#                  (SQLite или локальный Postgres);
+#   --url        — уже запущенный Hypercorn, например
+#                  hypercorn "app:create_app()" -b 127.0.0.1:8000 -w 4
+#   --seed-clients N — временная SQLite-база с N клиентами, для быстрой проверки.
+# --save run.json сохраняет результат, --compare run.json печатает разницу
+# с сохранённым прогоном (например, до и после изменения).
+# Запуск: python bench_load.py --users 20 --duration 30 [--save after.json --compare before.json]
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from bench_login import percentile
+
+PASSWORD = 'bench'
+DOMAIN = 'seed.local'
+
+
+def bench_email(role: str, n: int = 0) -> str:
+    # Те же адреса, что создаёт seed_data.py
+    return f'bench-{role}-{n}@{DOMAIN}'
+
+
+class InProcessSession:
+    """Сессия через Quart test client: без сети, cookies хранит сам клиент."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    async def request(self, method: str, path: str, form: dict = None) -> int:
+        response = await self.client.open(path, method=method, form=form)
+        await response.get_data()
+        return response.status_code
+
+    async def get_json(self, path: str, params: dict):
+        response = await self.client.get(path, query_string=params)
+        return await response.get_json()
+
+
+class HTTPSession:
+    """Сессия к живому серверу: urllib в пуле потоков, редиректы не выполняются."""
+
+    def __init__(self, base_url: str):
+        import http.cookiejar
+        import urllib.request
+
+        class NoRedirect(urllib.request.HTTPRedirectHandler):
+            def redirect_request(self, *args, **kwargs):
+                return None
+
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+
+    def _request(self, method, path, form):
+        import urllib.error
+        import urllib.parse
+        import urllib.request
+        data = urllib.parse.urlencode(form, doseq=True).encode() if form is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    async def request(self, method: str, path: str, form: dict = None) -> int:
+        return await asyncio.to_thread(self._request, method, path, form)
+
+    def _get_json(self, path, params):
+        import urllib.parse
+        with self.opener.open(f'{self.base_url}{path}?{urllib.parse.urlencode(params)}', timeout=60) as response:
+            return json.loads(response.read())
+
+    async def get_json(self, path: str, params: dict):
+        return await asyncio.to_thread(self._get_json, path, params)
+
+
+class Recorder:
+    def __init__(self):
+        self.timings = {}
+        self.errors = {}
+
+    async def call(self, session, route: str, method: str, path: str, form: dict = None, expect=(200,)):
+        started = time.perf_counter()
+        try:
+            status = await session.request(method, path, form)
+        except Exception:
+            status = None
+        elapsed = (time.perf_counter() - started) * 1000
+        self.timings.setdefault(route, []).append(elapsed)
+        if status not in expect:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        return status
+
+    def summary(self, wall: float) -> dict:
+        routes = {}
+        for route, values in sorted(self.timings.items()):
+            routes[route] = {
+                'count': len(values),
+                'errors': self.errors.get(route, 0),
+                'rps': len(values) / wall if wall else 0.0,
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+            }
+        return routes
+
+
+async def login(rec, session, role: str, n: int):
+    path = '/login' if role == 'client' else '/staff/login'
+    await rec.call(session, f'POST {path}', 'POST', path,
+                   {'email': bench_email(role, n), 'password': PASSWORD}, expect=(302,))
+
+
+async def client_scenario(rec, session, rnd, n, ids):
+    choice = rnd.random()
+    if choice < 0.15:
+        await login(rec, session, 'client', n)
+    elif choice < 0.55:
+        await rec.call(session, 'GET /my_orders', 'GET', '/my_orders')
+    else:
+        await rec.call(session, 'GET /add_order', 'GET', '/add_order')
+        parts = rnd.sample(ids['parts'], min(len(ids['parts']), rnd.randint(0, 2)))
+        await rec.call(session, 'POST /add_order', 'POST', '/add_order',
+                       {'client_id': str(rnd.choice(ids['clients'])), 'description': 'Нагрузочный заказ',
+                        'part_ids': [str(p) for p in parts]}, expect=(302,))
+
+
+async def manager_scenario(rec, session, rnd, n, ids):
+    choice = rnd.random()
+    if choice < 0.45:
+        await rec.call(session, 'GET /all_orders', 'GET', '/all_orders')
+    elif choice < 0.7:
+        status = rnd.choice(('new', 'in_progress', 'completed'))
+        await rec.call(session, 'GET /all_orders?status', 'GET', f'/all_orders?status={status}')
+    elif choice < 0.95:
+        await rec.call(session, 'GET /reports', 'GET', '/reports')
+    else:
+        await login(rec, session, 'manager', n)
+
+
+async def fetch_ids(session_factory) -> dict:
+    # id клиентов и запчастей для формы заказа — через JSON API, одинаково в обоих режимах
+    session = session_factory()
+    await session.request('POST', '/staff/login', {'email': bench_email('manager'), 'password': PASSWORD})
+    ids = {}
+    for resource in ('clients', 'parts'):
+        payload = await session.get_json(f'/api/v1/{resource}', {'fields': 'id', 'limit': 100})
+        ids[resource] = [item['id'] for item in (payload or {}).get('data', [])]
+    if not ids.get('clients'):
+        raise SystemExit("В базе нет данных или учётных записей bench-*: сначала python seed_data.py")
+    return ids
+
+
+async def run_load(session_factory, users: int = 10, duration: float = 10, bench_clients: int = 20,
+                   bench_managers: int = 2, seed: int = 1) -> dict:
+    ids = await fetch_ids(session_factory)
+    rec = Recorder()
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user(i):
+        rnd = random.Random(seed * 1000 + i)
+        role = 'manager' if i % 4 == 3 else 'client'
+        n = i % (bench_managers if role == 'manager' else bench_clients)
+        session = session_factory()
+        await login(rec, session, role, n)
+        scenario = manager_scenario if role == 'manager' else client_scenario
+        while time.perf_counter() < deadline:
+            await scenario(rec, session, rnd, n, ids)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(i) for i in range(users)))
+    return rec.summary(time.perf_counter() - started)
+
+
+def print_summary(routes: dict, baseline: dict = None):
+    print(f"{'маршрут':26} {'запросы':>8} {'ошибки':>7} {'rps':>8} "
+          f"{'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8}")
+    for route, r in routes.items():
+        line = (f"{route:26} {r['count']:8} {r['errors']:7} {r['rps']:8.1f} "
+                f"{r['p50']:8.1f} {r['p95']:8.1f} {r['p99']:8.1f}")
+        before = (baseline or {}).get(route)
+        if before and before['p95']:
+            line += f"   p95 {(r['p95'] / before['p95'] - 1) * 100:+.0f}%"
+            if before['rps']:
+                line += f", rps {(r['rps'] / before['rps'] - 1) * 100:+.0f}%"
+        print(line)
+
+
+async def main(args):
+    if args.seed_clients:
+        from models import create_all_tables
+        from seed_data import seed
+        await create_all_tables()
+        await seed(clients=args.seed_clients, parts=max(50, args.seed_clients // 50),
+                   bench_users=args.bench_clients)
+
+    if args.url:
+        session_factory = lambda: HTTPSession(args.url)
+        target = args.url
+    else:
+        from app import create_app
+        app = create_app()
+        app.config['TESTING'] = True
+        session_factory = lambda: InProcessSession(app)
+        target = os.environ.get('DATABASE_URL', 'config')
+
+    routes = await run_load(session_factory, users=args.users, duration=args.duration,
+                            bench_clients=args.bench_clients, seed=args.seed)
+    if not args.url:
+        from models import engine
+        await engine.dispose()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['routes']
+    print(f"Цель: {target}, пользователей {args.users}, {args.duration:.0f} с")
+    print_summary(routes, baseline)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'target': target, 'users': args.users, 'duration': args.duration,
+                       'routes': routes}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон по основным страницам')
+    parser.add_argument('--users', type=int, default=10, help='параллельных пользователей')
+    parser.add_argument('--duration', type=float, default=10, help='секунд')
+    parser.add_argument('--url', help='адрес запущенного сервера; без него — test client')
+    parser.add_argument('--bench-clients', type=int, default=20, help='как --bench-users в seed_data.py')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--seed-clients', type=int, default=0,
+                        help='создать временную SQLite-базу с таким числом клиентов')
+    parser.add_argument('--save', help='сохранить результат в JSON')
+    parser.add_argument('--compare', help='сравнить с сохранённым результатом')
+    args = parser.parse_args()
+
+    if args.seed_clients and not args.url:
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench_load.db')
+        os.environ['DATABASE_URL'] = f'sqlite+aiosqlite:///{db_path}'
+    asyncio.run(main(args))
@@ -0,0 +1,80 @@
+# bench_login.py
+# Замер входа под нагрузкой: пачка одновременных логинов плюс обычные
+# запросы главной страницы. Сравниваются два режима проверки пароля:
+#   inline   — check_password_hash прямо в event loop (как было раньше)
+#   executor — через пул потоков из passwords.py
+# Запуск: python bench_login.py --logins 40 --pages 40
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    await coro
+    return (time.perf_counter() - start) * 1000
+
+
+async def run_mode(app, mode, emails, pages):
+    import routes
+    import passwords
+    from werkzeug.security import check_password_hash
+
+    async def inline_verify(password_hash, password):
+        return check_password_hash(password_hash, password)
+
+    routes.verify_password = inline_verify if mode == 'inline' else passwords.verify_password
+
+    client = app.test_client()
+    logins = [timed(client.post('/login', form={'email': e, 'password': 'bench'})) for e in emails]
+    views = [timed(client.get('/')) for _ in range(pages)]
+    started = time.perf_counter()
+    results = await asyncio.gather(*logins, *views)
+    wall = time.perf_counter() - started
+
+    login_ms, page_ms = results[:len(logins)], results[len(logins):]
+    print(f"{mode:9} logins={len(login_ms):4} "
+          f"login p50={percentile(login_ms, 50):8.1f}ms p99={percentile(login_ms, 99):8.1f}ms | "
+          f"page p50={percentile(page_ms, 50):8.1f}ms p99={percentile(page_ms, 99):8.1f}ms | "
+          f"wall {wall:.2f}s")
+
+
+async def main(args):
+    from app import create_app
+    from models import async_session, User, create_all_tables, engine
+    from passwords import hash_password
+
+    await create_all_tables()
+    password_hash = await hash_password('bench')
+    emails = [f'bench{i}@test.ru' for i in range(args.logins)]
+    async with async_session() as s:
+        s.add_all(User(full_name=f'Клиент {i}', email=e, phone='+7', password_hash=password_hash,
+                       role='client') for i, e in enumerate(emails))
+        await s.commit()
+
+    app = create_app()
+    for mode in ('inline', 'executor'):
+        await run_mode(app, mode, emails, args.pages)
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=40)
+    parser.add_argument('--pages', type=int, default=40)
+    args = parser.parse_args()
+
+    # Отдельная временная SQLite-база, чтобы не трогать рабочую
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_login.db')
+    os.environ['DATABASE_URL'] = f'sqlite+aiosqlite:///{db_path}'
+    asyncio.run(main(args))
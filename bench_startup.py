@@ -0,0 +1,71 @@
+# bench_startup.py
+# Холодный старт воркера: время импорта приложения + create_app()
+# и резидентная память процесса после этого. Каждый замер — в свежем
+# интерпретаторе, как при запуске нового воркера Hypercorn.
+# Запуск: python bench_startup.py --runs 7 [--max-ms 1500] [--max-rss-mb 120]
+# С порогами скрипт завершается с кодом 1, если медиана их превышает.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Модули, которые не должны загружаться при старте: нужны только отдельным маршрутам
+LAZY_MODULES = ('docx', 'lxml', 'aiosmtplib', 'email.mime.multipart')
+
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = (time.perf_counter() - started) * 1000
+rss_kb = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+print(json.dumps({
+    'ms': elapsed,
+    'rss_mb': rss_kb / 1024,
+    'loaded': [m for m in LAZY if m in sys.modules],
+}))
+'''
+
+
+def measure_once(env=None) -> dict:
+    code = f"LAZY = {LAZY_MODULES!r}\n" + PROBE
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                         check=True, cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--max-ms', type=float, default=None)
+    parser.add_argument('--max-rss-mb', type=float, default=None)
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.runs)]
+    ms = statistics.median(s['ms'] for s in samples)
+    rss = statistics.median(s['rss_mb'] for s in samples)
+    loaded = sorted({m for s in samples for m in s['loaded']})
+
+    print(f"import + create_app: median {ms:.0f} ms "
+          f"(min {min(s['ms'] for s in samples):.0f}, max {max(s['ms'] for s in samples):.0f})")
+    print(f"RSS after start:     median {rss:.1f} MB")
+    print(f"lazy modules loaded: {', '.join(loaded) or 'нет'}")
+
+    failed = bool(loaded)
+    if args.max_ms is not None and ms > args.max_ms:
+        print(f"Старт медленнее порога {args.max_ms:.0f} ms")
+        failed = True
+    if args.max_rss_mb is not None and rss > args.max_rss_mb:
+        print(f"Память больше порога {args.max_rss_mb:.0f} MB")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+import pytest
+import pytest_asyncio
+from app import create_app
+from models import engine, create_all_tables
+
+# --- Общие фикстуры для всех тестов ---
+
+@pytest.fixture
+def app_instance():
+    """Создает приложение для тестов."""
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+    })
+    return app
+
+@pytest_asyncio.fixture(autouse=True)
+async def db_tables():
+    """Создает таблицы перед тестом и закрывает соединения пула после него."""
+    await create_all_tables()
+    yield
+    await engine.dispose()
+
+@pytest.fixture
+def login_as():
+    """Вход в тестовом клиенте: роль и пользователь пишутся прямо в сессию."""
+    async def login(test_client, role='manager', user_id=1):
+        async with test_client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['user_role'] = role
+            sess['user_name'] = 'Тест'
+    return login
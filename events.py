@@ -0,0 +1,230 @@
+# events.py
+# Публикация событий по заказам для открытых страниц мастеров и клиентов.
+# Broker раздаёт события подписчикам этого воркера через ограниченные очереди;
+# доставка между воркерами — через сменный backend:
+#   'local'    — только внутри процесса (один воркер, тесты);
+#   'postgres' — LISTEN/NOTIFY: событие уходит в канал БД и приходит всем воркерам.
+# Медленный подписчик, переполнивший очередь, отключается — страница
+# переподключится и перечитает список. Так же отключаются все подписчики,
+# когда backend восстановил потерянное соединение LISTEN.
+import asyncio
+import json
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'order_events'
+MAX_DESCRIPTION = 500  # NOTIFY ограничен 8000 байт на событие
+STAFF_ROLES = ('admin', 'manager', 'master')
+RECONNECT_MIN, RECONNECT_MAX = 1, 30  # секунд между попытками переподключения LISTEN
+
+
+class Subscription:
+    def __init__(self, broker, accept, queue_size: int):
+        self._broker = broker
+        self.accept = accept
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def offer(self, event):
+        if self.overflowed or not self.accept(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Пропуск событий хуже отключения: клиент обновит страницу целиком
+            self.overflowed = True
+            self.end()
+
+    def end(self):
+        # None в очереди — конец потока для читающего get()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self._broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalBackend:
+    def __init__(self):
+        self._dispatch = None
+
+    async def start(self, dispatch, on_reconnect=None):
+        self._dispatch = dispatch
+
+    async def publish(self, payload: str):
+        self._dispatch(payload)
+
+    async def stop(self):
+        self._dispatch = None
+
+
+class PostgresBackend:
+    """LISTEN/NOTIFY через отдельное соединение asyncpg на воркер."""
+
+    def __init__(self, dsn: str):
+        # asyncpg не понимает префикс драйвера SQLAlchemy
+        self.dsn = dsn.replace('postgresql+asyncpg://', 'postgresql://', 1)
+        self._conn = None
+        self._lost = asyncio.Event()
+        self._task = None
+
+    async def start(self, dispatch, on_reconnect=None):
+        self._dispatch = dispatch
+        self._on_reconnect = on_reconnect
+        await self._connect()
+        self._task = asyncio.create_task(self._watch())
+
+    async def _connect(self):
+        import asyncpg
+        self._lost.clear()
+        self._conn = await asyncpg.connect(self.dsn)
+        self._conn.add_termination_listener(lambda conn: self._lost.set())
+        await self._conn.add_listener(CHANNEL, lambda conn, pid, channel, payload: self._dispatch(payload))
+
+    async def _watch(self):
+        # Соединение оборвалось (рестарт БД, сеть) — переподключаемся с паузой,
+        # удваивая её до RECONNECT_MAX
+        while True:
+            await self._lost.wait()
+            logger.warning("Соединение LISTEN %s потеряно, переподключаемся", CHANNEL)
+            delay = RECONNECT_MIN
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    await self._connect()
+                    break
+                except Exception as e:
+                    delay = min(delay * 2, RECONNECT_MAX)
+                    logger.warning("Переподключение LISTEN не удалось (%s), повтор через %s с", e, delay)
+            logger.info("Соединение LISTEN %s восстановлено", CHANNEL)
+            # События за время обрыва потеряны — страницы перечитают списки
+            if self._on_reconnect is not None:
+                self._on_reconnect()
+
+    async def publish(self, payload: str):
+        from sqlalchemy import text
+        from models import engine
+        async with engine.begin() as conn:
+            await conn.execute(text('SELECT pg_notify(:channel, :payload)'),
+                               {'channel': CHANNEL, 'payload': payload})
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+class Broker:
+    def __init__(self, backend, queue_size: int = 100):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._started = False
+
+    async def start(self):
+        await self.backend.start(self._dispatch, self._end_all)
+        self._started = True
+
+    async def stop(self):
+        self._started = False
+        await self.backend.stop()
+        self._end_all()
+
+    def _end_all(self):
+        for sub in list(self._subscribers):
+            sub.end()
+
+    def subscribe(self, accept=lambda event: True) -> Subscription:
+        sub = Subscription(self, accept, self.queue_size)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        self._subscribers.discard(sub)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _dispatch(self, payload: str):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Битое событие в канале %s: %r", CHANNEL, payload[:200])
+            return
+        for sub in list(self._subscribers):
+            sub.offer(event)
+
+    async def publish(self, event: dict):
+        # Ошибка доставки не должна ломать запрос, который уже записал данные
+        payload = json.dumps(event, ensure_ascii=False, default=str)
+        if not self._started:
+            # Backend не запущен (консольные скрипты, тесты) — только свои подписчики
+            self._dispatch(payload)
+            return
+        try:
+            await self.backend.publish(payload)
+        except Exception:
+            logger.exception("Не удалось опубликовать событие %s", event.get('type'))
+
+
+def make_backend(name: str):
+    if name == 'postgres':
+        return PostgresBackend(Config.SQLALCHEMY_DATABASE_URI)
+    return LocalBackend()
+
+
+broker = Broker(make_backend(Config.EVENTS_BACKEND), queue_size=Config.EVENTS_QUEUE_SIZE)
+
+
+# --- События по заказам ---
+
+def order_payload(order, client_name: str = None) -> dict:
+    return {
+        'id': order.id,
+        'client_id': order.client_id,
+        'client_name': client_name,
+        'user_id': order.user_id,
+        'assignee_id': order.assignee_id,
+        'status': order.status,
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+        'description': (order.description or '')[:MAX_DESCRIPTION],
+    }
+
+
+async def order_created(order, client_name: str = None):
+    await broker.publish({'type': 'order_created', 'order': order_payload(order, client_name)})
+
+
+async def order_status_changed(order, old_status: str, client_name: str = None):
+    await broker.publish({'type': 'order_status', 'old_status': old_status,
+                          'order': order_payload(order, client_name)})
+
+
+def viewer_filter(role: str, user_id: int):
+    # Сотрудники видят все заказы, клиент — только созданные им;
+    # о фоновых задачах узнаёт только тот, кто их поставил
+    def accept(event):
+        if 'job' in event:
+            return event['job'].get('user_id') == user_id
+        return role in STAFF_ROLES or event.get('order', {}).get('user_id') == user_id
+    return accept
@@ -0,0 +1,235 @@
+# exports.py
+# Потоковая выгрузка заказов, клиентов и склада в CSV и XLSX.
+# Строки читаются серверным курсором (stream + yield_per) пачками и сразу
+# уходят клиенту — память не зависит от размера таблицы. Выбор колонок
+# и фильтры по датам попадают в сам SQL-запрос.
+# XLSX собирается вручную (SpreadsheetML в zip) на лету без openpyxl:
+# zipfile пишет в несикаемый буфер, который генератор опустошает после каждой пачки.
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+from sqlalchemy import select
+from models import reader, Order, Client, Part, StockSnapshot
+from inventory import SNAPSHOT_STOCK
+from pagination import apply_date_range
+
+BATCH_SIZE = 1000
+
+# Набор данных: доступные колонки (имя -> выражение SQL), таблица для дат, роли
+DATASETS = {
+    'orders': {
+        'columns': {
+            'id': Order.id,
+            'created_at': Order.created_at,
+            'status': Order.status,
+            'client_id': Order.client_id,
+            'client_name': Client.full_name,
+            'user_id': Order.user_id,
+            'assignee_id': Order.assignee_id,
+            'description': Order.description,
+            'total': Order.total,
+        },
+        'default': ['id', 'created_at', 'status', 'client_name', 'description', 'total'],
+        'order_by': Order.id,
+        'date_column': Order.created_at,
+        'roles': ('admin', 'manager'),
+    },
+    'clients': {
+        'columns': {
+            'id': Client.id,
+            'full_name': Client.full_name,
+            'phone': Client.phone,
+            'email': Client.email,
+            'address': Client.address,
+        },
+        'default': ['id', 'full_name', 'phone', 'email', 'address'],
+        'order_by': Client.id,
+        'date_column': None,
+        'roles': ('admin', 'manager'),
+    },
+    'parts': {
+        'columns': {
+            'id': Part.id,
+            'sku': Part.sku,
+            'name': Part.name,
+            'price': Part.price,
+            'stock': SNAPSHOT_STOCK,
+        },
+        'default': ['id', 'sku', 'name', 'price', 'stock'],
+        'order_by': Part.id,
+        'date_column': None,
+        'roles': ('admin', 'manager', 'master'),
+    },
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def select_columns(dataset: str, requested: str = None):
+    # Неизвестные колонки молча отбрасываем; пустой выбор — колонки по умолчанию
+    spec = DATASETS[dataset]
+    names = [c.strip() for c in (requested or '').split(',') if c.strip() in spec['columns']]
+    return names or list(spec['default'])
+
+
+def build_query(dataset: str, columns: list, date_from=None, date_to=None, status: str = None):
+    spec = DATASETS[dataset]
+    stmt = select(*(spec['columns'][name].label(name) for name in columns))
+    if dataset == 'orders':
+        stmt = stmt.select_from(Order)
+        if 'client_name' in columns:
+            stmt = stmt.outerjoin(Client, Client.id == Order.client_id)
+        if status:
+            stmt = stmt.where(Order.status == status)
+    if dataset == 'parts':
+        stmt = stmt.select_from(Part)
+        if 'stock' in columns:
+            stmt = stmt.outerjoin(StockSnapshot, StockSnapshot.part_id == Part.id)
+    if spec['date_column'] is not None:
+        stmt = apply_date_range(stmt, spec['date_column'], date_from, date_to)
+    return stmt.order_by(spec['order_by'])
+
+
+async def stream_rows(stmt, batch_size: int = BATCH_SIZE):
+    # Сессия открывается внутри генератора: он работает уже после выхода из обработчика
+    async with reader() as s:
+        result = await s.stream(stmt.execution_options(yield_per=batch_size))
+        async for batch in result.partitions(batch_size):
+            yield batch
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(sep=' ') if hasattr(value, 'hour') else value.isoformat()
+    return str(value)
+
+
+async def stream_csv(columns: list, batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # BOM, чтобы Excel правильно открыл кириллицу
+    buf.write('\ufeff')
+    writer.writerow(columns)
+    async for batch in batches:
+        for row in batch:
+            writer.writerow([_cell_text(v) for v in row])
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+# --- XLSX ---
+
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+class _ChunkSink:
+    # Файлоподобный приёмник без seek: zipfile пишет в него с data descriptor'ами
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _xlsx_cell(value) -> str:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML.sub('', _cell_text(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values) -> str:
+    return '<row>' + ''.join(_xlsx_cell(v) for v in values) + '</row>'
+
+
+async def stream_xlsx(columns: list, batches, sheet_name: str = 'Export'):
+    sink = _ChunkSink()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+    archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+    archive.writestr('_rels/.rels', _ROOT_RELS)
+    archive.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name)))
+    archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+    yield sink.drain()
+
+    with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+        sheet.write((_SHEET_HEAD + _xlsx_row(columns)).encode('utf-8'))
+        async for batch in batches:
+            sheet.write(''.join(_xlsx_row(row) for row in batch).encode('utf-8'))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+        sheet.write(_SHEET_TAIL.encode('utf-8'))
+    archive.close()
+    yield sink.drain()
+
+
+def export_stream(dataset: str, fmt: str, columns: list, **filters):
+    stmt = build_query(dataset, columns, **filters)
+    batches = stream_rows(stmt)
+    if fmt == 'xlsx':
+        return stream_xlsx(columns, batches, sheet_name=dataset)
+    return stream_csv(columns, batches)
@@ -0,0 +1,110 @@
+# httpcache.py
+# Кэширование страниц-списков и статики.
+# Страница зависит от версий своих таблиц (счётчики version:<таблица> в
+# statcounter, их увеличивают те же транзакции, что меняют данные) и от
+# роли зрителя. Из этого считается строгий ETag: совпал — 304 без рендера,
+# не совпал — HTML берётся из LRU-кэша воркера или рендерится заново.
+# К URL статики добавляется ?v=<хэш содержимого>, такие ответы кэшируются надолго.
+import hashlib
+import os
+from collections import OrderedDict
+from quart import request, session, Response
+from config import Config
+from stats import table_versions
+
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+pages = LRUCache(Config.PAGE_CACHE_SIZE)
+
+_TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+_templates_version = None
+
+
+def templates_version() -> str:
+    # Меняется при выкладке новых шаблонов — старые ETag перестают совпадать
+    global _templates_version
+    if _templates_version is None:
+        digest = hashlib.sha1()
+        for name in sorted(os.listdir(_TEMPLATES_DIR)):
+            stat = os.stat(os.path.join(_TEMPLATES_DIR, name))
+            digest.update(f'{name}:{stat.st_mtime_ns}:{stat.st_size};'.encode())
+        _templates_version = digest.hexdigest()[:12]
+    return _templates_version
+
+
+async def cached_page(tables, render, vary=('user_role',)):
+    # render — корутина без аргументов, возвращающая HTML страницы
+    versions = await table_versions(tables) if tables else ()
+    key = (request.endpoint, request.query_string, tuple(session.get(k) for k in vary), versions)
+    etag = hashlib.sha1(repr((key, templates_version())).encode()).hexdigest()
+
+    if request.if_none_match.contains(etag):
+        response = Response('', status=304)
+    else:
+        body = pages.get(key)
+        if body is None:
+            body = await render()
+            pages.set(key, body)
+        response = Response(body, content_type='text/html; charset=utf-8')
+    response.set_etag(etag)
+    # Браузер хранит копию, но каждый раз переспрашивает по If-None-Match
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# --- Статика ---
+
+_static_hashes = {}
+
+
+def static_hash(static_folder: str, filename: str):
+    if filename not in _static_hashes:
+        try:
+            with open(os.path.join(static_folder, filename), 'rb') as f:
+                _static_hashes[filename] = hashlib.sha256(f.read()).hexdigest()[:12]
+        except OSError:
+            _static_hashes[filename] = None
+    return _static_hashes[filename]
+
+
+def init_app(app):
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            digest = static_hash(app.static_folder, values['filename'])
+            if digest:
+                values['v'] = digest
+
+    @app.after_request
+    async def static_cache_headers(response):
+        if request.endpoint == 'static' and request.args.get('v') and response.status_code in (200, 304):
+            response.headers['Cache-Control'] = f'public, max-age={Config.STATIC_MAX_AGE}, immutable'
+        return response
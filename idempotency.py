@@ -0,0 +1,70 @@
+# idempotency.py
+# Повторная отправка формы заказа (двойной клик, повтор прокси после таймаута)
+# не создаёт второй заказ и не резервирует запчасти ещё раз.
+# Форма несёт скрытый токен, внешний клиент может передать заголовок
+# Idempotency-Key. Ключ записывается первым действием в транзакции заказа:
+# уникальный индекс (user_id, key) заставляет параллельный повтор ждать
+# первую транзакцию. Закоммитилась — повтор получает её заказ; откатилась
+# (например, не хватило запчастей) — повтор выполняется заново.
+# Ключ живёт IDEMPOTENCY_TTL секунд.
+import secrets
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete
+from config import Config
+from models import writer, IdempotencyKey, dialect_insert
+
+KEY_HEADER = 'Idempotency-Key'
+FORM_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 64
+
+
+class KeyInFlight(ValueError):
+    pass
+
+
+def new_key() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def request_key(headers, form) -> str:
+    # Заголовок важнее токена формы; пустой ключ — без защиты от повтора
+    key = (headers.get(KEY_HEADER) or form.get(FORM_FIELD) or '').strip()
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"Ключ идемпотентности длиннее {MAX_KEY_LENGTH} символов.")
+    return key or None
+
+
+async def claim(s, user_id: int, key: str):
+    # None — ключ наш, заказ создаём; иначе id заказа, уже созданного с этим ключом
+    now = datetime.utcnow()
+    # Просроченные ключи пользователя убираем по пути — индекс (user_id, key) покрывает условие
+    await s.execute(delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id,
+                                                 IdempotencyKey.expires_at < now))
+    stmt = dialect_insert(s, IdempotencyKey).values(
+        user_id=user_id, key=key, created_at=now,
+        expires_at=now + timedelta(seconds=Config.IDEMPOTENCY_TTL),
+    ).on_conflict_do_nothing(index_elements=['user_id', 'key']).returning(IdempotencyKey.id)
+    if await s.scalar(stmt) is not None:
+        return None
+    order_id = await s.scalar(select(IdempotencyKey.order_id).where(
+        IdempotencyKey.user_id == user_id, IdempotencyKey.key == key))
+    if order_id is None:
+        raise KeyInFlight("Заказ с этой формы уже создаётся, обновите список заказов.")
+    return order_id
+
+
+async def complete(s, user_id: int, key: str, order_id: int):
+    await s.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .values(order_id=order_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def purge() -> int:
+    # Ключи неактивных пользователей — при старте воркера
+    async with writer() as s:
+        result = await s.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.utcnow()))
+        await s.commit()
+    return result.rowcount
@@ -1,10 +1,14 @@
 import asyncio
-from models import create_all_tables
+from migrations import bootstrap, latest_version
 
 async def main():
-    print("Создаём таблицы...")
-    await create_all_tables()
-    print(" Таблицы успешно созданы!")
+    print("Применяем миграции...")
+    applied, created_admin = await bootstrap()
+    if applied:
+        print(f" Применены миграции: {', '.join(map(str, applied))}")
+    print(f" Схема БД версии {latest_version()}.")
+    if created_admin:
+        print(" Админ создан.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+# instrumentation.py
+# Учёт SQL-запросов в рамках одного HTTP-запроса.
+# Слушатели событий SQLAlchemy пишут в объект QueryStats текущего запроса
+# (через ContextVar): сколько запросов, сколько времени в БД и какие
+# одинаковые выражения повторялись — типичный признак N+1.
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from quart import g, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('query_stats', default=None)
+_installed_engines = set()
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class QueryStats:
+    __slots__ = ('count', 'total_time', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        self.statements[_WHITESPACE.sub(' ', statement).strip()] += 1
+
+    def repeated(self, threshold: int):
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+def current_stats():
+    return _current.get()
+
+
+@contextmanager
+def track():
+    # Собирает статистику по всем запросам внутри блока (удобно в тестах и скриптах)
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def install(engine):
+    # Слушатели вешаются на движок один раз, сколько бы раз ни вызывали create_app()
+    sync_engine = getattr(engine, 'sync_engine', engine)
+    if id(sync_engine) in _installed_engines:
+        return
+    event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+    _installed_engines.add(id(sync_engine))
+
+
+def init_app(app, *engines):
+    for engine in engines:
+        install(engine)
+
+    @app.before_request
+    async def start_query_stats():
+        g.query_stats = QueryStats()
+        g.query_stats_token = _current.set(g.query_stats)
+
+    @app.after_request
+    async def report_query_stats(response):
+        stats = g.pop('query_stats', None)
+        token = g.pop('query_stats_token', None)
+        if stats is None:
+            return response
+        if token is not None:
+            _current.reset(token)
+
+        repeated = stats.repeated(app.config['SQL_REPEAT_THRESHOLD'])
+        if app.debug or app.config['SQL_DEBUG_HEADERS']:
+            response.headers['X-DB-Queries'] = str(stats.count)
+            response.headers['X-DB-Time-ms'] = f"{stats.total_time * 1000:.1f}"
+            response.headers['X-DB-Repeated'] = str(sum(n for _, n in repeated))
+
+        for sql, n in repeated:
+            logger.warning("Возможный N+1 в %s: %s раз за запрос: %s", request.path, n, sql[:200])
+
+        budget = app.config['SQL_QUERY_BUDGET']
+        if budget and stats.count > budget:
+            message = f"Превышен лимит SQL-запросов в {request.path}: {stats.count} > {budget}"
+            if app.config['SQL_BUDGET_MODE'] == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,229 @@
+# inventory.py
+# Складской учёт через журнал движений.
+# Любое изменение остатка — строка StockMovement: приход, резерв под заказ,
+# возврат, корректировка. Строки только добавляются (пачкой), поэтому заказы
+# на популярную запчасть не переписывают одну и ту же строку, а история
+# остаётся целиком.
+# Периодическая свёртка (Compactor) переносит сумму новых движений в
+# StockSnapshot. Склад, форма заказа, API и выгрузки читают снимок;
+# точный остаток (снимок + движения после него, по индексу (part_id, id))
+# считается только там, где от него зависит решение: резерв, корректировка.
+# На Postgres все записи движений по запчасти идут под
+# pg_advisory_xact_lock(LOCK_NAMESPACE, part_id): два резерва не уведут
+# остаток в минус, а у незакоммиченного движения id всегда больше уже
+# свёрнутых — свёртка его не пропустит. SQLite пишет под блокировкой всей базы.
+# Порядок блокировок в любой транзакции: сначала запчасти, потом счётчики
+# stats.bump() — иначе заказ и отмена заказа могут ждать друг друга.
+# Общий счётчик parts_stock для дашборда — сумма снимков: его двигает только
+# свёртка (под своей блокировкой) и удаление запчасти, а не каждое движение.
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy import select, insert, delete, func, text, literal
+from config import Config
+from models import writer, Part, StockMovement, StockSnapshot, order_part
+from stats import bump, touched
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAMESPACE = 7313002
+COMPACT_LOCK = 0  # part_id не бывает нулевым — ключ свёртки
+
+# Остаток для списков: только снимок, без суммирования журнала
+SNAPSHOT_STOCK = func.coalesce(StockSnapshot.stock, 0)
+
+
+class InsufficientStock(ValueError):
+    # shortfalls: [(part_id, название, нужно, в наличии), ...]
+    def __init__(self, shortfalls):
+        self.shortfalls = shortfalls
+        details = ', '.join(
+            f"{name} (нужно {need}, в наличии {have})" for _, name, need, have in shortfalls
+        )
+        super().__init__(f"Недостаточно запчастей на складе: {details}")
+
+
+def movement(part_id: int, kind: str, quantity: int, order_id: int = None) -> dict:
+    return {'part_id': part_id, 'kind': kind, 'quantity': quantity, 'order_id': order_id,
+            'created_at': datetime.utcnow()}
+
+
+def parts_with_stock():
+    # Запчасти с остатком из снимка — одна таблица в join, журнал не читается
+    return (select(Part.id, Part.sku, Part.name, Part.price, SNAPSHOT_STOCK.label('stock'))
+            .outerjoin(StockSnapshot, StockSnapshot.part_id == Part.id))
+
+
+async def lock_parts(s, part_ids):
+    # По возрастанию id, чтобы параллельные транзакции не взаимоблокировались
+    if s.get_bind().dialect.name != 'postgresql':
+        return
+    for part_id in sorted(set(part_ids)):
+        await s.execute(text('SELECT pg_advisory_xact_lock(:ns, :key)'),
+                        {'ns': LOCK_NAMESPACE, 'key': part_id})
+
+
+async def record(s, movements: list):
+    # Пачка движений одним executemany; нулевые не пишем.
+    # Общих строк-счётчиков здесь нет: parts_stock догоняет свёртка.
+    # Блокировки запчастей берутся раньше любых bump() транзакции.
+    movements = [m for m in movements if m['quantity']]
+    if not movements:
+        return
+    await lock_parts(s, [m['part_id'] for m in movements])
+    await s.execute(insert(StockMovement), movements)
+
+
+async def stock_levels(s, part_ids) -> dict:
+    # Точный остаток: снимок + движения после него. Нет запчасти — нет ключа.
+    pending = (
+        select(func.coalesce(func.sum(StockMovement.quantity), 0))
+        .where(StockMovement.part_id == Part.id,
+               StockMovement.id > func.coalesce(StockSnapshot.last_movement_id, 0))
+        .correlate(Part, StockSnapshot)
+        .scalar_subquery()
+    )
+    rows = await s.execute(
+        select(Part.id, SNAPSHOT_STOCK + pending)
+        .outerjoin(StockSnapshot, StockSnapshot.part_id == Part.id)
+        .where(Part.id.in_(list(part_ids)))
+    )
+    return dict(rows.all())
+
+
+async def reserve(s, counts: dict, order_id: int = None):
+    # Сначала пишем резерв, потом проверяем остаток: на SQLite первая запись
+    # берёт блокировку базы, на Postgres — record() берёт блокировки запчастей
+    part_ids = sorted(counts)
+    await record(s, [movement(pid, 'reservation', -counts[pid], order_id) for pid in part_ids])
+    levels = await stock_levels(s, part_ids)
+    missing = [pid for pid in part_ids if levels.get(pid, -1) < 0]
+    if not missing:
+        return
+
+    # Не хватило — откатываем и одним запросом собираем, чего именно и сколько
+    await s.rollback()
+    levels = await stock_levels(s, missing)
+    names = dict((await s.execute(select(Part.id, Part.name).where(Part.id.in_(missing)))).all())
+    raise InsufficientStock([
+        (pid, names.get(pid, f"ID {pid}"), counts[pid], levels.get(pid, 0)) for pid in missing
+    ])
+
+
+async def return_order_parts(s, order_id: int) -> int:
+    # Отменённый заказ возвращает на склад свои позиции
+    rows = (await s.execute(
+        select(order_part.c.part_id, order_part.c.quantity)
+        .join(Part, Part.id == order_part.c.part_id)
+        .where(order_part.c.order_id == order_id)
+    )).all()
+    await record(s, [movement(part_id, 'return', qty, order_id) for part_id, qty in rows])
+    return sum(qty for _, qty in rows)
+
+
+# --- Свёртка журнала в снимок ---
+
+def fresh_stock(part_ids=None):
+    # Сумма ещё не свёрнутых движений по каждой запчасти
+    fresh = (
+        select(StockMovement.part_id, func.sum(StockMovement.quantity).label('stock'),
+               func.max(StockMovement.id).label('last_movement_id'))
+        .select_from(StockMovement)
+        .join(Part, Part.id == StockMovement.part_id)
+        .outerjoin(StockSnapshot, StockSnapshot.part_id == StockMovement.part_id)
+        .where(StockMovement.id > func.coalesce(StockSnapshot.last_movement_id, 0))
+        .group_by(StockMovement.part_id)
+    )
+    if part_ids is not None:
+        fresh = fresh.where(StockMovement.part_id.in_(list(part_ids)))
+    return fresh
+
+
+def snapshot_upsert(dialect_name: str, fresh=None):
+    # INSERT ... ON CONFLICT: новые движения прибавляются к снимку запчасти.
+    # fresh — запрос fresh_stock() (INSERT ... SELECT) или None для .values(rows)
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(StockSnapshot)
+    if fresh is not None:
+        stmt = stmt.from_select(['part_id', 'stock', 'last_movement_id', 'updated_at'],
+                                fresh.add_columns(literal(datetime.utcnow())))
+    return stmt.on_conflict_do_update(
+        index_elements=['part_id'],
+        set_={'stock': StockSnapshot.stock + stmt.excluded.stock,
+              'last_movement_id': stmt.excluded.last_movement_id,
+              'updated_at': stmt.excluded.updated_at},
+    )
+
+
+def compact_statement(dialect_name: str, part_ids=None):
+    # Свёртка одним запросом — для миграции, без счётчика parts_stock
+    return snapshot_upsert(dialect_name, fresh_stock(part_ids))
+
+
+async def compact(part_ids=None, wait: bool = True) -> int:
+    # Возвращает число обновлённых снимков; wait=False — пропустить,
+    # если свёртку уже выполняет другой воркер
+    async with writer() as s:
+        dialect = s.get_bind().dialect.name
+        if dialect == 'postgresql':
+            # Две свёртки сразу прибавили бы одни и те же движения дважды
+            lock = 'pg_advisory_xact_lock' if wait else 'pg_try_advisory_xact_lock'
+            locked = await s.scalar(text(f'SELECT {lock}(:ns, :key)'),
+                                    {'ns': LOCK_NAMESPACE, 'key': COMPACT_LOCK})
+            if locked is False:
+                return 0
+        # Суммы читаются один раз и ими же пишется снимок: движение, закоммиченное
+        # между двумя запросами, не попадёт в снимок мимо счётчика
+        now = datetime.utcnow()
+        rows = [{**row, 'updated_at': now}
+                for row in (await s.execute(fresh_stock(part_ids))).mappings()]
+        if not rows:
+            return 0
+        await s.execute(snapshot_upsert(dialect), rows)
+        # Склад читает снимок: его кэш сбрасывается свёрткой, а не каждым заказом
+        await bump(s, {'parts_stock': sum(row['stock'] for row in rows), **touched('part')})
+        await s.commit()
+    return len(rows)
+
+
+async def delete_part_stock(s, part_id: int) -> dict:
+    # Перед удалением запчасти списываем остаток: журнал сходится.
+    # Возвращает дельты для bump() вызывающего: снимок уходит из parts_stock
+    await lock_parts(s, [part_id])
+    level = (await stock_levels(s, [part_id])).get(part_id, 0)
+    await record(s, [movement(part_id, 'adjustment', -level)])
+    stock = await s.scalar(delete(StockSnapshot).where(StockSnapshot.part_id == part_id)
+                           .returning(StockSnapshot.stock))
+    return {'parts_stock': -(stock or 0)}
+
+
+class Compactor:
+    def __init__(self, interval: int = 30):
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await compact(wait=False)
+            except Exception:
+                logger.exception("Ошибка свёртки складского журнала")
+            await asyncio.sleep(self.interval)
+
+
+compactor = Compactor(interval=Config.STOCK_COMPACT_INTERVAL)
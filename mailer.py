@@ -0,0 +1,237 @@
+# mailer.py
+# Исходящая почта через очередь в БД (таблица OutboxMessage).
+# Обработчик запроса только сохраняет письмо и сразу отвечает пользователю,
+# а фоновый OutboxSender забирает письма пачками и отправляет их через
+# небольшой пул уже авторизованных SMTP-соединений, с повторами и backoff.
+# aiosmtplib и email.mime подгружаются при первом использовании.
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func
+from config import Config
+from models import async_session, OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд письмо считается "взятым в работу" одним отправителем
+CLAIM_LEASE = 120
+
+
+def build_report_email(order_id: int, email_to: str, report: bytes, filename: str, mimetype: str):
+    from email import encoders
+    from email.mime.base import MIMEBase
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    msg = MIMEMultipart()
+    msg['From'] = Config.MAIL_USERNAME or Config.MAIL_DEFAULT_SENDER
+    msg['To'] = email_to
+    msg['Subject'] = f"Отчёт по заказу №{order_id}"
+
+    body = f"Здравствуйте!\n\nВо вложении отчёт по выполненным работам по заказу №{order_id}."
+    msg.attach(MIMEText(body, 'plain', 'utf-8'))
+
+    # Прикрепляем файл
+    part = MIMEBase(*mimetype.split('/'))
+    part.set_payload(report)
+    encoders.encode_base64(part)
+    part.add_header('Content-Disposition', 'attachment', filename=('utf-8', '', filename))
+    msg.attach(part)
+    return msg
+
+
+async def enqueue(msg):
+    async with async_session() as s:
+        s.add(OutboxMessage(
+            recipient=msg['To'],
+            subject=str(msg['Subject'])[:255],
+            payload=msg.as_bytes(),
+        ))
+        await s.commit()
+    sender.notify()
+
+
+async def pending_count() -> int:
+    async with async_session() as s:
+        return await s.scalar(
+            select(func.count(OutboxMessage.id)).where(OutboxMessage.status == 'pending')
+        )
+
+
+class SMTPPool:
+    """Несколько постоянных SMTP-соединений (STARTTLS + login один раз).
+
+    Настройки сервера читаются из Config в момент подключения,
+    поэтому в тестах MAIL_SERVER/MAIL_PORT можно подменить на локальный aiosmtpd.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle = []
+        self._slots = None
+
+    def _new_client(self):
+        import aiosmtplib
+        return aiosmtplib.SMTP(
+            hostname=Config.MAIL_SERVER,
+            port=Config.MAIL_PORT,
+            start_tls=Config.MAIL_USE_TLS,
+            username=Config.MAIL_USERNAME,
+            password=Config.MAIL_PASSWORD,
+        )
+
+    @asynccontextmanager
+    async def connection(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            smtp = self._idle.pop() if self._idle else None
+            if smtp is None or not smtp.is_connected:
+                smtp = self._new_client()
+                await smtp.connect()
+            try:
+                yield smtp
+            except BaseException:
+                # Соединение в неизвестном состоянии — в пул не возвращаем
+                smtp.close()
+                raise
+            self._idle.append(smtp)
+
+    async def send(self, envelope_from: str, recipient: str, payload: bytes):
+        import aiosmtplib
+        try:
+            async with self.connection() as smtp:
+                await smtp.sendmail(envelope_from, [recipient], payload)
+        except aiosmtplib.SMTPServerDisconnected:
+            # Сервер закрыл простаивающее соединение — один повтор на свежем
+            async with self.connection() as smtp:
+                await smtp.sendmail(envelope_from, [recipient], payload)
+
+    async def close(self):
+        import aiosmtplib
+        idle, self._idle = self._idle, []
+        for smtp in idle:
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+        self._slots = None
+
+
+class OutboxSender:
+    def __init__(self, pool_size: int = 2, batch_size: int = 20, max_attempts: int = 6,
+                 retry_base: int = 30, poll_interval: int = 10):
+        self.pool = SMTPPool(pool_size)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.poll_interval = poll_interval
+        self._task = None
+        self._wakeup = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.pool.close()
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.process_batch()
+            except Exception:
+                logger.exception("Ошибка фоновой отправки почты")
+                processed = 0
+            if processed >= self.batch_size:
+                continue  # очередь ещё не разобрана
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim_batch(self):
+        # Берём пачку готовых к отправке писем и продлеваем им next_attempt_at
+        # на время аренды: другой воркер их не возьмёт, а после падения
+        # процесса письма сами вернутся в очередь.
+        now = datetime.utcnow()
+        async with async_session() as s:
+            result = await s.execute(
+                select(OutboxMessage)
+                .where(OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= now)
+                .order_by(OutboxMessage.next_attempt_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            batch = result.scalars().all()
+            for msg in batch:
+                msg.next_attempt_at = now + timedelta(seconds=CLAIM_LEASE)
+            await s.commit()
+            return [(msg.id, msg.recipient, msg.payload, msg.attempts) for msg in batch]
+
+    async def _deliver(self, item):
+        import aiosmtplib
+        msg_id, recipient, payload, attempts = item
+        try:
+            await self.pool.send(Config.MAIL_USERNAME or Config.MAIL_DEFAULT_SENDER,
+                                 recipient, payload)
+            return None
+        except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+            logger.warning("Письмо %s не отправлено (попытка %s): %s", msg_id, attempts + 1, e)
+            return str(e) or e.__class__.__name__
+
+    async def process_batch(self) -> int:
+        batch = await self._claim_batch()
+        if not batch:
+            return 0
+
+        errors = await asyncio.gather(*(self._deliver(item) for item in batch))
+
+        now = datetime.utcnow()
+        sent_ids = [item[0] for item, error in zip(batch, errors) if error is None]
+        retries = []
+        for (msg_id, _, _, attempts), error in zip(batch, errors):
+            if error is None:
+                continue
+            attempts += 1
+            retries.append({
+                'id': msg_id,
+                'attempts': attempts,
+                'last_error': error,
+                'status': 'failed' if attempts >= self.max_attempts else 'pending',
+                'next_attempt_at': now + timedelta(seconds=self.retry_base * 2 ** (attempts - 1)),
+            })
+
+        async with async_session() as s:
+            if sent_ids:
+                await s.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id.in_(sent_ids))
+                    .values(status='sent', sent_at=now, last_error=None)
+                )
+            if retries:
+                await s.execute(update(OutboxMessage), retries)
+            await s.commit()
+        return len(batch)
+
+
+sender = OutboxSender(
+    pool_size=Config.MAIL_POOL_SIZE,
+    batch_size=Config.MAIL_BATCH_SIZE,
+    max_attempts=Config.MAIL_MAX_ATTEMPTS,
+    retry_base=Config.MAIL_RETRY_BASE,
+    poll_interval=Config.MAIL_POLL_INTERVAL,
+)
@@ -0,0 +1,169 @@
+# metrics.py
+# Метрики в текстовом формате Prometheus на /metrics.
+# Свой минимальный реестр (Counter / Histogram / Gauge), чтобы не тянуть
+# prometheus_client: на запрос приходится один perf_counter, bisect
+# по корзинам и пара обращений к dict. Значения для Gauge вычисляются
+# только в момент сбора. Каждый воркер Hypercorn отдаёт свои значения.
+import time
+from bisect import bisect_left
+from quart import g, request, Response
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _fmt(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in self._values.items():
+            yield f'{self.name}{_labels(self.labelnames, labels)} {_fmt(value)}'
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            # [счётчики по корзинам (последняя — +Inf), сумма, количество]
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = f'le="{_fmt(bound)}"'
+                yield f'{self.name}_bucket{_labels(self.labelnames, labels, (le,))} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {count}'
+
+
+class Gauge:
+    """Значение считается при сборе: callback возвращает [(labels, value), ...]."""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        REGISTRY.append(self)
+
+    async def collect_async(self):
+        result = self.callback()
+        if hasattr(result, '__await__'):
+            result = await result
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        for labels, value in result:
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_fmt(value)}')
+        return lines
+
+
+async def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        if isinstance(metric, Gauge):
+            if metric.callback is not None:
+                lines.extend(await metric.collect_async())
+        else:
+            lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+# --- HTTP ---
+REQUESTS = Counter('http_requests_total', 'HTTP requests by endpoint, method and status',
+                   ('endpoint', 'method', 'status'))
+LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency by endpoint',
+                    ('endpoint',))
+
+# --- Пул соединений БД ---
+POOL_CHECKOUT_WAIT = Histogram('db_pool_checkout_wait_seconds',
+                               'Time spent waiting for a pooled DB connection',
+                               buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+POOL_STATE = Gauge('db_pool_connections', 'DB pool connections by state', ('state',))
+
+# --- Фоновые очереди ---
+QUEUE_DEPTH = Gauge('background_queue_depth', 'Jobs waiting in background queues', ('queue',))
+
+_queue_sources = {}
+
+
+def register_queue(name: str, depth):
+    # depth — функция (или корутина) без аргументов, возвращающая длину очереди
+    _queue_sources[name] = depth
+
+
+async def _queue_depths():
+    result = []
+    for name, depth in _queue_sources.items():
+        value = depth()
+        if hasattr(value, '__await__'):
+            value = await value
+        result.append(((name,), value))
+    return result
+
+
+QUEUE_DEPTH.callback = _queue_depths
+
+
+def init_app(app, engine):
+    from models import pool_status
+    POOL_STATE.callback = lambda: [((state,), n) for state, n in pool_status(engine).items()]
+
+    @app.before_request
+    async def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    async def record_request(response):
+        started = g.pop('request_started', None)
+        endpoint = request.endpoint
+        if started is None or endpoint in (None, 'static', 'metrics', 'healthz'):
+            return response
+        LATENCY.observe(time.perf_counter() - started, endpoint)
+        REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        return response
+
+    async def metrics_view():
+        return Response(await render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,320 @@
+# migrations.py
+# Версионированные миграции схемы.
+# Применяются один раз командой `python init_db.py` (или при
+# DB_STARTUP_MODE=bootstrap), а рабочий воркер при старте только сверяет
+# номер версии одним запросом — без create_all и чтения каталога.
+# Каждая миграция идемпотентна (checkfirst), чтобы её можно было накатить
+# и на пустую базу, и на базу, созданную раньше через create_all.
+# Миграция 1 создаёт схему на момент появления миграций (BASELINE ниже),
+# а не текущие модели: всё, что добавлено позже, приносят миграции 2+.
+import logging
+from datetime import datetime
+from sqlalchemy import (select, update, func, text, inspect, MetaData, Table, Column, Integer, BigInteger,
+                        String, Text, DateTime, Date, ForeignKey, Index, LargeBinary)
+from models import (engine, async_session, SchemaVersion, User, Order, Car, Client, Part, Job,
+                    StockMovement, StockSnapshot, OrderDailyStat, IdempotencyKey, order_part)
+from passwords import hash_password
+import search
+import inventory
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+# Ключ pg_advisory_xact_lock: две одновременные миграции ждут друг друга
+ADVISORY_LOCK_KEY = 7313001
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+def migration(version: int, name: str):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def _create_indexes(conn, tables, names):
+    for table in tables:
+        for index in table.indexes:
+            if index.name in names:
+                index.create(conn, checkfirst=True)
+
+
+# Схема, которую до миграций создавал create_all. Не менять: новые таблицы
+# и колонки — только новой миграцией.
+BASELINE = MetaData()
+
+
+def _baseline_table(name, *columns):
+    return Table(name, BASELINE, Column('id', Integer, primary_key=True, index=True), *columns)
+
+
+_baseline_table(
+    'client',
+    Column('full_name', String(255), nullable=False),
+    Column('phone', String(20), nullable=False),
+    Column('email', String(255), nullable=True),
+    Column('address', Text, nullable=True),
+)
+_baseline_table(
+    'car',
+    Column('client_id', Integer, ForeignKey('client.id'), nullable=False),
+    Column('make', String(100), nullable=False),
+    Column('model', String(100), nullable=False),
+    Column('year', Integer, nullable=False),
+    Column('vin', String(17), unique=True, nullable=False),
+)
+_baseline_table(
+    'user',
+    Column('full_name', String(255), nullable=False),
+    Column('email', String(255), unique=True, nullable=False),
+    Column('phone', String(20), nullable=False),
+    Column('password_hash', String(255), nullable=False),
+    Column('role', String(20), nullable=False),
+)
+_baseline_table(
+    'part',
+    Column('name', String(255), nullable=False),
+    Column('price', Integer, nullable=False),
+    Column('stock', Integer, nullable=False, default=0),
+)
+_baseline_table(
+    'order',
+    Column('client_id', Integer, ForeignKey('client.id')),
+    Column('user_id', Integer, ForeignKey('user.id')),
+    Column('status', String(20)),
+    Column('created_at', DateTime),
+    Column('description', Text, nullable=True),
+    Index('ix_order_created_at_id', 'created_at', 'id'),
+    Index('ix_order_user_created_at_id', 'user_id', 'created_at', 'id'),
+    Index('ix_order_client_created_at_id', 'client_id', 'created_at', 'id'),
+    Index('ix_order_status_created_at_id', 'status', 'created_at', 'id'),
+)
+Table(
+    'order_part', BASELINE,
+    Column('order_id', Integer, ForeignKey('order.id'), primary_key=True),
+    Column('part_id', Integer, ForeignKey('part.id'), primary_key=True),
+    Column('quantity', Integer, nullable=False, default=1),
+)
+_baseline_table(
+    'outboxmessage',
+    Column('recipient', String(255), nullable=False),
+    Column('subject', String(255), nullable=False),
+    Column('payload', LargeBinary, nullable=False),
+    Column('status', String(20), nullable=False, default='pending'),
+    Column('attempts', Integer, nullable=False, default=0),
+    Column('next_attempt_at', DateTime, nullable=False, default=datetime.utcnow),
+    Column('last_error', Text, nullable=True),
+    Column('created_at', DateTime),
+    Column('sent_at', DateTime, nullable=True),
+    Index('ix_outboxmessage_status_next_attempt_at', 'status', 'next_attempt_at'),
+)
+Table(
+    'statcounter', BASELINE,
+    Column('name', String(50), primary_key=True),
+    Column('value', BigInteger, nullable=False, default=0),
+)
+Table(
+    'orderdailystat', BASELINE,
+    Column('day', Date, primary_key=True),
+    Column('status', String(20), primary_key=True),
+    Column('orders', Integer, nullable=False, default=0),
+)
+
+
+@migration(1, 'initial schema')
+def _initial_schema(conn):
+    BASELINE.create_all(conn, checkfirst=True)
+
+
+@migration(2, 'indexes for order lists, cars by client and client phone lookup')
+def _list_indexes(conn):
+    # Одиночные индексы на Order.user_id/created_at/status не нужны:
+    # составные (..., created_at, id) покрывают их как левый префикс.
+    _create_indexes(conn, [Order.__table__, Car.__table__, Client.__table__], {
+        'ix_order_created_at_id',
+        'ix_order_user_created_at_id',
+        'ix_order_client_created_at_id',
+        'ix_order_status_created_at_id',
+        'ix_car_client_id',
+        'ix_client_phone',
+    })
+
+
+def _add_column(conn, table, column):
+    # ALTER TABLE ... ADD COLUMN, если колонки ещё нет (база могла быть создана уже с ней)
+    if column.name in {c['name'] for c in inspect(conn).get_columns(table.name)}:
+        return
+    quote = conn.dialect.identifier_preparer
+    ddl = f'ALTER TABLE {quote.format_table(table)} ADD COLUMN {quote.quote(column.name)} ' \
+          f'{column.type.compile(dialect=conn.dialect)}'
+    for fk in column.foreign_keys:
+        ddl += f' REFERENCES {quote.format_table(fk.column.table)} ({quote.quote(fk.column.name)})'
+    conn.execute(text(ddl))
+
+
+@migration(3, 'part sku with unique index for bulk import')
+def _part_sku(conn):
+    _add_column(conn, Part.__table__, Part.__table__.c.sku)
+    _create_indexes(conn, [Part.__table__], {'ux_part_sku'})
+
+
+@migration(4, 'search index: FTS5 on SQLite, pg_trgm on Postgres')
+def _search_index(conn):
+    search.install(conn)
+
+
+@migration(5, 'order assignee with per-master index')
+def _order_assignee(conn):
+    _add_column(conn, Order.__table__, Order.__table__.c.assignee_id)
+    _create_indexes(conn, [Order.__table__], {'ix_order_assignee_created_at_id'})
+
+
+@migration(6, 'job table for background tasks')
+def _jobs(conn):
+    Job.__table__.create(conn, checkfirst=True)
+
+
+@migration(7, 'stock ledger and snapshots instead of part.stock')
+def _stock_ledger(conn):
+    for table in (StockMovement.__table__, StockSnapshot.__table__):
+        table.create(conn, checkfirst=True)
+    if 'stock' not in {c['name'] for c in inspect(conn).get_columns('part')}:
+        return
+    # Старый остаток — начальная корректировка в журнале, сразу свёрнутая в снимок
+    conn.execute(text(
+        "INSERT INTO stockmovement (part_id, kind, quantity, created_at) "
+        "SELECT id, 'adjustment', stock, CURRENT_TIMESTAMP FROM part WHERE stock <> 0"))
+    conn.execute(inventory.compact_statement(conn.dialect.name))
+    conn.execute(text('ALTER TABLE part DROP COLUMN stock'))
+
+
+@migration(8, 'order_part unit price, order totals and revenue in daily rollup')
+def _order_totals(conn):
+    _add_column(conn, order_part, order_part.c.unit_price)
+    for column in (Order.__table__.c.total, Order.__table__.c.parts_count,
+                   OrderDailyStat.__table__.c.revenue, OrderDailyStat.__table__.c.parts):
+        _add_column(conn, column.table, column)
+    # Цен на момент старых заказов нет — берём текущие из прайса
+    conn.execute(update(order_part).where(order_part.c.unit_price.is_(None)).values(
+        unit_price=func.coalesce(
+            select(Part.price).where(Part.id == order_part.c.part_id).scalar_subquery(), 0)))
+    in_order = order_part.c.order_id == Order.id
+    conn.execute(update(Order).values(
+        total=func.coalesce(select(func.sum(order_part.c.quantity * order_part.c.unit_price))
+                            .where(in_order).scalar_subquery(), 0),
+        parts_count=func.coalesce(select(func.sum(order_part.c.quantity)).where(in_order).scalar_subquery(), 0),
+    ))
+    same_bucket = (func.date(Order.created_at) == OrderDailyStat.day, Order.status == OrderDailyStat.status)
+    conn.execute(update(OrderDailyStat).values(
+        revenue=func.coalesce(select(func.sum(Order.total)).where(*same_bucket).scalar_subquery(), 0),
+        parts=func.coalesce(select(func.sum(Order.parts_count)).where(*same_bucket).scalar_subquery(), 0),
+    ))
+
+
+@migration(9, 'idempotency keys for order creation')
+def _idempotency_keys(conn):
+    IdempotencyKey.__table__.create(conn, checkfirst=True)
+
+
+@migration(10, 'order created_at backfilled and NOT NULL for keyset pagination')
+def _order_created_at_not_null(conn):
+    # Заказы без даты выпадали бы из курсорной пагинации: ставим им дату самого
+    # старого заказа — они окажутся в конце списка — и докладываем их в rollup
+    day = conn.scalar(select(func.min(Order.created_at))) or datetime.utcnow()
+    ids = conn.execute(update(Order).where(Order.created_at.is_(None)).values(created_at=day)
+                       .returning(Order.id)).scalars().all()
+    if ids:
+        buckets = conn.execute(
+            select(Order.status, func.count(Order.id), func.coalesce(func.sum(Order.total), 0),
+                   func.coalesce(func.sum(Order.parts_count), 0))
+            .where(Order.id.in_(ids), Order.status.is_not(None))
+            .group_by(Order.status)
+        ).all()
+        stat = OrderDailyStat.__table__
+        for status, n, revenue, parts in buckets:
+            bucket = (stat.c.day == day.date(), stat.c.status == status)
+            if not conn.execute(update(stat).where(*bucket).values(
+                    orders=stat.c.orders + n, revenue=stat.c.revenue + revenue,
+                    parts=stat.c.parts + parts)).rowcount:
+                conn.execute(stat.insert().values(day=day.date(), status=status, orders=n,
+                                                  revenue=revenue, parts=parts))
+    # SQLite не меняет NOT NULL у существующей колонки; новые базы получают его из модели
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text('ALTER TABLE "order" ALTER COLUMN created_at SET NOT NULL'))
+
+
+async def current_version(conn) -> int:
+    try:
+        return await conn.scalar(select(func.max(SchemaVersion.version))) or 0
+    except Exception:
+        # Таблицы версий ещё нет — база не инициализирована
+        return 0
+
+
+async def migrate(target_engine=engine) -> list:
+    applied = []
+    async with target_engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            # DB_STATEMENT_TIMEOUT рассчитан на запросы страниц; построение индексов
+            # и перенос данных на большой таблице не должны обрываться на полпути
+            await conn.execute(text('SET LOCAL statement_timeout = 0'))
+            await conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': ADVISORY_LOCK_KEY})
+        await conn.run_sync(lambda c: SchemaVersion.__table__.create(c, checkfirst=True))
+        version = await current_version(conn)
+        for number, name, fn in MIGRATIONS:
+            if number <= version:
+                continue
+            logger.info("Миграция %s: %s", number, name)
+            await conn.run_sync(fn)
+            await conn.execute(SchemaVersion.__table__.insert().values(version=number, name=name))
+            applied.append(number)
+    return applied
+
+
+async def check_schema(target_engine=engine):
+    # Один дешёвый запрос при старте воркера
+    async with target_engine.connect() as conn:
+        version = await current_version(conn)
+    if version < latest_version():
+        raise SchemaOutdated(
+            f"Схема БД версии {version}, код ожидает {latest_version()}. "
+            f"Запустите: python init_db.py"
+        )
+    return version
+
+
+async def ensure_admin():
+    from stats import bump, touched
+    async with async_session() as s:
+        result = await s.execute(select(User).where(User.email == 'admin@autoservice.ru'))
+        if result.scalar_one_or_none():
+            return False
+        s.add(User(
+            full_name='Админ Админович',
+            email='admin@autoservice.ru',
+            phone='+79990000000',
+            password_hash=await hash_password('admin'),
+            role='admin'
+        ))
+        await bump(s, {'staff': 1, **touched('user')})
+        await s.commit()
+        return True
+
+
+async def bootstrap():
+    # Однократная подготовка базы: миграции, админ, начальные счётчики
+    from stats import ensure_stats
+    applied = await migrate()
+    # Сначала счётчики (пересчёт по существующим данным), потом админ с инкрементом
+    await ensure_stats()
+    created_admin = await ensure_admin()
+    return applied, created_admin
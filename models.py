@@ -1,15 +1,46 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Table
+from sqlalchemy import Column, Integer, BigInteger, String, Text, ForeignKey, DateTime, Date, Table, Index, LargeBinary
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from config import Config
 from datetime import datetime  
+import asyncio
+import time
+import metrics
 
 # Получаем URL из конфигурации
 DATABASE_URL = Config.SQLALCHEMY_DATABASE_URI
 
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # Пул, который замеряет ожидание свободного соединения (для /metrics)
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+def engine_options(url: str) -> dict:
+    options = dict(
+        future=True,
+        echo=False,
+        poolclass=TimedQueuePool,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=Config.DB_POOL_PRE_PING,
+    )
+    if url.startswith('postgresql+asyncpg'):
+        connect_args = {'prepared_statement_cache_size': Config.DB_STATEMENT_CACHE_SIZE}
+        if Config.DB_STATEMENT_TIMEOUT:
+            connect_args['server_settings'] = {'statement_timeout': str(Config.DB_STATEMENT_TIMEOUT)}
+        options['connect_args'] = connect_args
+    return options
+
 # Создаём движок для PostgreSQL 
-engine = create_async_engine(DATABASE_URL, future=True, echo=False)
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 
 # Асинхронная сессия
 async_session = async_sessionmaker(
@@ -18,6 +49,37 @@ async_session = async_sessionmaker(
     expire_on_commit=False
 )
 
+# Необязательная реплика только для чтения (DATABASE_READ_URL).
+# Без неё read_session смотрит в тот же primary.
+DATABASE_READ_URL = Config.DATABASE_READ_URL
+read_engine = create_async_engine(DATABASE_READ_URL, **engine_options(DATABASE_READ_URL)) \
+    if DATABASE_READ_URL else engine
+read_session = async_sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+def mark_primary():
+    # После записи пользователь какое-то время читает с primary,
+    # чтобы не увидеть отставшую реплику (метка хранится в его сессии)
+    from quart import has_request_context, session
+    if read_engine is not engine and has_request_context():
+        session['primary_until'] = time.time() + Config.READ_AFTER_WRITE_WINDOW
+
+def reader():
+    # Сессия для запросов только на чтение: реплика, если она есть и не идёт окно после записи
+    from quart import has_request_context, session
+    if read_engine is not engine and has_request_context() \
+            and session.get('primary_until', 0) > time.time():
+        return async_session()
+    return read_session()
+
+def writer():
+    # Сессия для записи: всегда primary
+    mark_primary()
+    return async_session()
+
 Base = declarative_base()
 
 class BaseMixin:
@@ -29,7 +91,7 @@ class BaseMixin:
 
 class Client(Base, BaseMixin):
     full_name = Column(String(255), nullable=False)
-    phone = Column(String(20), nullable=False)
+    phone = Column(String(20), nullable=False, index=True)
     email = Column(String(255), nullable=True)
     address = Column(Text, nullable=True)
     cars = relationship("Car", back_populates="client")
@@ -44,7 +106,7 @@ class Client(Base, BaseMixin):
         }
 
 class Car(Base, BaseMixin):
-    client_id = Column(Integer, ForeignKey('client.id'), nullable=False)
+    client_id = Column(Integer, ForeignKey('client.id'), nullable=False, index=True)
     make = Column(String(100), nullable=False)
     model = Column(String(100), nullable=False)
     year = Column(Integer, nullable=False)
@@ -80,39 +142,218 @@ class User(Base, BaseMixin):
 class Part(Base, BaseMixin):
     name = Column(String(255), nullable=False)
     price = Column(Integer, nullable=False)  # в рублях
-    stock = Column(Integer, nullable=False, default=0)  # количество на складе
+    sku = Column(String(64), nullable=True)  # артикул поставщика, ключ массового импорта
+    # Остаток не хранится в строке запчасти: журнал StockMovement + StockSnapshot (inventory.py)
+
+    # Уникальный артикул — цель для INSERT ... ON CONFLICT (sku) при импорте прайса
+    __table_args__ = (
+        Index('ux_part_sku', 'sku', unique=True),
+    )
 
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
             'price': self.price,
-            'stock': self.stock,
+            'sku': self.sku,
         }
 
+ORDER_STATUSES = ('new', 'in_progress', 'completed', 'cancelled')
+
+# Допустимые переходы статусов заказа
+ORDER_TRANSITIONS = {
+    'new': ('in_progress', 'cancelled'),
+    'in_progress': ('completed', 'cancelled'),
+    'completed': (),
+    'cancelled': (),
+}
+
 order_part = Table(
     'order_part',
     Base.metadata,
     Column('order_id', Integer, ForeignKey('order.id'), primary_key=True),
     Column('part_id', Integer, ForeignKey('part.id'), primary_key=True),
-    Column('quantity', Integer, nullable=False, default=1)
+    Column('quantity', Integer, nullable=False, default=1),
+    # Цена за штуку на момент заказа: смена прайса не меняет старые заказы
+    Column('unit_price', Integer, nullable=False, default=0),
 )
 
 class Order(Base, BaseMixin):
     client_id = Column(Integer, ForeignKey('client.id'))
     user_id = Column(Integer, ForeignKey('user.id'))  # кто создал
+    assignee_id = Column(Integer, ForeignKey('user.id'), nullable=True)  # мастер, который ведёт заказ
     status = Column(String(20), default='new')  # new, in_progress, completed, cancelled
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # NOT NULL: ключ курсорной пагинации (created_at, id), см. pagination.py
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     description = Column(Text, nullable=True)
+    # Итог по запчастям (сумма quantity * unit_price) и число штук — считаются при записи заказа
+    total = Column(Integer, nullable=False, default=0)
+    parts_count = Column(Integer, nullable=False, default=0)
 
     # Связи
     client = relationship("Client")
-    user = relationship("User")
+    user = relationship("User", foreign_keys=[user_id])
+    assignee = relationship("User", foreign_keys=[assignee_id])
     parts = relationship("Part", secondary=order_part, back_populates="orders")
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'client_id': self.client_id,
+            'user_id': self.user_id,
+            'assignee_id': self.assignee_id,
+            'status': self.status,
+            'created_at': self.created_at,
+            'description': self.description,
+            'total': self.total,
+        }
+
+    # Индексы под курсорную пагинацию: (created_at, id) + фильтры списков заказов
+    __table_args__ = (
+        Index('ix_order_created_at_id', 'created_at', 'id'),
+        Index('ix_order_user_created_at_id', 'user_id', 'created_at', 'id'),
+        Index('ix_order_client_created_at_id', 'client_id', 'created_at', 'id'),
+        Index('ix_order_status_created_at_id', 'status', 'created_at', 'id'),
+        Index('ix_order_assignee_created_at_id', 'assignee_id', 'created_at', 'id'),
+    )
+
 # Обратная связь для Part
 Part.orders = relationship("Order", secondary=order_part, back_populates="parts")
 
+# Очередь исходящих писем: обработчик только кладёт письмо сюда,
+# отправкой занимается фоновый отправитель из mailer.py
+class OutboxMessage(Base, BaseMixin):
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    payload = Column(LargeBinary, nullable=False)  # письмо целиком, как байты RFC 5322
+    status = Column(String(20), nullable=False, default='pending')  # pending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_outboxmessage_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+# Фоновые задачи (tasks.py): состояние хранится в БД, поэтому задача
+# переживает перезапуск воркера и доступна для опроса с любого воркера
+class Job(Base, BaseMixin):
+    queue = Column(String(50), nullable=False)
+    name = Column(String(100), nullable=False)
+    args = Column(Text, nullable=False, default='{}')  # JSON с аргументами обработчика
+    status = Column(String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    # queued — не раньше этого времени; running — до конца аренды воркером
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    result = Column(LargeBinary, nullable=True)
+    result_name = Column(String(255), nullable=True)
+    result_type = Column(String(255), nullable=True)
+    error = Column(Text, nullable=True)
+    created_by = Column(Integer, ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_job_queue_status_run_after', 'queue', 'status', 'run_after'),
+    )
+
+# Ключи идемпотентности создания заказа (idempotency.py): повтор формы или
+# запроса с тем же ключом возвращает уже созданный заказ
+class IdempotencyKey(Base, BaseMixin):
+    user_id = Column(Integer, nullable=False)
+    key = Column(String(64), nullable=False)
+    order_id = Column(Integer, ForeignKey('order.id', ondelete='CASCADE'), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Ключ уникален в пределах пользователя: второй INSERT ждёт первый и не проходит
+        Index('ux_idempotencykey_user_id_key', 'user_id', 'key', unique=True),
+        Index('ix_idempotencykey_expires_at', 'expires_at'),
+    )
+
+# Журнал движения запчастей: только INSERT, строки не меняются и не удаляются.
+# quantity со знаком: приход/возврат > 0, резерв под заказ < 0, корректировка — любой.
+# part_id без внешнего ключа, чтобы история пережила удаление запчасти.
+MOVEMENT_KINDS = ('receipt', 'reservation', 'return', 'adjustment')
+
+class StockMovement(Base, BaseMixin):
+    part_id = Column(Integer, nullable=False)
+    kind = Column(String(20), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    order_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Свежие движения запчасти после снимка: part_id = ? AND id > last_movement_id
+        Index('ix_stockmovement_part_id_id', 'part_id', 'id'),
+    )
+
+# Свёрнутый остаток: сумма движений запчасти до last_movement_id включительно
+class StockSnapshot(Base):
+    __tablename__ = 'stocksnapshot'
+    part_id = Column(Integer, ForeignKey('part.id', ondelete='CASCADE'), primary_key=True)
+    stock = Column(Integer, nullable=False, default=0)
+    last_movement_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+# Счётчики для дашборда, обновляются в тех же транзакциях, что и данные
+class StatCounter(Base):
+    __tablename__ = 'statcounter'
+    name = Column(String(50), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+# Заказы по дням и статусам (rollup для отчётов вместо сканирования Order):
+# число заказов, сумма их Order.total и штук запчастей
+class OrderDailyStat(Base):
+    __tablename__ = 'orderdailystat'
+    day = Column(Date, primary_key=True)
+    status = Column(String(20), primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(BigInteger, nullable=False, default=0)
+    parts = Column(Integer, nullable=False, default=0)
+
+def dialect_insert(s, table):
+    # INSERT с поддержкой ON CONFLICT для текущего диалекта (Postgres или SQLite)
+    if s.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+# Версия схемы: одна строка на применённую миграцию (migrations.py)
+class SchemaVersion(Base):
+    __tablename__ = 'schemaversion'
+    version = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+def pool_status(engine) -> dict:
+    # Только счётчики пула, без обращения к БД и без взятия соединения
+    pool = engine.sync_engine.pool
+    if not hasattr(pool, 'checkedout'):
+        return {}
+    return {
+        'in_use': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'size': pool.size(),
+        'overflow': max(pool.overflow(), 0),
+        'max_overflow': Config.DB_MAX_OVERFLOW,
+    }
+
+async def warm_up_pool(engine, count: int):
+    # Открываем соединения заранее, чтобы первые запросы не ждали handshake
+    count = min(count, engine.sync_engine.pool.size()) if count else 0
+    if count <= 0:
+        return
+    conns = await asyncio.gather(*(engine.connect() for _ in range(count)))
+    for conn in conns:
+        await conn.close()
+
 # Утилита для создания таблиц
 async def create_all_tables():
     async with engine.begin() as conn:
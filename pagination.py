@@ -0,0 +1,68 @@
+# pagination.py
+# Курсорная (keyset) пагинация по паре (created_at, id).
+# Страница строится одним индексным запросом WHERE (created_at, id) < курсор
+# ORDER BY created_at DESC, id DESC LIMIT n — без OFFSET и без COUNT(*),
+# поэтому её стоимость не зависит от размера таблицы.
+from datetime import datetime, timedelta
+from sqlalchemy import tuple_
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return f"{created_at.isoformat()}_{row_id}"
+
+
+def decode_cursor(cursor: str):
+    # Битый курсор — просто первая страница, а не ошибка 500
+    if not cursor:
+        return None
+    try:
+        ts, _, row_id = cursor.rpartition('_')
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        return None
+
+
+def parse_date(value: str):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def parse_limit(value, default: int = PAGE_SIZE) -> int:
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def apply_date_range(stmt, column, date_from: datetime = None, date_to: datetime = None):
+    # date_to включительно: всё, что раньше начала следующего дня
+    if date_from:
+        stmt = stmt.where(column >= date_from)
+    if date_to:
+        stmt = stmt.where(column < date_to + timedelta(days=1))
+    return stmt
+
+
+def apply_keyset(stmt, created_col, id_col, cursor: str = None, limit: int = PAGE_SIZE):
+    position = decode_cursor(cursor)
+    if position:
+        stmt = stmt.where(tuple_(created_col, id_col) < tuple_(*position))
+    # +1 строка, чтобы узнать, есть ли следующая страница
+    return stmt.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def split_page(rows, limit: int, created_attr: str = 'created_at'):
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_attr), last.id)
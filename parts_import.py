@@ -0,0 +1,236 @@
+# parts_import.py
+# Массовый импорт прайса поставщика на склад (CSV из формы или из консоли).
+# Файл читается построчно, строки проверяются и пишутся пачками: на пачку —
+# один SELECT существующих артикулов, один INSERT ... ON CONFLICT (sku)
+# и пачка движений склада (inventory.py) на изменения остатков.
+# Таблица Part целиком в память не загружается.
+#
+# Формат: заголовок sku,name,price,stock (разделитель , или ;).
+#   mode='set'   — цена и остаток из файла заменяют текущие, новые артикулы добавляются;
+#   mode='delta' — price/stock в файле — изменения к текущим значениям
+#                  (пустая ячейка = 0), артикул должен уже существовать.
+# Из формы склада импорт идёт фоновой задачей import_parts_job (tasks.py),
+# отчёт об ошибках — её файл-результат.
+# Запуск из консоли: python parts_import.py price.csv [--mode delta] [--batch-size 1000]
+import argparse
+import asyncio
+import csv
+import io
+from sqlalchemy import select, update
+from models import writer, Part, dialect_insert
+from stats import bump, touched
+from tasks import task, Result
+import inventory
+
+BATCH_SIZE = 1000
+MODES = ('set', 'delta')
+REQUIRED_COLUMNS = {'set': ('name', 'price', 'stock'), 'delta': ()}
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.errors = []  # [(номер строки, сообщение), ...]
+
+    @property
+    def processed(self) -> int:
+        return self.inserted + self.updated
+
+
+def _parse_int(value: str, field: str, allow_negative: bool, default=None) -> int:
+    value = (value or '').strip().replace(' ', '')
+    if not value:
+        if default is None:
+            raise ValueError(f"не заполнено поле {field}")
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{field} должно быть целым числом: {value!r}")
+    if number < 0 and not allow_negative:
+        raise ValueError(f"{field} не может быть отрицательным")
+    return number
+
+
+def parse_row(row: dict, mode: str) -> dict:
+    # Без колонки sku ключом служит название — оно же станет артикулом
+    name = (row.get('name') or '').strip()
+    sku = (row.get('sku') or '').strip() or name
+    if not sku:
+        raise ValueError("нет артикула и названия")
+    if len(sku) > 64:
+        raise ValueError("артикул длиннее 64 символов")
+    if len(name) > 255:
+        raise ValueError("название длиннее 255 символов")
+    delta = mode == 'delta'
+    return {
+        'sku': sku,
+        'name': name,
+        'price': _parse_int(row.get('price'), 'price', allow_negative=delta, default=0 if delta else None),
+        'stock': _parse_int(row.get('stock'), 'stock', allow_negative=delta, default=0 if delta else None),
+    }
+
+
+def open_csv(stream) -> csv.DictReader:
+    # stream — бинарный файл; BOM от Excel отбрасываем, разделитель определяем по заголовку
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    header = text.readline()
+    dialect = csv.excel
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=',;\t')
+    except csv.Error:
+        pass
+    fields = [f.strip().lower() for f in next(csv.reader([header], dialect))] if header else []
+    return csv.DictReader(text, fieldnames=fields, dialect=dialect)
+
+
+def _merge(batch: list, mode: str) -> dict:
+    # Один артикул дважды в пачке: для set побеждает последняя строка, для delta дельты суммируются.
+    # ON CONFLICT не может обновить одну строку дважды в одном запросе.
+    merged = {}
+    for line, item in batch:
+        prev = merged.get(item['sku'])
+        if prev is not None and mode == 'delta':
+            item = dict(item, price=prev[1]['price'] + item['price'],
+                        stock=prev[1]['stock'] + item['stock'], name=item['name'] or prev[1]['name'])
+        merged[item['sku']] = (line, item)
+    return merged
+
+
+async def _write_batch(batch: list, mode: str, result: ImportResult):
+    merged = _merge(batch, mode)
+    skus = sorted(merged)
+    async with writer() as s:
+        lock = s.get_bind().dialect.name != 'sqlite'
+        query = select(Part.id, Part.sku, Part.price).where(Part.sku.in_(skus))
+        existing = {sku: (part_id, price)
+                    for part_id, sku, price in await s.execute(
+                        query.with_for_update() if lock else query)}
+
+        # Запчасти, заведённые вручную без артикула, подхватываем по названию
+        missing = [sku for sku in skus if sku not in existing]
+        if missing:
+            names = {merged[sku][1]['name'] or sku: sku for sku in missing}
+            query = select(Part.id, Part.name, Part.price) \
+                .where(Part.sku.is_(None), Part.name.in_(list(names)))
+            adopted = []
+            for part_id, name, price in await s.execute(
+                    query.with_for_update() if lock else query):
+                sku = names.get(name)
+                if sku is not None and sku not in existing:
+                    existing[sku] = (part_id, price)
+                    adopted.append({'id': part_id, 'sku': sku})
+            if adopted:
+                await s.execute(update(Part), adopted)
+
+        # Точные остатки под блокировкой запчастей: от них зависят проверка и разница
+        known_ids = [part_id for part_id, _ in existing.values()]
+        await inventory.lock_parts(s, known_ids)
+        levels = await inventory.stock_levels(s, known_ids) if known_ids else {}
+
+        rows = []
+        changes = {}  # sku -> (вид движения, изменение остатка)
+        for sku in skus:
+            line, item = merged[sku]
+            old = existing.get(sku)
+            if mode == 'delta':
+                if old is None:
+                    result.errors.append((line, f"артикул {sku} не найден на складе"))
+                    continue
+                if levels.get(old[0], 0) + item['stock'] < 0 or old[1] + item['price'] < 0:
+                    result.errors.append((line, f"остаток или цена {sku} ушли бы в минус"))
+                    continue
+                change = item['stock']
+                kind = 'receipt' if change > 0 else 'adjustment'
+            else:
+                # Остаток из прайса — результат пересчёта: разница пишется корректировкой
+                change = item['stock'] - (levels.get(old[0], 0) if old else 0)
+                kind = 'adjustment' if old else 'receipt'
+            if old is None:
+                result.inserted += 1
+            else:
+                result.updated += 1
+            rows.append({'sku': sku, 'name': item['name'] or sku, 'price': item['price']})
+            changes[sku] = (kind, change)
+
+        part_ids = []
+        if rows:
+            stmt = dialect_insert(s, Part).values(rows)
+            if mode == 'delta':
+                set_ = {'price': Part.price + stmt.excluded.price}
+            else:
+                set_ = {'name': stmt.excluded.name, 'price': stmt.excluded.price}
+            ids = dict((await s.execute(
+                stmt.on_conflict_do_update(index_elements=['sku'], set_=set_).returning(Part.sku, Part.id)
+            )).all())
+            part_ids = list(ids.values())
+            await inventory.record(s, [inventory.movement(ids[sku], kind, change)
+                                       for sku, (kind, change) in changes.items()])
+            await bump(s, touched('part'))
+        await s.commit()
+    if part_ids:
+        # Загруженный прайс сразу виден на складе
+        await inventory.compact(part_ids)
+
+
+async def import_parts(rows, mode: str = 'set', batch_size: int = BATCH_SIZE) -> ImportResult:
+    # rows — итерируемые dict-строки (csv.DictReader); номера строк считаются с заголовком
+    if mode not in MODES:
+        raise ValueError(f"Неизвестный режим импорта: {mode}")
+    result = ImportResult()
+    fieldnames = getattr(rows, 'fieldnames', None)
+    if fieldnames is not None:
+        absent = [c for c in REQUIRED_COLUMNS[mode] if c not in fieldnames]
+        if 'sku' not in fieldnames and 'name' not in fieldnames:
+            absent.append('sku')
+        if absent:
+            result.errors.append((1, f"в заголовке нет колонок: {', '.join(absent)}"))
+            return result
+
+    batch = []
+    for line, row in enumerate(rows, start=2):
+        try:
+            batch.append((line, parse_row(row, mode)))
+        except ValueError as e:
+            result.errors.append((line, str(e)))
+            continue
+        if len(batch) >= batch_size:
+            await _write_batch(batch, mode, result)
+            batch = []
+    if batch:
+        await _write_batch(batch, mode, result)
+    result.errors.sort(key=lambda e: e[0])
+    return result
+
+
+def report_lines(result: ImportResult) -> list:
+    lines = [f"Добавлено: {result.inserted}, обновлено: {result.updated}, ошибок: {len(result.errors)}"]
+    lines += [f"  строка {line}: {message}" for line, message in result.errors]
+    return lines
+
+
+# Без повторов: delta-импорт, упавший на середине, при повторе применил бы
+# уже записанные пачки второй раз
+@task('default', max_attempts=1)
+async def import_parts_job(csv_text: str, mode: str = 'set'):
+    result = await import_parts(open_csv(io.BytesIO(csv_text.encode('utf-8'))), mode)
+    return Result('\n'.join(report_lines(result)).encode('utf-8'), 'import_report.txt',
+                  'text/plain; charset=utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт прайса запчастей из CSV")
+    parser.add_argument('path')
+    parser.add_argument('--mode', choices=MODES, default='set')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    with open(args.path, 'rb') as f:
+        result = asyncio.run(import_parts(open_csv(f), args.mode, args.batch_size))
+    for line in report_lines(result):
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# passwords.py
+# Хэширование и проверка паролей вне event loop.
+# KDF (scrypt/pbkdf2) специально медленный: вызов прямо в обработчике
+# замораживает весь воркер, поэтому считаем в отдельном пуле потоков
+# (hashlib отпускает GIL на время вычисления).
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS,
+                                       thread_name_prefix='password-hash')
+    return _executor
+
+
+# Настроенный метод так, как werkzeug пишет его в хэш: сокращения раскрываются
+# ('scrypt' -> 'scrypt:32768:8:1', 'pbkdf2:sha256' -> 'pbkdf2:sha256:<итерации>')
+_stored_methods = {}
+
+
+async def stored_method(method: str = None) -> str:
+    # Считается один раз на метод пробным хэшем — правила раскрытия зависят от версии werkzeug
+    method = method or Config.PASSWORD_HASH_METHOD
+    if method not in _stored_methods:
+        loop = asyncio.get_running_loop()
+        sample = await loop.run_in_executor(_get_executor(), generate_password_hash, '', method)
+        _stored_methods[method] = sample.split('$', 1)[0]
+    return _stored_methods[method]
+
+
+async def needs_rehash(password_hash: str) -> bool:
+    # Формат werkzeug: "метод:параметры$соль$хэш"
+    return password_hash.split('$', 1)[0] != await stored_method()
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), generate_password_hash, password, Config.PASSWORD_HASH_METHOD
+    )
+
+
+async def verify_password(password_hash: str, password: str) -> bool:
+    if not password_hash or password is None:
+        return False
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), check_password_hash, password_hash, password)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,133 @@
+# reports.py
+# Генерация отчётов о работах (.docx) вне event loop.
+# Документ собирается в пуле потоков или процессов и сохраняется в BytesIO,
+# наружу отдаются готовые байты — без временных файлов на диске.
+# python-docx (вместе с lxml) импортируется только внутри воркера при первом
+# отчёте, чтобы не замедлять старт процессов и не раздувать их память.
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from config import Config
+from tasks import task, Result
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+class ReportQueueFull(RuntimeError):
+    pass
+
+
+def generate_work_report(order_id: int, client_name: str, work_description: str, total_cost: int):
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    doc = Document()
+
+    # Заголовок
+    title = doc.add_heading('Отчёт о выполненных работах', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    # Данные
+    doc.add_paragraph(f"Заказ №: {order_id}")
+    doc.add_paragraph(f"Клиент: {client_name}")
+    doc.add_paragraph(f"Дата: {datetime.now().strftime('%d.%m.%Y')}")
+    doc.add_paragraph()
+
+    # Описание работ
+    doc.add_heading('Выполненные работы:', level=1)
+    doc.add_paragraph(work_description)
+
+    # Стоимость
+    doc.add_paragraph()
+    doc.add_paragraph(f"Итого к оплате: {total_cost} руб.", style='Intense Quote')
+
+    # Подпись
+    doc.add_paragraph()
+    doc.add_paragraph("Мастер: _________________________")
+
+    return doc
+
+
+def render_work_report(order_id: int, client_name: str, work_description: str, total_cost: int) -> bytes:
+    # Выполняется в воркере пула, поэтому принимает и возвращает только простые типы
+    buf = BytesIO()
+    generate_work_report(order_id, client_name, work_description, total_cost).save(buf)
+    return buf.getvalue()
+
+
+def report_filename(order_id: int) -> str:
+    return f"Отчёт_заказ_{order_id}.docx"
+
+
+class ReportRenderer:
+    """Пул для рендеринга отчётов с ограниченной очередью.
+
+    Одновременно в работе и в ожидании может быть не больше
+    workers + queue_size отчётов; сверх этого submit() сразу
+    бросает ReportQueueFull, а не копит запросы в памяти.
+    """
+
+    def __init__(self, kind: str = 'thread', workers: int = 2, queue_size: int = 8):
+        self.kind = kind
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self._executor = None
+        self.pending = 0
+
+    def _ensure_started(self):
+        if self._executor is None:
+            if self.kind == 'process':
+                # spawn, не fork: дочерний процесс не наследует копию event loop,
+                # пулов соединений и замков родителя
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    async def submit(self, func, *args):
+        # Проверка и инкремент без await между ними — гонки внутри одного loop нет
+        if self.pending >= self.capacity:
+            raise ReportQueueFull("Очередь генерации отчётов переполнена")
+        self._ensure_started()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def render_work_report(self, order_id: int, client_name: str,
+                                 work_description: str, total_cost: int) -> bytes:
+        return await self.submit(render_work_report, order_id, client_name,
+                                 work_description, total_cost)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+renderer = ReportRenderer(
+    kind=Config.REPORT_EXECUTOR,
+    workers=Config.REPORT_WORKERS,
+    queue_size=Config.REPORT_QUEUE_SIZE,
+)
+
+
+# --- Фоновые задачи: обработчик запроса только ставит их в очередь ---
+
+@task('reports')
+async def work_report(order_id: int, client_name: str, work_description: str, total_cost: int):
+    report = await renderer.render_work_report(order_id, client_name, work_description, total_cost)
+    return Result(report, report_filename(order_id), DOCX_MIMETYPE)
+
+
+@task('reports')
+async def work_report_email(order_id: int, client_name: str, work_description: str,
+                            total_cost: int, email_to: str):
+    from mailer import build_report_email, enqueue
+    report = await renderer.render_work_report(order_id, client_name, work_description, total_cost)
+    # Само письмо уходит через outbox, там свои повторы
+    await enqueue(build_report_email(order_id, email_to, report, report_filename(order_id), DOCX_MIMETYPE))
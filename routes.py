@@ -1,87 +1,158 @@
 # routes.py
-from quart import Blueprint, render_template, request, redirect, url_for, flash, session, send_file
-from werkzeug.security import generate_password_hash, check_password_hash
+from quart import (Blueprint, render_template, request, redirect, url_for, flash, session, send_file, abort,
+                   Response, jsonify, websocket)
 import re
-from models import async_session, User, Client, Car, Part, Order, order_part
-from sqlalchemy import select, func
-import os
-import tempfile
+import json
+import asyncio
+from models import (async_session, reader, writer, User, Client, Car, Part, Order, order_part, ORDER_STATUSES,
+                    ORDER_TRANSITIONS)
+from sqlalchemy import select, update
 from datetime import datetime  
-from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-import aiofiles
-import aiosmtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from config import Config  
+from io import BytesIO
 from sqlalchemy.orm import joinedload
 from collections import Counter
+from config import Config
+from passwords import hash_password, verify_password, needs_rehash
+from stats import bump, touched, record_new_order, get_dashboard_stats
+import inventory
+import idempotency
+from httpcache import cached_page
+import events
+from workflow import claim_next, assign_order, change_status, InvalidTransition
+import tasks
+from tasks import TaskQueueFull
+from exports import DATASETS, FORMATS, select_columns, export_stream
+from search import (search, search_client_ids, KINDS as SEARCH_KINDS, SEARCH_LIMIT, MAX_SEARCH_LIMIT,
+                    TYPEAHEAD_LIMIT)
+from parts_import import MODES as IMPORT_MODES
+from pagination import PAGE_SIZE, apply_keyset, apply_date_range, split_page, parse_date, parse_limit
 
 # Создаём Blueprint
 bp = Blueprint('main', __name__)
 
 async def get_user_by_email(email: str):
+    # Всегда с primary: вход сразу после регистрации не должен зависеть от лага реплики
     async with async_session() as s:
         result = await s.execute(select(User).where(User.email == email))
         return result.scalar_one_or_none()
 
+async def authenticate(email: str, password: str):
+    user = await get_user_by_email(email)
+    if not user or not await verify_password(user.password_hash, password):
+        return None
+    # Хэш со старыми параметрами — пересчитываем, пока знаем пароль
+    if await needs_rehash(user.password_hash):
+        new_hash = await hash_password(password)
+        async with writer() as s:
+            await s.execute(update(User).where(User.id == user.id).values(password_hash=new_hash))
+            await s.commit()
+        user.password_hash = new_hash
+    return user
+
+# Списки только для чтения: колонки, которые читает шаблон, строками Core
+# (именованный кортеж без identity map и отслеживания сессией)
+CLIENT_LIST_COLUMNS = (Client.id, Client.full_name, Client.phone, Client.email, Client.address)
+USER_LIST_COLUMNS = (User.id, User.full_name, User.email, User.phone, User.role)
+
+async def list_rows(stmt):
+    async with reader() as s:
+        return (await s.execute(stmt)).all()
+
 async def get_all_clients():
-    async with async_session() as s:
-        result = await s.execute(select(Client))
-        return result.scalars().all()
+    return await list_rows(select(*CLIENT_LIST_COLUMNS))
+
+async def get_clients_by_ids(client_ids: list):
+    # Сохраняет порядок ids (например, ранжирование поиска)
+    if not client_ids:
+        return []
+    rows = await list_rows(select(*CLIENT_LIST_COLUMNS).where(Client.id.in_(client_ids)))
+    by_id = {client.id: client for client in rows}
+    return [by_id[i] for i in client_ids if i in by_id]
+
+async def get_all_users():
+    return await list_rows(select(*USER_LIST_COLUMNS))
 
 async def get_client_cars(client_id: int):
-    async with async_session() as s:
+    async with reader() as s:
         result = await s.execute(select(Car).where(Car.client_id == client_id))
         return result.scalars().all()
 
 async def get_all_parts():
-    async with async_session() as s:
-        result = await s.execute(select(Part))
-        return result.scalars().all()
-
-async def get_all_orders():
-    async with async_session() as s:
-        result = await s.execute(
-            select(Order)
-            .options(joinedload(Order.client), joinedload(Order.user))
-            .order_by(Order.created_at.desc())
-        )
-        return result.scalars().all()
-
-async def get_my_orders(user_id: int):
-    async with async_session() as s:
+    # Остатки из снимка склада (inventory.py)
+    return await list_rows(inventory.parts_with_stock().order_by(Part.id))
+
+def parse_order_filters(args):
+    # Фильтры списков заказов из query string
+    status = args.get('status') or None
+    client_id = args.get('client_id', '')
+    return {
+        'status': status if status in ORDER_STATUSES else None,
+        'client_id': int(client_id) if client_id.isdigit() else None,
+        'date_from': parse_date(args.get('date_from')),
+        'date_to': parse_date(args.get('date_to')),
+    }
+
+async def get_orders_page(user_id: int = None, status: str = None, client_id: int = None,
+                          date_from: datetime = None, date_to: datetime = None,
+                          cursor: str = None, limit: int = PAGE_SIZE, with_user: bool = True,
+                          assignee_id: int = None, with_assignee: bool = False):
+    stmt = select(Order).options(joinedload(Order.client))
+    if with_user:
+        stmt = stmt.options(joinedload(Order.user))
+    if with_assignee:
+        stmt = stmt.options(joinedload(Order.assignee))
+    if user_id is not None:
+        stmt = stmt.where(Order.user_id == user_id)
+    if assignee_id is not None:
+        # Очередь мастера: индекс (assignee_id, created_at, id)
+        stmt = stmt.where(Order.assignee_id == assignee_id)
+    if status:
+        stmt = stmt.where(Order.status == status)
+    if client_id is not None:
+        stmt = stmt.where(Order.client_id == client_id)
+    stmt = apply_date_range(stmt, Order.created_at, date_from, date_to)
+    stmt = apply_keyset(stmt, Order.created_at, Order.id, cursor, limit)
+
+    async with reader() as s:
+        result = await s.execute(stmt)
+        return split_page(result.scalars().all(), limit)
+
+async def get_all_orders(cursor: str = None, limit: int = PAGE_SIZE, **filters):
+    return await get_orders_page(cursor=cursor, limit=limit, **filters)
+
+async def get_my_orders(user_id: int, cursor: str = None, limit: int = PAGE_SIZE, **filters):
+    return await get_orders_page(user_id=user_id, cursor=cursor, limit=limit,
+                                 with_user=False, **filters)
+
+async def get_worker_orders(user_id: int, cursor: str = None, limit: int = PAGE_SIZE,
+                            all_orders: bool = False, **filters):
+    # Мастер видит свои назначенные заказы, админ — все с именем мастера
+    return await get_orders_page(assignee_id=None if all_orders else user_id, cursor=cursor,
+                                 limit=limit, with_user=False, with_assignee=all_orders, **filters)
+
+async def get_masters():
+    async with reader() as s:
         result = await s.execute(
-            select(Order)
-            .options(joinedload(Order.client))
-            .where(Order.user_id == user_id)
-            .order_by(Order.created_at.desc())
-        )
-        return result.scalars().all()
-
-async def get_worker_orders(user_id: int):
-    # В этой версии все заказы видны мастеру — можно расширить позже
-    return await get_all_orders()
+            select(User.id, User.full_name).where(User.role == 'master').order_by(User.full_name))
+        return result.all()
 
 async def create_user(full_name: str, email: str, phone: str, password: str, role: str = 'client'):
-    async with async_session() as s:
+    async with writer() as s:
         new_user = User(
             full_name=full_name,
             email=email,
             phone=phone,
-            password_hash=generate_password_hash(password),
+            password_hash=await hash_password(password),
             role=role
         )
         s.add(new_user)
+        await bump(s, {'staff': 1 if role != 'client' else 0, **touched('user')})
         await s.commit()
         await s.refresh(new_user)
         return new_user
 
 async def create_client(full_name: str, phone: str, email: str = None, address: str = None):
-    async with async_session() as s:
+    async with writer() as s:
         new_client = Client(
             full_name=full_name,
             phone=phone,
@@ -89,94 +160,73 @@ async def create_client(full_name: str, phone: str, email: str = None, address:
             address=address or None
         )
         s.add(new_client)
+        await bump(s, {'clients': 1, **touched('client')})
         await s.commit()
         await s.refresh(new_client)
         return new_client
 
 async def create_part(name: str, price: int, stock: int):
-    async with async_session() as s:
-        new_part = Part(name=name.strip(), price=price, stock=stock)
+    async with writer() as s:
+        new_part = Part(name=name.strip(), price=price)
         s.add(new_part)
+        await s.flush()
+        await inventory.record(s, [inventory.movement(new_part.id, 'receipt', stock)])
+        await bump(s, touched('part'))
         await s.commit()
         await s.refresh(new_part)
-        return new_part
-
-async def create_order(client_id: int, user_id: int, description: str, part_ids: list):
-    async with async_session() as s:
+    # Приход виден на складе сразу, не дожидаясь периодической свёртки
+    await inventory.compact([new_part.id])
+    return new_part
+
+async def create_order(client_id: int, user_id: int, description: str, part_ids: list,
+                       idempotency_key: str = None):
+    counts = Counter(int(part_id) for part_id in part_ids)
+
+    async with writer() as s:
+        if idempotency_key:
+            # Повтор с тем же ключом: отдаём созданный заказ, склад не трогаем
+            existing_id = await idempotency.claim(s, user_id, idempotency_key)
+            if existing_id is not None:
+                return await s.get(Order, existing_id)
+
+        # Цены фиксируются в позициях заказа, итог считается сразу при создании
+        prices = dict((await s.execute(
+            select(Part.id, Part.price).where(Part.id.in_(list(counts)))
+        )).all()) if counts else {}
         new_order = Order(
             client_id=client_id,
             user_id=user_id,
             description=description,
-            status='new'
+            status='new',
+            total=sum(prices.get(part_id, 0) * qty for part_id, qty in counts.items()),
+            parts_count=sum(counts.values()),
         )
         s.add(new_order)
         await s.flush()
 
-        counts = Counter(part_ids)
-
-        for part_id_str, qty in counts.items():
-            part_id = int(part_id_str)
-            part = await s.get(Part, part_id)
-            
-            if part and part.stock >= qty:
-                part.stock -= qty
-                await s.execute(order_part.insert().values(
-                    order_id=new_order.id,
-                    part_id=part_id,
-                    quantity=qty
-                ))
-            else:
-                await s.rollback()
-                part_name = part.name if part else f"ID {part_id}"
-                raise ValueError(f"Недостаточно запчастей на складе: {part_name}")
-        
+        if counts:
+            # Несуществующая запчасть тоже отказ: у неё нет остатка
+            await inventory.reserve(s, counts, new_order.id)
+            await s.execute(order_part.insert(), [
+                {'order_id': new_order.id, 'part_id': part_id, 'quantity': qty,
+                 'unit_price': prices[part_id]}
+                for part_id, qty in counts.items()
+            ])
+
+        await record_new_order(s, new_order)
+        if idempotency_key:
+            await idempotency.complete(s, user_id, idempotency_key, new_order.id)
+        client_name = await s.scalar(select(Client.full_name).where(Client.id == client_id))
         await s.commit()
-        return new_order
-
-async def get_dashboard_stats():
-    async with async_session() as s:
-        clients_count = await s.scalar(select(func.count(Client.id)))
-        users_count = await s.scalar(select(func.count(User.id)).where(User.role != 'client'))
-        parts_count = await s.scalar(select(func.sum(Part.stock)))
-        orders_count = await s.scalar(select(func.count(Order.id)))
-        return {
-            'clients_count': clients_count or 0,
-            'users_count': users_count or 0,
-            'parts_count': parts_count or 0,
-            'orders_count': orders_count or 0,
-        }
-    
-def generate_work_report(order_id: int, client_name: str, work_description: str, total_cost: int):
-    doc = Document()
-    
-    # Заголовок
-    title = doc.add_heading('Отчёт о выполненных работах', 0)
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    
-    # Данные
-    doc.add_paragraph(f"Заказ №: {order_id}")
-    doc.add_paragraph(f"Клиент: {client_name}")
-    doc.add_paragraph(f"Дата: {datetime.now().strftime('%d.%m.%Y')}")
-    doc.add_paragraph()
-    
-    # Описание работ
-    doc.add_heading('Выполненные работы:', level=1)
-    doc.add_paragraph(work_description)
-    
-    # Стоимость
-    doc.add_paragraph()
-    doc.add_paragraph(f"Итого к оплате: {total_cost} руб.", style='Intense Quote')
-    
-    # Подпись
-    doc.add_paragraph()
-    doc.add_paragraph("Мастер: _________________________")
-    
-    return doc
+    await events.order_created(new_order, client_name)
+    return new_order
 
 # Главная страница
 @bp.route('/')
 async def index():
-    return await render_template('index.html')
+    # Страница статична, кроме приветствия и набора блоков по роли
+    return await cached_page((), lambda: render_template('index.html'),
+                             vary=('user_id', 'user_role', 'user_name'))
 
 # Регистрация
 # Регистрация
@@ -229,8 +279,8 @@ async def login():
         email = form.get('email')
         password = form.get('password')
 
-        user = await get_user_by_email(email)
-        if user and check_password_hash(user.password_hash, password):
+        user = await authenticate(email, password)
+        if user:
             if user.role in ['admin', 'manager', 'master']:
                 await flash('Сотрудники должны входить через специальную форму.', 'warning')
                 return await render_template('login.html')
@@ -253,8 +303,8 @@ async def staff_login():
         email = form.get('email')
         password = form.get('password')
 
-        user = await get_user_by_email(email)
-        if user and check_password_hash(user.password_hash, password):
+        user = await authenticate(email, password)
+        if user:
             if user.role not in ['admin', 'manager', 'master']:
                 await flash('Только сотрудники могут использовать эту форму.', 'danger')
                 return await render_template('staff_login.html')
@@ -275,8 +325,15 @@ async def my_orders():
         await flash('Доступ только для клиентов.', 'danger')
         return redirect(url_for('main.index'))
     
-    orders = await get_my_orders(session['user_id'])
-    return await render_template('my_orders.html', orders=orders)
+    filters = parse_order_filters(request.args)
+    orders, next_cursor = await get_my_orders(
+        session['user_id'],
+        cursor=request.args.get('cursor'),
+        limit=parse_limit(request.args.get('limit')),
+        **filters
+    )
+    return await render_template('my_orders.html', orders=orders,
+                                 next_cursor=next_cursor, filters=filters)
 
 @bp.route('/worker_orders')
 async def worker_orders():
@@ -284,8 +341,109 @@ async def worker_orders():
         await flash('Доступ только для мастеров.', 'danger')
         return redirect(url_for('main.index'))
     
-    orders = await get_worker_orders(session['user_id'])
-    return await render_template('worker_orders.html', orders=orders)
+    filters = parse_order_filters(request.args)
+    orders, next_cursor = await get_worker_orders(
+        session['user_id'],
+        cursor=request.args.get('cursor'),
+        limit=parse_limit(request.args.get('limit')),
+        all_orders=session.get('user_role') == 'admin',
+        **filters
+    )
+    return await render_template('worker_orders.html', orders=orders,
+                                 next_cursor=next_cursor, filters=filters,
+                                 transitions=ORDER_TRANSITIONS)
+
+# Мастер берёт следующий свободный заказ из очереди
+@bp.route('/worker_orders/claim', methods=['POST'])
+async def claim_order():
+    if session.get('user_role') not in ['master', 'admin']:
+        await flash('Доступ только для мастеров.', 'danger')
+        return redirect(url_for('main.index'))
+
+    order = await claim_next(session['user_id'])
+    if order is None:
+        await flash('Свободных заказов нет.', 'info')
+    else:
+        await flash(f'Заказ №{order.id} взят в работу.', 'success')
+    return redirect(url_for('main.worker_orders'))
+
+# Смена статуса заказа по допустимым переходам
+@bp.route('/orders/<int:order_id>/status', methods=['POST'])
+async def set_order_status(order_id):
+    if session.get('user_role') not in ['master', 'admin', 'manager']:
+        await flash('Доступ запрещён.', 'danger')
+        return redirect(url_for('main.index'))
+
+    form = await request.form
+    try:
+        await change_status(order_id, form.get('status', ''), session['user_id'], session['user_role'])
+        await flash(f'Статус заказа №{order_id} изменён.', 'success')
+    except InvalidTransition as e:
+        await flash(str(e), 'danger')
+    return redirect(request.referrer or url_for('main.worker_orders'))
+
+# Назначение мастера менеджером
+@bp.route('/orders/<int:order_id>/assign', methods=['POST'])
+async def assign_master(order_id):
+    if session.get('user_role') not in ['admin', 'manager']:
+        await flash('Назначать мастеров могут только админ и менеджер.', 'danger')
+        return redirect(url_for('main.index'))
+
+    form = await request.form
+    master_id = form.get('master_id', '')
+    if not master_id.isdigit():
+        await flash('Выберите мастера.', 'danger')
+        return redirect(request.referrer or url_for('main.all_orders'))
+    try:
+        await assign_order(order_id, int(master_id))
+        await flash(f'Мастер назначен на заказ №{order_id}.', 'success')
+    except InvalidTransition as e:
+        await flash(str(e), 'danger')
+    return redirect(request.referrer or url_for('main.all_orders'))
+
+# Живые обновления списков заказов: WebSocket, для старых прокси — SSE
+SSE_KEEPALIVE = 25  # секунд между комментариями-пингами
+
+@bp.websocket('/ws/orders')
+async def orders_ws():
+    if not session.get('user_id'):
+        await websocket.close(1008)
+        return
+    with events.broker.subscribe(events.viewer_filter(session.get('user_role'), session['user_id'])) as sub:
+        await websocket.accept()
+        while True:
+            event = await sub.get()
+            if event is None:
+                # Отстали или воркер останавливается — страница перечитает список
+                await websocket.close(1013)
+                return
+            await websocket.send(json.dumps(event, ensure_ascii=False))
+
+@bp.route('/events/orders')
+async def orders_sse():
+    if not session.get('user_id'):
+        return jsonify(error='Требуется вход'), 401
+    accept = events.viewer_filter(session.get('user_role'), session['user_id'])
+
+    async def stream():
+        with events.broker.subscribe(accept) as sub:
+            yield b': connected\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b': ping\n\n'
+                    continue
+                if event is None:
+                    return
+                data = json.dumps(event, ensure_ascii=False)
+                yield f"event: {event['type']}\ndata: {data}\n\n".encode('utf-8')
+
+    response = Response(stream(), content_type='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None
+    return response
 
 @bp.route('/warehouse')
 async def warehouse():
@@ -293,8 +451,9 @@ async def warehouse():
         await flash('Доступ запрещён.', 'danger')
         return redirect(url_for('main.index'))
     
-    parts = await get_all_parts()
-    return await render_template('warehouse.html', parts=parts)
+    async def render():
+        return await render_template('warehouse.html', parts=await get_all_parts())
+    return await cached_page(('part',), render)
 
 @bp.route('/warehouse/add', methods=['GET', 'POST'])
 async def add_part():
@@ -327,14 +486,89 @@ async def add_part():
 
     return await render_template('part_form.html')
 
+# Массовый импорт прайса (CSV): пачками с upsert по артикулу
+@bp.route('/warehouse/import', methods=['GET', 'POST'])
+async def import_parts_view():
+    if session.get('user_role') not in ['admin', 'manager']:
+        await flash('Только админ и менеджер могут загружать прайс.', 'danger')
+        return redirect(url_for('main.warehouse'))
+
+    max_kb = Config.IMPORT_MAX_BYTES // 1024
+    if request.method == 'POST':
+        # Прайс целиком уходит в аргументы задачи: тело больше предела не читаем
+        too_large = f'Файл больше {max_kb} КБ — загрузите его из консоли: python parts_import.py.'
+        if (request.content_length or 0) > Config.IMPORT_MAX_BYTES:
+            await flash(too_large, 'danger')
+            return await render_template('parts_import.html', max_kb=max_kb)
+        files = await request.files
+        form = await request.form
+        upload = files.get('file')
+        mode = form.get('mode', 'set')
+        if upload is None or not upload.filename:
+            await flash('Выберите CSV-файл.', 'danger')
+            return await render_template('parts_import.html', max_kb=max_kb)
+        if mode not in IMPORT_MODES:
+            mode = 'set'
+        data = upload.read(Config.IMPORT_MAX_BYTES + 1)
+        if len(data) > Config.IMPORT_MAX_BYTES:
+            # Тело без Content-Length
+            await flash(too_large, 'danger')
+            return await render_template('parts_import.html', max_kb=max_kb)
+        try:
+            csv_text = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            await flash('Файл должен быть в кодировке UTF-8.', 'danger')
+            return await render_template('parts_import.html', max_kb=max_kb)
+
+        # Разбор и запись пачками — в фоновой задаче, запрос только ставит её в очередь
+        try:
+            job_id = await tasks.enqueue('import_parts_job', user_id=session['user_id'],
+                                         csv_text=csv_text, mode=mode)
+        except TaskQueueFull:
+            await flash('Сервер сейчас занят фоновыми задачами, попробуйте через минуту.', 'warning')
+            return await render_template('parts_import.html', max_kb=max_kb)
+        return redirect(url_for('main.job_page', job_id=job_id))
+
+    return await render_template('parts_import.html', max_kb=max_kb)
+
 @bp.route('/all_orders')
 async def all_orders():
     if session.get('user_role') not in ['manager', 'admin']:
         await flash('Доступ запрещён.', 'danger')
         return redirect(url_for('main.index'))
 
-    orders = await get_all_orders()
-    return await render_template('all_orders.html', orders=orders)
+    filters = parse_order_filters(request.args)
+    orders, next_cursor = await get_all_orders(
+        cursor=request.args.get('cursor'),
+        limit=parse_limit(request.args.get('limit')),
+        with_assignee=True,
+        **filters
+    )
+    masters = await get_masters() if any(o.status == 'new' for o in orders) else []
+    return await render_template('all_orders.html', orders=orders, masters=masters,
+                                 next_cursor=next_cursor, filters=filters)
+
+# Выгрузка в CSV / XLSX потоком
+@bp.route('/export/<dataset>.<fmt>')
+async def export(dataset, fmt):
+    if dataset not in DATASETS or fmt not in FORMATS:
+        abort(404)
+    if session.get('user_role') not in DATASETS[dataset]['roles']:
+        await flash('Доступ запрещён.', 'danger')
+        return redirect(url_for('main.index'))
+
+    columns = select_columns(dataset, request.args.get('columns'))
+    filters = {}
+    if dataset == 'orders':
+        order_filters = parse_order_filters(request.args)
+        filters = {key: order_filters[key] for key in ('date_from', 'date_to', 'status')}
+
+    response = Response(export_stream(dataset, fmt, columns, **filters), content_type=FORMATS[fmt])
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename="{dataset}_{datetime.now():%Y%m%d}.{fmt}"'
+    # Большая выгрузка может идти дольше стандартного RESPONSE_TIMEOUT
+    response.timeout = None
+    return response
 
 @bp.route('/reports')
 async def reports():
@@ -369,8 +603,43 @@ async def client_list():
         await flash('У вас нет доступа к этому разделу.', 'warning')
         return redirect(url_for('main.index'))
 
-    clients = await get_all_clients()
-    return await render_template('clients.html', clients=clients)
+    async def render():
+        query = request.args.get('q', '').strip()
+        if query:
+            clients = await get_clients_by_ids(await search_client_ids(query))
+        else:
+            clients = await get_all_clients()
+        return await render_template('clients.html', clients=clients, query=query)
+    return await cached_page(('client',), render)
+
+# Поиск по клиентам, машинам и заказам (JSON): ранжированно, постранично
+@bp.route('/search')
+async def search_api():
+    if session.get('user_role') not in ['admin', 'manager', 'master']:
+        return jsonify(error='Доступ запрещён'), 403
+    kinds = [k for k in request.args.get('kind', '').split(',') if k in SEARCH_KINDS] or SEARCH_KINDS
+    offset = request.args.get('offset', '')
+    results, next_offset = await search(
+        request.args.get('q', ''),
+        kinds=kinds,
+        limit=min(parse_limit(request.args.get('limit'), default=SEARCH_LIMIT), MAX_SEARCH_LIMIT),
+        offset=int(offset) if offset.isdigit() else 0,
+    )
+    return jsonify(results=results, next_offset=next_offset)
+
+# Подсказки при вводе (форма заказа): первые совпадения одного типа
+@bp.route('/search/typeahead')
+async def search_typeahead():
+    if not session.get('user_id'):
+        return jsonify(error='Требуется вход'), 401
+    kind = request.args.get('kind', 'client')
+    if kind not in SEARCH_KINDS:
+        abort(404)
+    if kind != 'client' and session.get('user_role') not in ['admin', 'manager', 'master']:
+        return jsonify(error='Доступ запрещён'), 403
+    results, _ = await search(request.args.get('q', ''), kinds=(kind,), limit=TYPEAHEAD_LIMIT)
+    return jsonify(results=[{'id': r['id'], 'client_id': r['client_id'], 'label': r['label']}
+                            for r in results])
 
 # Список пользователей (сотрудников)
 @bp.route('/users')
@@ -379,10 +648,9 @@ async def user_list():
         await flash('Доступ запрещён', 'danger')
         return redirect(url_for('main.index'))
     
-    async with async_session() as s:
-        result = await s.execute(select(User))
-        users = result.scalars().all()
-    return await render_template('users_list.html', users=users)
+    async def render():
+        return await render_template('users_list.html', users=await get_all_users())
+    return await cached_page(('user',), render)
 
 # Создание сотрудника
 @bp.route('/users/create', methods=['GET', 'POST'])
@@ -461,31 +729,32 @@ async def add_order():
         part_ids = (await request.form).getlist('part_ids')
 
         if not client_id:
-            flash('Выберите клиента!', 'danger')
+            await flash('Выберите клиента!', 'danger')
             return redirect(url_for('main.add_order'))
 
         try:
             client_id = int(client_id)
-            # Пытаемся создать заказ
-            await create_order(client_id, session['user_id'], description, part_ids)
-            flash('Заказ создан!', 'success')
+            # Повторная отправка с тем же токеном вернёт уже созданный заказ
+            key = idempotency.request_key(request.headers, form)
+            await create_order(client_id, session['user_id'], description, part_ids,
+                               idempotency_key=key)
+            await flash('Заказ создан!', 'success')
             return redirect(url_for('main.all_orders' if session.get('user_role') != 'client' else 'main.my_orders'))
             
         except ValueError as e:
             # Если возникла ошибка (например, "Недостаточно запчастей"), 
             # мы её ловим и выводим текст ошибки через flash
-            flash(str(e), 'danger')
+            await flash(str(e), 'danger')
             return redirect(url_for('main.add_order'))
         
         except Exception as e:
             # На случай других непредвиденных ошибок
-            flash(f"Произошла ошибка: {e}", 'danger')
+            await flash(f"Произошла ошибка: {e}", 'danger')
             return redirect(url_for('main.add_order'))
 
-    # GET: загружаем данные
-    clients = await get_all_clients()
+    # GET: клиента выбирают через поиск с подсказками, полный список не грузим
     parts = await get_all_parts()
-    return await render_template('add_order.html', clients=clients, parts=parts)
+    return await render_template('add_order.html', parts=parts, idempotency_key=idempotency.new_key())
 
 @bp.route('/worker_orders/report/<int:order_id>', methods=['GET', 'POST'])
 async def work_report_form(order_id):
@@ -493,17 +762,19 @@ async def work_report_form(order_id):
         await flash('Доступ запрещён.', 'danger')
         return redirect(url_for('main.worker_orders'))
 
-    # Получаем заказ и клиента
-    async with async_session() as s:
-        order = await s.get(Order, order_id)
-        if not order:
-            await flash('Заказ не найден.', 'danger')
-            return redirect(url_for('main.worker_orders'))
-        
-        client = await s.get(Client, order.client_id)
-        if not client:
-            await flash('Клиент не найден.', 'danger')
-            return redirect(url_for('main.worker_orders'))
+    # Получаем заказ и клиента одним запросом
+    async with reader() as s:
+        order = await s.scalar(
+            select(Order).options(joinedload(Order.client)).where(Order.id == order_id)
+        )
+    if not order:
+        await flash('Заказ не найден.', 'danger')
+        return redirect(url_for('main.worker_orders'))
+
+    client = order.client
+    if not client:
+        await flash('Клиент не найден.', 'danger')
+        return redirect(url_for('main.worker_orders'))
 
     if request.method == 'POST':
         form = await request.form
@@ -516,7 +787,7 @@ async def work_report_form(order_id):
             await flash('Все поля обязательны!', 'danger')
             return await render_template('work_report_form.html', 
                                        order_id=order_id, 
-                                       client=client)
+                                       client=client, parts_total=order.total)
 
         try:
             total_cost = int(total_cost_str)
@@ -526,68 +797,71 @@ async def work_report_form(order_id):
             await flash('Стоимость должна быть положительным числом.', 'danger')
             return await render_template('work_report_form.html', 
                                        order_id=order_id, 
-                                       client=client)
+                                       client=client, parts_total=order.total)
 
-        # Генерируем документ
-        doc = generate_work_report(order_id, client.full_name, work_description, total_cost)
-        
-        # Сохраняем во временный файл
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp:
-            doc.save(tmp.name)
-            tmp_path = tmp.name
+        if action == 'email' and (not email_to or not re.match(r"[^@]+@[^@]+\.[^@]+", email_to)):
+            await flash('Укажите корректный email для отправки.', 'danger')
+            return await render_template('work_report_form.html', 
+                                       order_id=order_id, 
+                                       client=client, parts_total=order.total)
 
+        # Документ собирается фоновой задачей: запрос только ставит её в очередь
+        report_args = dict(order_id=order_id, client_name=client.full_name,
+                           work_description=work_description, total_cost=total_cost)
         try:
-            if action == 'download':
-                # Отправляем файл на скачивание
-                filename = f"Отчёт_заказ_{order_id}.docx"
-                return await send_file(tmp_path, as_attachment=True, download_name=filename)
-
-            elif action == 'email':
-                if not email_to or not re.match(r"[^@]+@[^@]+\.[^@]+", email_to):
-                    await flash('Укажите корректный email для отправки.', 'danger')
-                    return await render_template('work_report_form.html', 
-                                               order_id=order_id, 
-                                               client=client)
-
-                # Отправка email
-                msg = MIMEMultipart()
-                msg['From'] = Config.MAIL_USERNAME
-                msg['To'] = email_to
-                msg['Subject'] = f"Отчёт по заказу №{order_id}"
-
-                body = f"Здравствуйте!\n\nВо вложении отчёт по выполненным работам по заказу №{order_id}."
-                msg.attach(MIMEText(body, 'plain', 'utf-8'))
-
-                # Прикрепляем файл
-                with open(tmp_path, "rb") as f:
-                    part = MIMEBase('application', 'vnd.openxmlformats-officedocument.wordprocessingml.document')
-                    part.set_payload(f.read())
-                encoders.encode_base64(part)
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename="Отчёт_заказ_{order_id}.docx"'
-                )
-                msg.attach(part)
-
-                # Отправка
-                await aiosmtplib.send(
-                    msg,
-                    hostname=Config.MAIL_SERVER,
-                    port=Config.MAIL_PORT,
-                    start_tls=True,
-                    username=Config.MAIL_USERNAME,
-                    password=Config.MAIL_PASSWORD
-                )
-
-                await flash('Отчёт успешно отправлен на email!', 'success')
-                return redirect(url_for('main.worker_orders'))
-
-        finally:
-            # Удаляем временный файл
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-
-    return await render_template('work_report_form.html', order_id=order_id, client=client)
+            if action == 'email':
+                job_id = await tasks.enqueue('work_report_email', user_id=session['user_id'],
+                                             email_to=email_to, **report_args)
+            else:
+                job_id = await tasks.enqueue('work_report', user_id=session['user_id'], **report_args)
+        except TaskQueueFull:
+            await flash('Сервер сейчас формирует много отчётов, попробуйте через минуту.', 'warning')
+            return await render_template('work_report_form.html', 
+                                       order_id=order_id, 
+                                       client=client, parts_total=order.total)
+
+        return redirect(url_for('main.job_page', job_id=job_id))
+
+    return await render_template('work_report_form.html', order_id=order_id, client=client,
+                                 parts_total=order.total)
+
+# Фоновые задачи: страница ожидания, статус для опроса и готовый файл
+async def _own_job(job_id: int, with_result: bool = False):
+    job = await tasks.get_job(job_id, with_result=with_result)
+    if job is None or (job.created_by != session.get('user_id') and session.get('user_role') != 'admin'):
+        return None
+    return job
+
+@bp.route('/jobs/<int:job_id>')
+async def job_page(job_id):
+    if not session.get('user_id'):
+        return redirect(url_for('main.login'))
+    job = await _own_job(job_id)
+    if job is None:
+        abort(404)
+    return await render_template('job.html', job=job)
+
+@bp.route('/jobs/<int:job_id>/status')
+async def job_status(job_id):
+    if not session.get('user_id'):
+        return jsonify(error='Требуется вход'), 401
+    job = await _own_job(job_id)
+    if job is None:
+        return jsonify(error='Задача не найдена'), 404
+    payload = tasks.job_payload(job)
+    if payload['has_result']:
+        payload['result_url'] = url_for('main.job_result', job_id=job_id)
+    return jsonify(payload)
+
+@bp.route('/jobs/<int:job_id>/result')
+async def job_result(job_id):
+    if not session.get('user_id'):
+        return redirect(url_for('main.login'))
+    job = await _own_job(job_id, with_result=True)
+    if job is None or job.status != 'done' or job.result is None:
+        abort(404)
+    return await send_file(BytesIO(job.result), mimetype=job.result_type,
+                           as_attachment=True, attachment_filename=job.result_name)
 
 # Удаление клиента (только админ)
 @bp.route('/clients/delete/<int:client_id>', methods=['POST'])
@@ -596,13 +870,14 @@ async def delete_client(client_id):
         await flash('Только администратор может удалять клиентов.', 'danger')
         return redirect(url_for('main.client_list'))
 
-    async with async_session() as s:
+    async with writer() as s:
         client = await s.get(Client, client_id)
         if not client:
             await flash('Клиент не найден.', 'warning')
             return redirect(url_for('main.client_list'))
         
         await s.delete(client)
+        await bump(s, {'clients': -1, **touched('client')})
         await s.commit()
         await flash(f'Клиент "{client.full_name}" удалён.', 'success')
         return redirect(url_for('main.client_list'))
@@ -614,7 +889,7 @@ async def delete_user(user_id):
         await flash('Только администратор может удалять сотрудников.', 'danger')
         return redirect(url_for('main.user_list'))
 
-    async with async_session() as s:
+    async with writer() as s:
         user = await s.get(User, user_id)
         if not user:
             await flash('Пользователь не найден.', 'warning')
@@ -625,6 +900,7 @@ async def delete_user(user_id):
             return redirect(url_for('main.user_list'))
 
         await s.delete(user)
+        await bump(s, {'staff': -1 if user.role != 'client' else 0, **touched('user')})
         await s.commit()
         await flash(f'Сотрудник "{user.full_name}" удалён.', 'success')
         return redirect(url_for('main.user_list'))
@@ -636,13 +912,15 @@ async def delete_part(part_id):
         await flash('Только админ и менеджер могут удалять запчасти.', 'danger')
         return redirect(url_for('main.warehouse'))
 
-    async with async_session() as s:
+    async with writer() as s:
         part = await s.get(Part, part_id)
         if not part:
             await flash('Запчасть не найдена.', 'warning')
             return redirect(url_for('main.warehouse'))
 
+        deltas = await inventory.delete_part_stock(s, part_id)
         await s.delete(part)
+        await bump(s, {**deltas, **touched('part')})
         await s.commit()
         await flash(f'Запчасть "{part.name}" удалена.', 'success')
         return redirect(url_for('main.warehouse'))
\ No newline at end of file
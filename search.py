@@ -0,0 +1,192 @@
+# search.py
+# Поиск по клиентам, машинам и заказам для страницы поиска и подсказок при вводе.
+# SQLite: одна FTS5-таблица search_index, которую ведут триггеры на client/car/order;
+#   rowid = id * 4 + код типа, поэтому обновление записи — точечное удаление по rowid.
+# Postgres: GIN-индексы pg_trgm по выражениям-документам каждой таблицы,
+#   фильтр LIKE по словам запроса идёт по индексу, ранжирование — word_similarity.
+# Полные данные для найденной страницы подтягиваются тремя запросами по id.
+import re
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import joinedload
+from models import Base, reader, Client, Car, Order
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+TYPEAHEAD_LIMIT = 10
+MIN_QUERY_LENGTH = 2
+
+KINDS = ('client', 'car', 'order')
+_KIND_CODES = {'client': 1, 'car': 2, 'order': 3}
+_CODE_KINDS = {code: kind for kind, code in _KIND_CODES.items()}
+
+_WORD = re.compile(r'\w+')
+_PHONE_LIKE = re.compile(r'^[\d\s+()\-]+$')
+
+
+def _sqlite_digits(column: str) -> str:
+    # Телефон только цифрами: "+7 (999) 123-45-67" -> "79991234567"
+    for ch in ('+', ' ', '-', '(', ')'):
+        column = f"replace({column}, '{ch}', '')"
+    return column
+
+
+_SQLITE_DOCUMENTS = {
+    # Цифры телефона кладём целиком и без первой цифры (код страны),
+    # чтобы префикс "999..." находил "+7 999 ..."
+    'client': "new.full_name || ' ' || new.phone || ' ' || {digits} || ' ' || substr({digits}, 2)"
+              " || ' ' || coalesce(new.email, '')".format(digits=_sqlite_digits('new.phone')),
+    'car': "new.make || ' ' || new.model || ' ' || new.year || ' ' || new.vin",
+    'order': "coalesce(new.description, '')",
+}
+
+_PG_DOCUMENTS = {
+    'client': "lower(full_name || ' ' || phone || ' ' || regexp_replace(phone, '\\D', '', 'g')"
+              " || ' ' || coalesce(email, ''))",
+    'car': "lower(make || ' ' || model || ' ' || vin)",
+    'order': "lower(coalesce(description, ''))",
+}
+
+
+# --- DDL ---
+
+def _install_sqlite(conn):
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")).first()
+    if not exists:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE search_index USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')"))
+    for kind, document in _SQLITE_DOCUMENTS.items():
+        rowid = f"new.id * 4 + {_KIND_CODES[kind]}"
+        old_rowid = f"old.id * 4 + {_KIND_CODES[kind]}"
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS search_{kind}_ai AFTER INSERT ON "{kind}" BEGIN '
+            f'INSERT INTO search_index(rowid, body) VALUES ({rowid}, {document}); END'))
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS search_{kind}_au AFTER UPDATE ON "{kind}" BEGIN '
+            f'DELETE FROM search_index WHERE rowid = {old_rowid}; '
+            f'INSERT INTO search_index(rowid, body) VALUES ({rowid}, {document}); END'))
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS search_{kind}_ad AFTER DELETE ON "{kind}" BEGIN '
+            f'DELETE FROM search_index WHERE rowid = {old_rowid}; END'))
+        if not exists:
+            # Первичное наполнение по уже существующим строкам
+            conn.execute(text(
+                f'INSERT INTO search_index(rowid, body) '
+                f'SELECT {rowid}, {document} FROM (SELECT * FROM "{kind}") AS new'))
+
+
+def _install_postgres(conn):
+    conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    for kind, document in _PG_DOCUMENTS.items():
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_{kind}_search_trgm ON "{kind}" '
+            f'USING gin (({document}) gin_trgm_ops)'))
+
+
+def install(conn):
+    # Идемпотентно: вызывается миграцией и после каждого create_all
+    if conn.dialect.name == 'postgresql':
+        _install_postgres(conn)
+    elif conn.dialect.name == 'sqlite':
+        _install_sqlite(conn)
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def _after_create(target, connection, **kw):
+    install(connection)
+
+
+# --- Запросы ---
+
+def _terms(query: str) -> list:
+    query = (query or '').strip().lower()
+    if _PHONE_LIKE.match(query) and any(ch.isdigit() for ch in query):
+        # Телефон вводят как угодно: ищем по цифрам одним словом
+        return [re.sub(r'\D', '', query)]
+    return _WORD.findall(query)
+
+
+async def _ranked_sqlite(s, terms, kinds, limit, offset):
+    match = ' AND '.join('"{}"*'.format(term.replace('"', '')) for term in terms)
+    codes = ', '.join(str(_KIND_CODES[kind]) for kind in kinds)
+    rows = await s.execute(
+        text(f'SELECT rowid FROM search_index WHERE search_index MATCH :match '
+             f'AND rowid % 4 IN ({codes}) ORDER BY rank LIMIT :limit OFFSET :offset'),
+        {'match': match, 'limit': limit, 'offset': offset},
+    )
+    return [(_CODE_KINDS[rowid % 4], rowid // 4) for (rowid,) in rows]
+
+
+async def _ranked_postgres(s, terms, kinds, limit, offset):
+    params = {'query': ' '.join(terms), 'limit': limit, 'offset': offset}
+    for i, term in enumerate(terms):
+        params[f't{i}'] = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    parts = []
+    for kind in kinds:
+        document = _PG_DOCUMENTS[kind]
+        where = ' AND '.join(f'{document} LIKE :t{i}' for i in range(len(terms)))
+        parts.append(f"SELECT '{kind}' AS kind, id, word_similarity(:query, {document}) AS score "
+                     f'FROM "{kind}" WHERE {where}')
+    rows = await s.execute(
+        text(' UNION ALL '.join(parts) + ' ORDER BY score DESC, id DESC LIMIT :limit OFFSET :offset'),
+        params,
+    )
+    return [(kind, ref_id) for kind, ref_id, _ in rows]
+
+
+def _client_item(client):
+    return {'kind': 'client', 'id': client.id, 'client_id': client.id,
+            'label': f"{client.full_name} ({client.phone})"}
+
+
+def _car_item(car):
+    owner = f" — {car.client.full_name}" if car.client else ''
+    return {'kind': 'car', 'id': car.id, 'client_id': car.client_id,
+            'label': f"{car.make} {car.model} {car.year}, VIN {car.vin}{owner}"}
+
+
+def _order_item(order):
+    description = (order.description or '').strip()
+    if len(description) > 80:
+        description = description[:77] + '...'
+    client = order.client.full_name if order.client else '—'
+    return {'kind': 'order', 'id': order.id, 'client_id': order.client_id,
+            'label': f"Заказ №{order.id} ({client}): {description}"}
+
+
+async def _load_items(s, ranked):
+    ids = {kind: [ref_id for k, ref_id in ranked if k == kind] for kind in KINDS}
+    items = {}
+    if ids['client']:
+        for client in (await s.execute(select(Client).where(Client.id.in_(ids['client'])))).scalars():
+            items[('client', client.id)] = _client_item(client)
+    if ids['car']:
+        cars = await s.execute(select(Car).options(joinedload(Car.client)).where(Car.id.in_(ids['car'])))
+        for car in cars.scalars():
+            items[('car', car.id)] = _car_item(car)
+    if ids['order']:
+        orders = await s.execute(
+            select(Order).options(joinedload(Order.client)).where(Order.id.in_(ids['order'])))
+        for order in orders.scalars():
+            items[('order', order.id)] = _order_item(order)
+    # Порядок ранжирования сохраняем; запись могла исчезнуть между запросами
+    return [items[key] for key in ranked if key in items]
+
+
+async def search(query: str, kinds=KINDS, limit: int = SEARCH_LIMIT, offset: int = 0):
+    # Возвращает (результаты, следующий offset или None)
+    terms = _terms(query)
+    kinds = [kind for kind in kinds if kind in KINDS]
+    if not kinds or sum(len(t) for t in terms) < MIN_QUERY_LENGTH:
+        return [], None
+    async with reader() as s:
+        ranked_query = _ranked_postgres if s.get_bind().dialect.name == 'postgresql' else _ranked_sqlite
+        ranked = await ranked_query(s, terms, kinds, limit + 1, offset)
+        has_more = len(ranked) > limit
+        items = await _load_items(s, ranked[:limit])
+    return items, (offset + limit if has_more else None)
+
+
+async def search_client_ids(query: str, limit: int = MAX_SEARCH_LIMIT) -> list:
+    results, _ = await search(query, kinds=('client',), limit=limit)
+    return [item['id'] for item in results]
@@ -0,0 +1,244 @@
+# seed_data.py
+# Синтетические данные для нагрузочных замеров: клиенты, машины, запчасти,
+# заказы и позиции заказов, плюс учётные записи для bench_load.py.
+# Генератор детерминирован (--seed): одинаковые параметры дают одинаковые
+# данные, поэтому замеры разных версий кода сравнимы между собой.
+# Строки пишутся пачками через executemany Core-вставок с заранее выданными
+# id — без ORM-объектов и без обратного чтения id после каждой вставки.
+# Запуск: python seed_data.py --clients 1000000 --parts 20000 [--orders-per-client 3]
+# (DATABASE_URL указывает на базу; схему сначала создаёт python init_db.py)
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, text, insert
+from models import engine, async_session, Client, Car, Part, Order, User, StockMovement, order_part
+import inventory
+from passwords import hash_password
+
+BENCH_PASSWORD = 'bench'
+BENCH_DOMAIN = 'seed.local'
+
+FIRST_NAMES = ('Иван', 'Пётр', 'Анна', 'Мария', 'Сергей', 'Ольга', 'Алексей', 'Елена', 'Дмитрий', 'Наталья')
+LAST_NAMES = ('Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов',
+              'Михайлов', 'Новиков', 'Фёдоров', 'Морозов')
+CARS = {
+    'Lada': ('Vesta', 'Granta', 'Niva'),
+    'Toyota': ('Camry', 'Corolla', 'RAV4'),
+    'Kia': ('Rio', 'Sportage', 'Ceed'),
+    'Hyundai': ('Solaris', 'Creta', 'Tucson'),
+    'Volkswagen': ('Polo', 'Tiguan', 'Passat'),
+}
+PART_KINDS = ('Фильтр масляный', 'Фильтр воздушный', 'Колодки тормозные', 'Диск тормозной',
+              'Свеча зажигания', 'Ремень ГРМ', 'Амортизатор', 'Рычаг подвески', 'Лампа фары',
+              'Щётка стеклоочистителя', 'Аккумулятор', 'Помпа', 'Термостат', 'Сцепление')
+WORKS = ('Замена масла', 'Диагностика подвески', 'Замена колодок', 'Шиномонтаж', 'Ремонт двигателя',
+         'Замена ремня ГРМ', 'Компьютерная диагностика', 'Развал-схождение', 'Замена фильтров')
+# Доли статусов в истории заказов: большинство давно закрыты
+STATUS_WEIGHTS = {'new': 5, 'in_progress': 10, 'completed': 75, 'cancelled': 10}
+
+
+def bench_email(role: str, n: int = 0) -> str:
+    return f'bench-{role}-{n}@{BENCH_DOMAIN}'
+
+
+async def _next_id(s, model) -> int:
+    return (await s.scalar(select(func.max(model.id))) or 0) + 1
+
+
+async def _insert_batches(s, table, rows, batch_size: int) -> int:
+    # rows — генератор словарей; в памяти одновременно только одна пачка
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            await s.execute(insert(table), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        await s.execute(insert(table), batch)
+        total += len(batch)
+    return total
+
+
+async def _reset_sequences(s, models):
+    # Postgres: id выдавали мы, счётчики serial надо догнать до max(id)
+    if s.get_bind().dialect.name != 'postgresql':
+        return
+    for model in models:
+        table = model.__tablename__
+        await s.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f"coalesce((SELECT max(id) FROM \"{table}\"), 1))"))
+
+
+async def seed_users(s, clients: int, managers: int = 2, masters: int = 5) -> dict:
+    # Учётные записи для сценариев нагрузки; повторный запуск их не дублирует
+    password_hash = await hash_password(BENCH_PASSWORD)
+    wanted = [('client', n) for n in range(clients)] + \
+             [('manager', n) for n in range(managers)] + [('master', n) for n in range(masters)]
+    existing = set((await s.execute(
+        select(User.email).where(User.email.like(f'bench-%@{BENCH_DOMAIN}')))).scalars())
+    s.add_all(
+        User(full_name=f'Нагрузка {role} {n}', email=bench_email(role, n), phone='+70000000000',
+             password_hash=password_hash, role=role)
+        for role, n in wanted if bench_email(role, n) not in existing
+    )
+    await s.flush()
+    rows = await s.execute(select(User.id, User.role).where(User.email.like(f'bench-%@{BENCH_DOMAIN}')))
+    users = {}
+    for user_id, role in rows:
+        users.setdefault(role, []).append(user_id)
+    return users
+
+
+async def seed(clients: int = 1000, parts: int = 500, orders_per_client: float = 3,
+               max_parts_per_order: int = 3, cars_per_client: float = 1.3, days: int = 365,
+               bench_users: int = 20, seed_value: int = 42, batch_size: int = 5000,
+               log=print) -> dict:
+    rnd = random.Random(seed_value)
+    statuses = list(STATUS_WEIGHTS)
+    status_weights = list(STATUS_WEIGHTS.values())
+    now = datetime.utcnow()
+    counts = {}
+
+    async with async_session() as s:
+        users = await seed_users(s, bench_users)
+        order_authors = users.get('client') or [None]
+        masters = users.get('master') or [None]
+        first_client = await _next_id(s, Client)
+        first_car = await _next_id(s, Car)
+        first_part = await _next_id(s, Part)
+        first_order = await _next_id(s, Order)
+        await s.commit()
+
+    def client_rows():
+        for i in range(clients):
+            cid = first_client + i
+            yield {'id': cid,
+                   'full_name': f'{rnd.choice(LAST_NAMES)} {rnd.choice(FIRST_NAMES)} {cid}',
+                   'phone': f'+7{9000000000 + cid}',
+                   'email': f'client{cid}@{BENCH_DOMAIN}' if rnd.random() < 0.6 else None,
+                   'address': None}
+
+    def car_rows():
+        car_id = first_car
+        for i in range(clients):
+            # В среднем cars_per_client машин, но у каждого клиента хотя бы одна
+            for _ in range(1 + (rnd.random() < cars_per_client - 1)):
+                make = rnd.choice(list(CARS))
+                yield {'id': car_id, 'client_id': first_client + i, 'make': make,
+                       'model': rnd.choice(CARS[make]), 'year': rnd.randint(2000, now.year),
+                       'vin': f'S{car_id:016d}'}
+                car_id += 1
+
+    # Цены запчастей нужны позициям заказов (unit_price) и итогам заказов
+    part_prices = []
+
+    def part_rows():
+        for i in range(parts):
+            pid = first_part + i
+            name = f'{rnd.choice(PART_KINDS)} {pid}'
+            part_prices.append(rnd.randint(100, 30000))
+            yield {'id': pid, 'sku': f'SEED-{pid:08d}', 'name': name, 'price': part_prices[i]}
+
+    def receipt_rows():
+        # Начальные остатки — приходы в журнале склада, в снимок их сворачивает compact()
+        for i in range(parts):
+            yield inventory.movement(first_part + i, 'receipt', rnd.randint(1, 500))
+
+    # Позиции копятся вместе с заказами пачки и пишутся сразу после них (FK)
+    pending_items = []
+
+    def order_rows():
+        order_id = first_order
+        total = int(clients * orders_per_client)
+        for _ in range(total):
+            status = rnd.choices(statuses, status_weights)[0]
+            row = {'id': order_id, 'client_id': first_client + rnd.randrange(clients),
+                   'user_id': rnd.choice(order_authors),
+                   'assignee_id': None if status == 'new' else rnd.choice(masters),
+                   'status': status,
+                   'created_at': now - timedelta(seconds=rnd.randrange(days * 86400)),
+                   'description': rnd.choice(WORKS),
+                   'total': 0, 'parts_count': 0}
+            if parts:
+                for part_id in rnd.sample(range(parts), rnd.randint(0, min(max_parts_per_order, parts))):
+                    item = {'order_id': order_id, 'part_id': first_part + part_id,
+                            'quantity': rnd.randint(1, 4), 'unit_price': part_prices[part_id]}
+                    pending_items.append(item)
+                    row['total'] += item['quantity'] * item['unit_price']
+                    row['parts_count'] += item['quantity']
+            yield row
+            order_id += 1
+
+    def chunks(rows):
+        # Заказы и их позиции уходят вместе, чтобы не держать в памяти все позиции
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    steps = (('client', Client.__table__, client_rows), ('car', Car.__table__, car_rows),
+             ('part', Part.__table__, part_rows), ('stockmovement', StockMovement.__table__, receipt_rows))
+    for name, table, rows in steps:
+        started = time.perf_counter()
+        async with async_session() as s:
+            counts[name] = await _insert_batches(s, table, rows(), batch_size)
+            await s.commit()
+        log(f"{name:10} {counts[name]:>10} строк за {time.perf_counter() - started:.1f} с")
+
+    started = time.perf_counter()
+    counts['order'] = counts['order_part'] = 0
+    async with async_session() as s:
+        for batch in chunks(order_rows()):
+            await s.execute(insert(Order.__table__), batch)
+            if pending_items:
+                await s.execute(insert(order_part), pending_items)
+            counts['order'] += len(batch)
+            counts['order_part'] += len(pending_items)
+            pending_items.clear()
+            # Длинная транзакция на миллионы строк раздувает журнал — коммитим пачками
+            await s.commit()
+    log(f"{'order':10} {counts['order']:>10} строк, позиций {counts['order_part']} "
+        f"за {time.perf_counter() - started:.1f} с")
+
+    await inventory.compact()
+    async with async_session() as s:
+        await _reset_sequences(s, (Client, Car, Part, Order))
+        # Счётчики дашборда и версии страниц по новым данным
+        from stats import rebuild, bump, touched
+        await rebuild(s)
+        await bump(s, touched('client', 'car', 'part', 'order'))
+        await s.commit()
+    return counts
+
+
+async def main(args):
+    started = time.perf_counter()
+    counts = await seed(clients=args.clients, parts=args.parts, orders_per_client=args.orders_per_client,
+                        max_parts_per_order=args.max_parts_per_order, days=args.days,
+                        bench_users=args.bench_users, seed_value=args.seed, batch_size=args.batch_size)
+    await engine.dispose()
+    print(f"Готово за {time.perf_counter() - started:.1f} с: {counts}")
+    print(f"Входы для bench_load.py: {bench_email('client')} / {bench_email('manager')}, "
+          f"пароль {BENCH_PASSWORD}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Синтетические данные для нагрузочных замеров')
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--parts', type=int, default=1000)
+    parser.add_argument('--orders-per-client', type=float, default=3)
+    parser.add_argument('--max-parts-per-order', type=int, default=3)
+    parser.add_argument('--days', type=int, default=365, help='глубина истории заказов')
+    parser.add_argument('--bench-users', type=int, default=20, help='клиентов с паролем для сценариев входа')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+// static/job_status.js
+// Страница фоновой задачи: ждём событие 'job' по SSE и на всякий случай
+// опрашиваем статус, пока задача не завершится.
+(function () {
+    var card = document.querySelector('[data-job-status]');
+    // Уже завершённая задача: страница отрисована сервером, ждать нечего
+    if (!card || !('jobPending' in card.dataset)) {
+        return;
+    }
+    var statusUrl = card.dataset.jobStatus;
+    var text = card.querySelector('[data-field="status"]');
+    var link = card.querySelector('[data-field="result"]');
+    var source = null;
+    var timer = null;
+
+    function show(job) {
+        if (job.status === 'done') {
+            text.textContent = 'Готово.';
+            if (job.has_result) {
+                link.hidden = false;
+                if (job.result_url) {
+                    location.href = job.result_url;
+                }
+            }
+        } else if (job.status === 'failed') {
+            text.textContent = 'Не удалось выполнить: ' + (job.error || 'ошибка');
+        } else {
+            return false;
+        }
+        clearInterval(timer);
+        if (source) {
+            source.close();
+        }
+        return true;
+    }
+
+    function poll() {
+        fetch(statusUrl, {credentials: 'same-origin'})
+            .then(function (r) { return r.ok ? r.json() : null; })
+            .then(function (job) { if (job) { show(job); } });
+    }
+
+    if (window.EventSource) {
+        source = new EventSource(card.dataset.jobEvents);
+        source.addEventListener('job', function (e) {
+            var event = JSON.parse(e.data);
+            if (String(event.job.id) === card.dataset.jobId) {
+                poll();  // ссылку на результат отдаёт эндпоинт статуса
+            }
+        });
+    }
+    timer = setInterval(poll, 3000);
+    poll();
+})();
@@ -0,0 +1,118 @@
+// static/order_updates.js
+// Живое обновление таблицы заказов: новые заказы добавляются сверху,
+// у существующих меняется статус. WebSocket, при недоступности — SSE.
+(function () {
+    var table = document.querySelector('table[data-live-orders]');
+    if (!table) {
+        return;
+    }
+    var tbody = table.querySelector('tbody');
+    var mode = table.dataset.liveOrders;
+    // Новые строки имеют смысл только на первой странице без фильтров
+    var firstPage = !/[?&](cursor|status|client_id|date_from|date_to)=./.test(location.search);
+    var retry = 1000;
+
+    function cell(text) {
+        var td = document.createElement('td');
+        td.textContent = text;
+        return td;
+    }
+
+    function assignedToViewer(order) {
+        return order.assignee_id != null && String(order.assignee_id) === table.dataset.viewerId;
+    }
+
+    function addRow(order) {
+        // Мастер видит только свою очередь: чужие новые заказы в неё не попадают,
+        // а назначенные ему (менеджером или кнопкой "взять") — появляются
+        if (mode === 'worker' && !table.dataset.liveNew && !assignedToViewer(order)) {
+            return;
+        }
+        if (!firstPage || tbody.querySelector('tr[data-order-id="' + order.id + '"]')) {
+            return;
+        }
+        var tr = document.createElement('tr');
+        tr.dataset.orderId = order.id;
+        tr.appendChild(cell(order.id));
+        var status = cell(order.status);
+        if (mode === 'worker') {
+            tr.appendChild(cell(order.client_name || '—'));
+            if (table.dataset.assigneeColumn) {
+                tr.appendChild(cell('—'));
+            }
+            status.dataset.field = 'status';
+            tr.appendChild(status);
+            var actions = document.createElement('td');
+            var link = document.createElement('a');
+            link.href = table.dataset.reportUrl.replace(/\/0$/, '/' + order.id);
+            link.className = 'btn btn-sm btn-info';
+            link.textContent = '📝 Отчёт';
+            actions.appendChild(link);
+            tr.appendChild(actions);
+        } else {
+            tr.appendChild(cell(order.description || 'Нет описания'));
+            var badge = document.createElement('span');
+            badge.className = 'badge';
+            badge.dataset.field = 'status';
+            badge.textContent = order.status;
+            var td = document.createElement('td');
+            td.appendChild(badge);
+            tr.appendChild(td);
+            tr.appendChild(cell(order.created_at ? order.created_at.slice(0, 10).split('-').reverse().join('.') : '—'));
+        }
+        tbody.insertBefore(tr, tbody.firstChild);
+        var empty = document.querySelector('[data-live-empty]');
+        if (empty) {
+            empty.remove();
+        }
+    }
+
+    function setStatus(order) {
+        var field = tbody.querySelector('tr[data-order-id="' + order.id + '"] [data-field="status"]');
+        if (field) {
+            field.textContent = order.status;
+        } else if (mode === 'worker' && assignedToViewer(order)) {
+            addRow(order);
+        }
+    }
+
+    function handle(event) {
+        retry = 1000;
+        if (event.type === 'order_created') {
+            addRow(event.order);
+        } else if (event.type === 'order_status') {
+            setStatus(event.order);
+        }
+    }
+
+    function connectSSE() {
+        var source = new EventSource('/events/orders');
+        ['order_created', 'order_status'].forEach(function (type) {
+            source.addEventListener(type, function (e) { handle(JSON.parse(e.data)); });
+        });
+    }
+
+    function connect() {
+        if (!window.WebSocket) {
+            connectSSE();
+            return;
+        }
+        var opened = false;
+        var ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws/orders');
+        ws.onopen = function () { opened = true; };
+        ws.onmessage = function (e) { handle(JSON.parse(e.data)); };
+        ws.onclose = function (e) {
+            if (!opened) {
+                connectSSE();
+            } else if (e.code === 1013) {
+                // Пропустили события — надёжнее перечитать страницу
+                location.reload();
+            } else {
+                setTimeout(connect, retry);
+                retry = Math.min(retry * 2, 30000);
+            }
+        };
+    }
+
+    connect();
+})();
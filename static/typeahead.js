@@ -0,0 +1,45 @@
+// static/typeahead.js
+// Подсказки при вводе: поле с data-typeahead запрашивает совпадения
+// и записывает id выбранного варианта в скрытое поле data-target.
+document.querySelectorAll('input[data-typeahead]').forEach(function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var target = document.getElementById(input.dataset.target);
+    var options = {};
+    var timer = null;
+    var pending = null;
+
+    function choose() {
+        var id = options[input.value];
+        target.value = id || '';
+        input.setCustomValidity(id ? '' : 'Выберите вариант из списка');
+    }
+
+    input.addEventListener('input', function () {
+        choose();
+        clearTimeout(timer);
+        var query = input.value.trim();
+        if (query.length < 2 || options[input.value]) {
+            return;
+        }
+        timer = setTimeout(function () {
+            if (pending) {
+                pending.abort();
+            }
+            pending = new AbortController();
+            fetch(input.dataset.typeahead + '&q=' + encodeURIComponent(query), {signal: pending.signal})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    options = {};
+                    list.innerHTML = '';
+                    (data.results || []).forEach(function (item) {
+                        options[item.label] = item.id;
+                        var option = document.createElement('option');
+                        option.value = item.label;
+                        list.appendChild(option);
+                    });
+                    choose();
+                })
+                .catch(function () {});
+        }, 200);
+    });
+});
@@ -0,0 +1,202 @@
+# stats.py
+# Статистика для /reports без полных сканирований таблиц.
+# Счётчики (StatCounter) и дневной rollup заказов (OrderDailyStat) обновляются
+# в тех же транзакциях, что и сами данные; дашборд читает их одним запросом,
+# а перед ним стоит короткий кэш в памяти процесса.
+# Rollup хранит по дню и статусу ещё сумму Order.total и штуки запчастей:
+# выручка (выполненные заказы) и расход запчастей (все, кроме отменённых)
+# по дням и месяцам складываются из него, без чтения заказов и прайса.
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, delete, cast, null, literal, union_all, text, Date
+from config import Config
+from models import (async_session, reader, StatCounter, OrderDailyStat, Client, User, Order, StockSnapshot,
+                    ORDER_STATUSES, dialect_insert)
+
+DAILY_WINDOW = 30  # дней в отчёте по датам
+MONTHLY_WINDOW = 12  # месяцев в отчёте по выручке
+REVENUE_STATUSES = ('completed',)
+VERSION_PREFIX = 'version:'
+
+_cache = {'value': None, 'expires': 0.0}
+
+
+def invalidate_cache():
+    _cache['value'] = None
+
+
+def month_start(day, shift: int = 0):
+    # Первое число месяца day, сдвинутого на shift месяцев
+    index = day.year * 12 + day.month - 1 + shift
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+async def bump(s, deltas: dict):
+    # Прибавляет дельты к нескольким счётчикам одним INSERT ... ON CONFLICT.
+    # Имена сортируются, чтобы параллельные транзакции брали строки в одном порядке;
+    # поэтому в транзакции один bump() — после блокировок запчастей (inventory.py)
+    # и перед строками дневного rollup.
+    rows = [{'name': name, 'value': delta} for name, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    stmt = dialect_insert(s, StatCounter).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'value': StatCounter.value + stmt.excluded.value},
+    )
+    await s.execute(stmt)
+
+
+def touched(*tables) -> dict:
+    # Дельты версий таблиц для bump(): по ним считаются ETag и ключи кэша страниц
+    return {f'{VERSION_PREFIX}{table}': 1 for table in tables}
+
+
+async def table_versions(tables) -> tuple:
+    # Одна выборка по первичному ключу statcounter; отсутствующая версия = 0
+    names = [f'{VERSION_PREFIX}{table}' for table in tables]
+    async with reader() as s:
+        rows = dict((await s.execute(
+            select(StatCounter.name, StatCounter.value).where(StatCounter.name.in_(names))
+        )).all())
+    return tuple(rows.get(name, 0) for name in names)
+
+
+async def bump_order_day(s, day, status: str, delta: int = 1, revenue: int = 0, parts: int = 0):
+    stmt = dialect_insert(s, OrderDailyStat).values(day=day, status=status, orders=delta,
+                                                    revenue=revenue, parts=parts)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['day', 'status'],
+        set_={'orders': OrderDailyStat.orders + stmt.excluded.orders,
+              'revenue': OrderDailyStat.revenue + stmt.excluded.revenue,
+              'parts': OrderDailyStat.parts + stmt.excluded.parts},
+    )
+    await s.execute(stmt)
+
+
+async def record_new_order(s, order):
+    # Остаток запчастей считает inventory.record() вместе с движениями склада
+    await bump(s, {'orders': 1, f'status:{order.status}': 1, **touched('order')})
+    await bump_order_day(s, order.created_at.date(), order.status,
+                         revenue=order.total or 0, parts=order.parts_count or 0)
+
+
+async def record_status_change(s, order, old_status: str, new_status: str):
+    # order — строка с created_at, total и parts_count (RETURNING из workflow.py)
+    if old_status == new_status:
+        return
+    await bump(s, {f'status:{old_status}': -1, f'status:{new_status}': 1, **touched('order')})
+    day = order.created_at.date()
+    total, parts = order.total or 0, order.parts_count or 0
+    await bump_order_day(s, day, old_status, -1, -total, -parts)
+    await bump_order_day(s, day, new_status, 1, total, parts)
+
+
+async def rebuild(s):
+    # Полный пересчёт со сканированием таблиц — только для первичного заполнения,
+    # поэтому без лимита времени запроса (действует до конца транзакции)
+    if s.get_bind().dialect.name == 'postgresql':
+        await s.execute(text('SET LOCAL statement_timeout = 0'))
+    counters = {
+        'clients': await s.scalar(select(func.count(Client.id))),
+        'staff': await s.scalar(select(func.count(User.id)).where(User.role != 'client')),
+        'orders': await s.scalar(select(func.count(Order.id))),
+        # Остаток склада — по снимкам: несвёрнутые движения добавит следующая свёртка
+        'parts_stock': await s.scalar(select(func.coalesce(func.sum(StockSnapshot.stock), 0))),
+    }
+    for status, n in await s.execute(select(Order.status, func.count(Order.id)).group_by(Order.status)):
+        counters[f'status:{status}'] = n
+
+    day = func.date(Order.created_at)
+    daily = await s.execute(
+        select(day, Order.status, func.count(Order.id),
+               func.coalesce(func.sum(Order.total), 0), func.coalesce(func.sum(Order.parts_count), 0))
+        .where(Order.created_at.is_not(None), Order.status.is_not(None))
+        .group_by(day, Order.status)
+    )
+
+    # Версии таблиц не пересчитываются: их сброс дал бы совпадение со старыми ETag
+    await s.execute(delete(StatCounter).where(StatCounter.name.not_like(f'{VERSION_PREFIX}%')))
+    await s.execute(delete(OrderDailyStat))
+    s.add_all(StatCounter(name=name, value=value or 0) for name, value in counters.items())
+    s.add_all(
+        OrderDailyStat(day=d if not isinstance(d, str) else datetime.strptime(d, '%Y-%m-%d').date(),
+                       status=status, orders=n, revenue=revenue, parts=parts)
+        for d, status, n, revenue, parts in daily
+    )
+    invalidate_cache()
+
+
+async def ensure_stats():
+    # Заполняет счётчики, если таблица пустая (первый запуск на существующих данных)
+    async with async_session() as s:
+        if await s.scalar(select(func.count()).select_from(StatCounter)):
+            return
+        await rebuild(s)
+        await s.commit()
+
+
+async def get_dashboard_stats():
+    now = time.monotonic()
+    if _cache['value'] is not None and _cache['expires'] > now:
+        return _cache['value']
+
+    today = datetime.utcnow().date()
+    since = today - timedelta(days=DAILY_WINDOW - 1)
+    months = [month_start(today, -i) for i in range(MONTHLY_WINDOW)]
+    # Один запрос: все счётчики + дневной rollup за окно (месяцы — из тех же строк)
+    query = union_all(
+        select(StatCounter.name, StatCounter.value, cast(null(), Date).label('day'),
+               literal(0).label('revenue'), literal(0).label('parts')),
+        select(OrderDailyStat.status, OrderDailyStat.orders, OrderDailyStat.day,
+               OrderDailyStat.revenue, OrderDailyStat.parts)
+        .where(OrderDailyStat.day >= min(since, months[-1])),
+    )
+    async with reader() as s:
+        rows = (await s.execute(query)).all()
+
+    counters = {}
+    by_day = {}
+    revenue_by_day = {}
+    by_month = {month: [0, 0, 0] for month in months}  # выручка, выполнено заказов, штук запчастей
+    for name, value, day, revenue, parts in rows:
+        if day is None:
+            counters[name] = value
+            continue
+        if isinstance(day, str):
+            day = datetime.strptime(day, '%Y-%m-%d').date()
+        revenue = revenue if name in REVENUE_STATUSES else 0
+        parts = parts if name != 'cancelled' else 0
+        month = by_month.get(day.replace(day=1))
+        if month is not None:
+            month[0] += revenue
+            month[1] += value if name in REVENUE_STATUSES else 0
+            month[2] += parts
+        if day < since:
+            continue
+        if value:
+            by_day.setdefault(day, {})[name] = value
+        if revenue or parts:
+            totals = revenue_by_day.setdefault(day, [0, 0])
+            totals[0] += revenue
+            totals[1] += parts
+
+    stats = {
+        'clients_count': counters.get('clients') or 0,
+        'users_count': counters.get('staff') or 0,
+        'parts_count': counters.get('parts_stock') or 0,
+        'orders_count': counters.get('orders') or 0,
+        'orders_by_status': {st: counters.get(f'status:{st}') or 0 for st in ORDER_STATUSES},
+        'orders_by_day': [
+            (day, statuses, sum(statuses.values()))
+            for day, statuses in sorted(by_day.items(), reverse=True)
+        ],
+        'revenue_period': sum(revenue for revenue, _ in revenue_by_day.values()),
+        'revenue_by_day': [
+            (day, revenue, parts) for day, (revenue, parts) in sorted(revenue_by_day.items(), reverse=True)
+        ],
+        'revenue_by_month': [(month, *by_month[month]) for month in months],
+    }
+    _cache['value'] = stats
+    _cache['expires'] = now + Config.STATS_CACHE_TTL
+    return stats
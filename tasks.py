@@ -0,0 +1,277 @@
+# tasks.py
+# Фоновые задачи: обработчик запроса ставит задачу в очередь, сразу отвечает
+# номером задачи, а TaskRunner выполняет её вне запроса.
+# Задачи хранятся в таблице job, поэтому переживают перезапуск и видны всем
+# воркерам. У каждой очереди своё число одновременных задач на воркер.
+# Взятая задача "арендуется": run_after сдвигается на TASK_LEASE и продлевается,
+# пока обработчик работает. Если воркер упал, задачу после конца аренды возьмёт
+# другой; результат воркера, потерявшего аренду, отбрасывается.
+# Ошибка обработчика — повтор с удвоением паузы, после max_attempts — failed.
+# О смене статуса задачи сообщается событием 'job' через events.broker.
+import asyncio
+import importlib
+import json
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, func
+from config import Config
+from models import writer, reader, Job
+import events
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ('queued', 'running')
+
+# Готовый файл задачи: отдаётся по /jobs/<id>/result
+Result = namedtuple('Result', 'data filename mimetype')
+
+TASKS = {}
+# Модули с обработчиками: импортируются при первой постановке или старте воркеров
+TASK_MODULES = ('reports', 'parts_import')
+
+
+class TaskQueueFull(RuntimeError):
+    pass
+
+
+def task(queue: str = 'default', name: str = None, max_attempts: int = None):
+    # Регистрирует корутину-обработчик; аргументы задачи — её именованные параметры
+    def register(fn):
+        fn.queue = queue
+        fn.max_attempts = max_attempts or Config.TASK_MAX_ATTEMPTS
+        TASKS[name or fn.__name__] = fn
+        return fn
+    return register
+
+
+def load_tasks():
+    for module in TASK_MODULES:
+        importlib.import_module(module)
+
+
+def parse_queues(spec: str) -> dict:
+    queues = {}
+    for item in spec.split(','):
+        name, _, concurrency = item.strip().partition('=')
+        if name:
+            queues[name] = max(1, int(concurrency or 1))
+    return queues
+
+
+def job_payload(job) -> dict:
+    return {
+        'id': job.id,
+        'name': job.name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'user_id': job.created_by,
+        'has_result': job.status == 'done' and job.result_name is not None,
+        'error': job.error if job.status == 'failed' else None,
+    }
+
+
+async def enqueue(name: str, user_id: int = None, **args) -> int:
+    load_tasks()
+    handler = TASKS[name]
+    async with writer() as s:
+        # Ограничение мягкое: воркеры считают независимо, но очередь не растёт без конца
+        depth = await s.scalar(
+            select(func.count(Job.id)).where(Job.queue == handler.queue, Job.status == 'queued'))
+        if depth >= Config.TASK_QUEUE_LIMIT:
+            raise TaskQueueFull(f"Очередь {handler.queue} переполнена")
+        job = Job(queue=handler.queue, name=name, args=json.dumps(args, ensure_ascii=False),
+                  max_attempts=handler.max_attempts, created_by=user_id)
+        s.add(job)
+        await s.commit()
+        job_id = job.id
+    runner.notify(handler.queue)
+    return job_id
+
+
+async def get_job(job_id: int, with_result: bool = False):
+    columns = [Job.id, Job.name, Job.status, Job.attempts, Job.created_by, Job.error,
+               Job.result_name, Job.result_type, Job.created_at, Job.finished_at]
+    if with_result:
+        columns.append(Job.result)
+    async with reader() as s:
+        return (await s.execute(select(*columns).where(Job.id == job_id))).first()
+
+
+async def queue_depth(queue: str) -> int:
+    async with reader() as s:
+        return await s.scalar(
+            select(func.count(Job.id)).where(Job.queue == queue, Job.status.in_(ACTIVE)))
+
+
+class TaskRunner:
+    def __init__(self, queues: dict, lease: int = 300, retry_base: int = 10,
+                 poll_interval: int = 5, result_ttl: int = 86400):
+        self.queues = queues
+        self.lease = lease
+        self.retry_base = retry_base
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self._workers = []
+        self._wakeup = {}
+
+    async def start(self):
+        load_tasks()
+        await self.purge()
+        for queue, concurrency in self.queues.items():
+            self._wakeup[queue] = asyncio.Event()
+            for _ in range(concurrency):
+                self._workers.append(asyncio.create_task(self._run(queue)))
+
+    async def stop(self):
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._wakeup = {}
+
+    def notify(self, queue: str):
+        wakeup = self._wakeup.get(queue)
+        if wakeup is not None:
+            wakeup.set()
+
+    async def _run(self, queue: str):
+        wakeup = self._wakeup[queue]
+        while True:
+            try:
+                if await self.run_next(queue):
+                    continue
+            except Exception:
+                logger.exception("Ошибка фоновой очереди %s", queue)
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+
+    async def _claim(self, queue: str):
+        # Одна задача за один условный UPDATE: свободная или с истёкшей арендой
+        now = datetime.utcnow()
+        async with writer() as s:
+            candidate = (
+                select(Job.id)
+                .where(Job.queue == queue, Job.status.in_(ACTIVE), Job.run_after <= now)
+                .order_by(Job.run_after, Job.id)
+                .limit(1)
+            )
+            if s.get_bind().dialect.name != 'sqlite':
+                candidate = candidate.with_for_update(skip_locked=True)
+            row = (await s.execute(
+                update(Job)
+                .where(Job.id == candidate.scalar_subquery(),
+                       Job.status.in_(ACTIVE), Job.run_after <= now)
+                .values(status='running', attempts=Job.attempts + 1, started_at=now,
+                        run_after=now + timedelta(seconds=self.lease))
+                .returning(Job.id, Job.name, Job.args, Job.attempts, Job.max_attempts)
+                .execution_options(synchronize_session=False)
+            )).first()
+            await s.commit()
+        return row
+
+    async def run_next(self, queue: str) -> bool:
+        # Выполнить одну готовую задачу очереди; False — очередь пуста
+        claimed = await self._claim(queue)
+        if claimed is None:
+            return False
+        job_id, name, args, attempts, max_attempts = claimed
+
+        values = {'finished_at': datetime.utcnow()}
+        try:
+            if name not in TASKS:
+                load_tasks()
+            handler = TASKS.get(name)
+            if handler is None:
+                raise LookupError(f"Неизвестная задача {name}")
+            result = await self._leased(job_id, attempts, handler(**json.loads(args)))
+        except asyncio.CancelledError:
+            # Воркер останавливается — возвращаем задачу в очередь без траты попытки
+            await asyncio.shield(self._finish(job_id, attempts, {
+                'status': 'queued', 'attempts': attempts - 1, 'run_after': datetime.utcnow()}))
+            raise
+        except Exception as e:
+            logger.warning("Задача %s (%s) упала, попытка %s: %s", job_id, name, attempts, e)
+            values['error'] = str(e) or e.__class__.__name__
+            if attempts >= max_attempts:
+                values['status'] = 'failed'
+            else:
+                values['status'] = 'queued'
+                values['run_after'] = datetime.utcnow() + timedelta(
+                    seconds=self.retry_base * 2 ** (attempts - 1))
+        else:
+            values.update(status='done', error=None)
+            if isinstance(result, Result):
+                values.update(result=result.data, result_name=result.filename,
+                              result_type=result.mimetype)
+
+        job = await self._finish(job_id, attempts, values)
+        if job is None:
+            logger.warning("Задача %s (%s): аренда потеряна, результат отброшен", job_id, name)
+        elif job.status in ('done', 'failed'):
+            await events.broker.publish({'type': 'job', 'job': job_payload(job)})
+        return True
+
+    async def _leased(self, job_id: int, attempts: int, coro):
+        # Обработчик под продлеваемой арендой
+        heartbeat = asyncio.create_task(self._renew(job_id, attempts))
+        try:
+            return await coro
+        finally:
+            heartbeat.cancel()
+
+    async def _renew(self, job_id: int, attempts: int):
+        # Каждую треть аренды сдвигаем run_after, пока задача наша:
+        # attempts меняется, только если задачу взял другой воркер
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                async with writer() as s:
+                    result = await s.execute(
+                        update(Job)
+                        .where(Job.id == job_id, Job.status == 'running', Job.attempts == attempts)
+                        .values(run_after=datetime.utcnow() + timedelta(seconds=self.lease))
+                        .execution_options(synchronize_session=False)
+                    )
+                    await s.commit()
+            except Exception:
+                logger.exception("Не удалось продлить аренду задачи %s", job_id)
+                continue
+            if not result.rowcount:
+                logger.warning("Задача %s перехвачена другим воркером", job_id)
+                return
+
+    async def _finish(self, job_id: int, attempts: int, values: dict):
+        # Только если задачу за это время не перехватили после истечения аренды
+        async with writer() as s:
+            job = (await s.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == 'running', Job.attempts == attempts)
+                .values(**values)
+                .returning(Job.id, Job.name, Job.status, Job.attempts, Job.created_by,
+                           Job.error, Job.result_name)
+                .execution_options(synchronize_session=False)
+            )).first()
+            await s.commit()
+        return job
+
+    async def purge(self) -> int:
+        # Завершённые задачи с результатами не копятся бесконечно
+        before = datetime.utcnow() - timedelta(seconds=self.result_ttl)
+        async with writer() as s:
+            result = await s.execute(
+                delete(Job).where(Job.status.in_(('done', 'failed')), Job.finished_at < before))
+            await s.commit()
+        return result.rowcount
+
+
+runner = TaskRunner(
+    parse_queues(Config.TASK_QUEUES),
+    lease=Config.TASK_LEASE,
+    retry_base=Config.TASK_RETRY_BASE,
+    poll_interval=Config.TASK_POLL_INTERVAL,
+    result_ttl=Config.TASK_RESULT_TTL,
+)
@@ -42,7 +42,7 @@ async def test_create_order_insufficient_stock(app_instance):
     async with app_instance.app_context():
         # 1. Имитируем ситуацию: в базу добавляется запчасть, которой НЕТ в наличии (stock=0)
         async with async_session() as s:
-            test_part = Part(name="Деталь без остатка", price=1000, stock=0)
+            test_part = Part(name="Деталь без остатка", price=1000)
             s.add(test_part)
             await s.commit()
             await s.refresh(test_part)
@@ -58,4 +58,25 @@ async def test_create_order_insufficient_stock(app_instance):
             )
         
         # 3. Убеждаемся, что ошибка именно та, которую мы написали в routes.py
-        assert "Недостаточно запчастей" in str(excinfo.value)
\ No newline at end of file
+        assert "Недостаточно запчастей" in str(excinfo.value)
+
+# --- ТЕСТ 3: Списки читаются строками Core, без ORM-сущностей ---
+
+@pytest.mark.asyncio
+async def test_list_pages_use_core_rows(test_client, login_as):
+    from routes import get_all_clients, get_all_users, get_clients_by_ids, create_client, create_user
+    from models import Client, User
+
+    client = await create_client("Строкова Анна", "+70000000005", email="rows@test.ru")
+    await create_user("Мастер Строк", "rows-master@test.ru", "+7", "pw", role='master')
+    clients = await get_all_clients()
+    users = await get_all_users()
+    assert clients and users
+    assert not isinstance(clients[0], Client) and not isinstance(users[0], User)
+    assert [c.email for c in await get_clients_by_ids([client.id])] == ["rows@test.ru"]
+
+    await login_as(test_client, role='admin')
+    html = (await (await test_client.get('/clients')).get_data()).decode('utf-8')
+    assert "Строкова Анна" in html and "rows@test.ru" in html
+    html = (await (await test_client.get('/users')).get_data()).decode('utf-8')
+    assert "rows-master@test.ru" in html
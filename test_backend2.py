@@ -9,7 +9,7 @@ async def test_create_order_insufficient_stock(app_instance):
     async with app_instance.app_context():
         # 1. Имитируем ситуацию: в базу добавляется запчасть, которой НЕТ в наличии (stock=0)
         async with async_session() as s:
-            test_part = Part(name="Деталь без остатка", price=1000, stock=0)
+            test_part = Part(name="Деталь без остатка", price=1000)
             s.add(test_part)
             await s.commit()
             await s.refresh(test_part)
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import pytest
+from events import Broker, LocalBackend, viewer_filter, broker
+from routes import create_client, create_order
+
+
+# --- Брокер: фильтр по зрителю и отключение отставшего подписчика ---
+
+@pytest.mark.asyncio
+async def test_broker_filters_and_drops_slow_subscribers():
+    local = Broker(LocalBackend(), queue_size=2)
+    await local.start()
+    staff = local.subscribe(viewer_filter('master', 1))
+    client = local.subscribe(viewer_filter('client', 7))
+
+    await local.publish({'type': 'order_created', 'order': {'id': 1, 'user_id': 7}})
+    await local.publish({'type': 'order_created', 'order': {'id': 2, 'user_id': 8}})
+    assert (await client.get())['order']['id'] == 1
+    assert client.queue.empty()
+
+    await local.publish({'type': 'order_created', 'order': {'id': 3, 'user_id': 8}})
+    assert staff.overflowed
+    assert await staff.get() is None
+
+    staff.close()
+    client.close()
+    assert local.subscriber_count == 0
+    await local.stop()
+
+
+# --- Новый заказ приходит мастеру по WebSocket ---
+
+@pytest.mark.asyncio
+async def test_order_created_pushed_over_websocket(app_instance):
+    test_client = app_instance.test_client()
+    async with test_client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['user_role'] = 'master'
+
+    client = await create_client('Событийный Клиент', '+70000000555')
+    async with test_client.websocket('/ws/orders') as ws:
+        while broker.subscriber_count == 0:
+            await asyncio.sleep(0.01)
+        order = await create_order(client.id, 1, 'Живое обновление', [])
+        event = json.loads(await asyncio.wait_for(ws.receive(), timeout=5))
+    assert event['type'] == 'order_created'
+    assert event['order']['id'] == order.id
+    assert event['order']['client_name'] == 'Событийный Клиент'
+
+
+@pytest.mark.asyncio
+async def test_event_stream_requires_login(app_instance):
+    response = await app_instance.test_client().get('/events/orders')
+    assert response.status_code == 401
+
+
+# --- Пустой список всё равно готов принимать строки ---
+
+@pytest.mark.asyncio
+async def test_empty_order_list_has_live_table(app_instance):
+    test_client = app_instance.test_client()
+    async with test_client.session_transaction() as sess:
+        sess['user_id'] = 987654
+        sess['user_role'] = 'client'
+    html = (await (await test_client.get('/my_orders')).get_data()).decode('utf-8')
+    assert 'data-live-orders="client"' in html and 'data-live-empty' in html
+    title = html[html.index('<title>'):html.index('</title>')]
+    assert '<script' not in title
+    assert 'order_updates.js' in html.split('</title>', 1)[1]
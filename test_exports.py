@@ -0,0 +1,58 @@
+import csv
+import io
+import zipfile
+import pytest
+from routes import create_part
+
+
+@pytest.fixture
+def staff_client(app_instance):
+    return app_instance.test_client()
+
+
+# --- CSV: выбранные колонки, все строки, потоковый ответ ---
+
+@pytest.mark.asyncio
+async def test_export_parts_csv_selected_columns(staff_client, login_as):
+    await create_part('Экспорт "кавычки", запятые', 150, 3)
+
+    await login_as(staff_client, 'manager')
+    response = await staff_client.get('/export/parts.csv?columns=name,stock,unknown')
+    assert response.status_code == 200
+    assert 'attachment' in response.headers['Content-Disposition']
+
+    text = (await response.get_data()).decode('utf-8-sig')
+    rows = list(csv.reader(io.StringIO(text)))
+    assert rows[0] == ['name', 'stock']
+    assert ['Экспорт "кавычки", запятые', '3'] in rows[1:]
+
+
+# --- XLSX открывается как книга и содержит данные ---
+
+@pytest.mark.asyncio
+async def test_export_orders_xlsx(staff_client, login_as):
+    await login_as(staff_client, 'admin')
+    response = await staff_client.get('/export/orders.xlsx?date_from=2000-01-01')
+    assert response.status_code == 200
+
+    with zipfile.ZipFile(io.BytesIO(await response.get_data())) as book:
+        assert book.testzip() is None
+        sheet = book.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        assert '<t xml:space="preserve">client_name</t>' in sheet
+        assert 'xl/workbook.xml' in book.namelist()
+
+
+@pytest.mark.asyncio
+async def test_export_requires_role(staff_client, login_as):
+    await login_as(staff_client, 'client')
+    response = await staff_client.get('/export/clients.csv')
+    assert response.status_code == 302
+    assert (await staff_client.get('/export/unknown.csv')).status_code in (302, 404)
+
+
+@pytest.mark.asyncio
+async def test_list_pages_link_to_export(staff_client, login_as):
+    await login_as(staff_client, 'admin')
+    for page, link in (('/warehouse', '/export/parts.csv'), ('/clients', '/export/clients.xlsx')):
+        html = (await (await staff_client.get(page)).get_data()).decode('utf-8')
+        assert link in html
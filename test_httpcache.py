@@ -0,0 +1,67 @@
+import pytest
+import httpcache
+from httpcache import LRUCache
+from routes import create_part
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+
+# --- ETag: 304 без изменений, новая версия после записи ---
+
+@pytest.mark.asyncio
+async def test_warehouse_etag_and_invalidation(app_instance, login_as):
+    test_client = app_instance.test_client()
+    await login_as(test_client)
+
+    first = await test_client.get('/warehouse')
+    etag = first.headers['ETag']
+    assert first.status_code == 200
+
+    again = await test_client.get('/warehouse', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert await again.get_data() == b''
+
+    # Другая роль — другой ETag
+    await login_as(test_client, 'master')
+    assert (await test_client.get('/warehouse', headers={'If-None-Match': etag})).status_code == 200
+
+    await login_as(test_client)
+    await create_part('Кэшируемый фильтр', 300, 2)
+    changed = await test_client.get('/warehouse', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert 'Кэшируемый фильтр' in (await changed.get_data()).decode('utf-8')
+
+
+@pytest.mark.asyncio
+async def test_pages_served_from_lru(app_instance, login_as):
+    httpcache.pages.clear()
+
+    test_client = app_instance.test_client()
+    await login_as(test_client)
+    await test_client.get('/')
+    misses = httpcache.pages.misses
+    await test_client.get('/')
+    assert httpcache.pages.misses == misses
+
+
+# --- Статика: хэш содержимого в URL и долгий кэш ---
+
+@pytest.mark.asyncio
+async def test_static_urls_are_hashed(app_instance):
+    test_client = app_instance.test_client()
+    html = (await (await test_client.get('/')).get_data()).decode('utf-8')
+    digest = httpcache.static_hash(app_instance.static_folder, 'base.css')
+    assert f'/static/base.css?v={digest}' in html
+
+    response = await test_client.get(f'/static/base.css?v={digest}')
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import select
+from models import async_session, Part, Client
+from instrumentation import track, QueryBudgetExceeded
+
+
+# --- Повторяющиеся запросы видны как N+1 ---
+
+@pytest.mark.asyncio
+async def test_track_counts_repeated_statements():
+    with track() as stats:
+        async with async_session() as s:
+            for part_id in range(1, 7):
+                await s.execute(select(Part).where(Part.id == part_id))
+    assert stats.count == 6
+    assert stats.total_time > 0
+    assert len(stats.repeated(5)) == 1
+
+
+# --- Заголовки X-DB-* и лимит запросов на маршрут ---
+
+@pytest.mark.asyncio
+async def test_query_headers_and_budget(app_instance):
+    app_instance.config.update(SQL_DEBUG_HEADERS=True, SQL_QUERY_BUDGET=0)
+    test_client = app_instance.test_client()
+    async with test_client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['user_role'] = 'admin'
+
+    response = await test_client.get('/users')
+    assert response.status_code == 200
+    assert int(response.headers['X-DB-Queries']) >= 1
+    assert float(response.headers['X-DB-Time-ms']) >= 0
+
+    # Поиск с найденным клиентом: запрос к индексу + загрузка карточек
+    async with async_session() as s:
+        s.add(Client(full_name='Бюджетов Запрос', phone='+70000000077'))
+        await s.commit()
+    app_instance.config.update(SQL_QUERY_BUDGET=1, SQL_BUDGET_MODE='raise')
+    with pytest.raises(QueryBudgetExceeded):
+        await test_client.get('/search', query_string={'q': 'Бюджетов'})
@@ -0,0 +1,132 @@
+import pytest
+from sqlalchemy import select, func
+from models import async_session, StockMovement, StockSnapshot, StatCounter
+from routes import create_client, create_order, create_part
+from workflow import change_status
+from inventory import stock_levels, compact
+
+
+async def snapshot_of(part_id: int) -> int:
+    async with async_session() as s:
+        return await s.scalar(select(StockSnapshot.stock).where(StockSnapshot.part_id == part_id)) or 0
+
+
+async def level_of(part_id: int) -> int:
+    async with async_session() as s:
+        return (await stock_levels(s, [part_id]))[part_id]
+
+
+async def stock_counter() -> int:
+    async with async_session() as s:
+        return await s.scalar(select(StatCounter.value).where(StatCounter.name == 'parts_stock')) or 0
+
+
+# --- Заказ пишет движение в журнал, снимок догоняет при свёртке ---
+
+@pytest.mark.asyncio
+async def test_reservation_is_appended_and_compacted():
+    client = await create_client('Складской Клиент', '+70000000777')
+    part = await create_part('Журнальный фильтр', 300, 10)
+    assert await snapshot_of(part.id) == 10
+
+    order = await create_order(client.id, 1, 'Журнал', [str(part.id)] * 3)
+    async with async_session() as s:
+        rows = (await s.execute(
+            select(StockMovement.kind, StockMovement.quantity, StockMovement.order_id)
+            .where(StockMovement.part_id == part.id).order_by(StockMovement.id))).all()
+    assert rows == [('receipt', 10, None), ('reservation', -3, order.id)]
+
+    # Снимок читается без журнала и отстаёт до свёртки, точный остаток — нет
+    assert await snapshot_of(part.id) == 10
+    assert await level_of(part.id) == 7
+    assert await compact() >= 1
+    assert await snapshot_of(part.id) == 7
+    assert await compact([part.id]) == 0
+
+
+# --- Отмена заказа возвращает запчасти движением return ---
+
+@pytest.mark.asyncio
+async def test_cancel_returns_parts():
+    client = await create_client('Отменяющий Клиент', '+70000000888')
+    part = await create_part('Возвратная свеча', 150, 4)
+    order = await create_order(client.id, 1, 'Отмена', [str(part.id)] * 2)
+    assert await level_of(part.id) == 2
+
+    await change_status(order.id, 'cancelled', 1, 'admin')
+    assert await level_of(part.id) == 4
+    async with async_session() as s:
+        kinds = (await s.execute(
+            select(StockMovement.kind, func.sum(StockMovement.quantity))
+            .where(StockMovement.order_id == order.id).group_by(StockMovement.kind))).all()
+    assert dict(kinds) == {'reservation': -2, 'return': 2}
+
+
+# --- Заказ и отмена берут блокировки в одном порядке: запчасти, потом счётчики ---
+
+@pytest.mark.asyncio
+async def test_parts_locked_before_counters(monkeypatch):
+    import inventory
+    import stats
+    calls = []
+    lock_parts, bump = inventory.lock_parts, stats.bump
+
+    async def traced_lock(s, part_ids):
+        calls.append('parts')
+        await lock_parts(s, part_ids)
+
+    async def traced_bump(s, deltas):
+        calls.append('counters')
+        await bump(s, deltas)
+
+    monkeypatch.setattr(inventory, 'lock_parts', traced_lock)
+    monkeypatch.setattr(stats, 'bump', traced_bump)
+    client = await create_client('Порядковый Клиент', '+70000000889')
+    part = await create_part('Порядковый фильтр', 100, 3)
+    for action in (lambda: create_order(client.id, 1, '', [str(part.id)]),
+                   lambda: change_status(order.id, 'cancelled', 1, 'admin')):
+        calls.clear()
+        order = await action()
+        assert calls[0] == 'parts' and 'parts' not in calls[calls.index('counters'):]
+
+
+# --- Склад показывает снимок ---
+
+@pytest.mark.asyncio
+async def test_warehouse_reads_snapshot(app_instance, login_as):
+    part = await create_part('Снимочный ремень', 900, 6)
+    test_client = app_instance.test_client()
+    await login_as(test_client)
+    html = (await (await test_client.get('/warehouse')).get_data()).decode('utf-8')
+    assert 'Снимочный ремень' in html
+    assert '6 шт.' in html
+
+    response = await test_client.post(f'/warehouse/delete/{part.id}')
+    assert response.status_code == 302
+    async with async_session() as s:
+        # История удалённой запчасти сохраняется и сходится к нулю
+        total = await s.scalar(select(func.sum(StockMovement.quantity)).where(StockMovement.part_id == part.id))
+    assert total == 0
+
+
+# --- Счётчик parts_stock двигают свёртка и удаление запчасти, а не заказы ---
+
+@pytest.mark.asyncio
+async def test_stock_counter_follows_compaction(app_instance, login_as):
+    await compact()
+    before = await stock_counter()
+    client = await create_client('Счётный Клиент', '+70000000890')
+    part = await create_part('Счётный фильтр', 100, 5)
+    await compact()
+    assert await stock_counter() == before + 5
+
+    await create_order(client.id, 1, '', [str(part.id), str(part.id)])
+    assert await stock_counter() == before + 5
+    await compact()
+    assert await stock_counter() == before + 3
+
+    test_client = app_instance.test_client()
+    await login_as(test_client)
+    await test_client.post(f'/warehouse/delete/{part.id}')
+    await compact()
+    assert await stock_counter() == before
@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import select, func
+from models import async_session, Client, Order, order_part
+from seed_data import seed, bench_email
+from bench_load import run_load, InProcessSession, bench_email as load_email
+
+
+# --- Генератор данных: детерминированный объём и связи ---
+
+@pytest.mark.asyncio
+async def test_seed_creates_linked_rows():
+    async with async_session() as s:
+        orders_before = await s.scalar(select(func.count(Order.id)))
+    counts = await seed(clients=40, parts=15, orders_per_client=2, bench_users=2, log=lambda *a: None)
+    assert counts['client'] == 40 and counts['part'] == 15 and counts['order'] == 80
+    assert counts['car'] >= 40
+
+    async with async_session() as s:
+        assert await s.scalar(select(func.count(Order.id))) == orders_before + 80
+        # Позиции ссылаются только на существующие заказы
+        orphans = await s.scalar(
+            select(func.count()).select_from(order_part)
+            .outerjoin(Order, Order.id == order_part.c.order_id).where(Order.id.is_(None)))
+        assert orphans == 0
+        assert await s.scalar(select(func.count(Client.id)).where(Client.phone.like('+79%'))) >= 40
+
+
+# --- Нагрузочный прогон через test client ---
+
+@pytest.mark.asyncio
+async def test_load_run_reports_percentiles(app_instance):
+    assert load_email('client', 1) == bench_email('client', 1)
+    await seed(clients=30, parts=10, bench_users=2, log=lambda *a: None)
+    routes = await run_load(lambda: InProcessSession(app_instance), users=4, duration=1,
+                            bench_clients=2)
+
+    assert {'POST /login', 'POST /staff/login'} <= set(routes)
+    for route, r in routes.items():
+        assert r['errors'] == 0, route
+        assert r['count'] > 0
+        assert r['p50'] <= r['p95'] <= r['p99']
@@ -0,0 +1,111 @@
+import socket
+import pytest
+from datetime import datetime
+from email.mime.text import MIMEText
+from sqlalchemy import select
+from config import Config
+from models import async_session, OutboxMessage
+from mailer import OutboxSender, enqueue, build_report_email
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+
+class CollectingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return '250 OK'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def local_smtp(monkeypatch):
+    """Локальный aiosmtpd вместо Config.MAIL_SERVER."""
+    handler = CollectingHandler()
+    port = free_port()
+    controller = aiosmtpd_controller.Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    monkeypatch.setattr(Config, 'MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setattr(Config, 'MAIL_PORT', port)
+    monkeypatch.setattr(Config, 'MAIL_USE_TLS', False)
+    monkeypatch.setattr(Config, 'MAIL_USERNAME', None)
+    monkeypatch.setattr(Config, 'MAIL_PASSWORD', None)
+    yield handler
+    controller.stop()
+
+
+async def clear_outbox():
+    async with async_session() as s:
+        for msg in (await s.execute(select(OutboxMessage))).scalars():
+            await s.delete(msg)
+        await s.commit()
+
+
+def make_message(n: int):
+    msg = MIMEText(f"Письмо {n}", 'plain', 'utf-8')
+    msg['From'] = 'service@test.ru'
+    msg['To'] = f'client{n}@test.ru'
+    msg['Subject'] = f'Тест {n}'
+    return msg
+
+
+# --- Очередь отправляется пачкой через переиспользуемые соединения ---
+
+@pytest.mark.asyncio
+async def test_outbox_batch_delivered_over_pooled_connections(local_smtp):
+    await clear_outbox()
+    for n in range(5):
+        await enqueue(make_message(n))
+    await enqueue(build_report_email(1, 'owner@test.ru', b'PK-docx', 'Отчёт_заказ_1.docx',
+                                     'application/octet-stream'))
+
+    sender = OutboxSender(pool_size=2, batch_size=20)
+    try:
+        assert await sender.process_batch() == 6
+    finally:
+        await sender.stop()
+
+    assert sorted(e.rcpt_tos[0] for e in local_smtp.messages) == sorted(
+        [f'client{n}@test.ru' for n in range(5)] + ['owner@test.ru']
+    )
+    # Шесть писем прошли не более чем по двум SMTP-сессиям
+    assert len(local_smtp.sessions) <= 2
+    async with async_session() as s:
+        statuses = (await s.execute(select(OutboxMessage.status))).scalars().all()
+    assert statuses == ['sent'] * 6
+
+
+# --- Недоступный сервер: письмо остаётся в очереди с backoff ---
+
+@pytest.mark.asyncio
+async def test_outbox_retries_with_backoff(monkeypatch):
+    await clear_outbox()
+    monkeypatch.setattr(Config, 'MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setattr(Config, 'MAIL_PORT', free_port())
+    monkeypatch.setattr(Config, 'MAIL_USE_TLS', False)
+    monkeypatch.setattr(Config, 'MAIL_USERNAME', None)
+    await enqueue(make_message(1))
+
+    sender = OutboxSender(pool_size=1, max_attempts=2, retry_base=60)
+    try:
+        assert await sender.process_batch() == 1
+        # Повтор ещё не наступил — пачка пустая
+        assert await sender.process_batch() == 0
+    finally:
+        await sender.stop()
+
+    async with async_session() as s:
+        msg = (await s.execute(select(OutboxMessage))).scalar_one()
+    assert msg.status == 'pending'
+    assert msg.attempts == 1
+    assert msg.last_error
+    assert (msg.next_attempt_at - datetime.utcnow()).total_seconds() > 50
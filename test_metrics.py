@@ -0,0 +1,39 @@
+import pytest
+
+
+# --- /metrics отдаёт счётчики, гистограммы, пул и очереди ---
+
+@pytest.mark.asyncio
+async def test_metrics_exposition(app_instance):
+    test_client = app_instance.test_client()
+    assert (await test_client.get('/')).status_code == 200
+
+    response = await test_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain')
+    body = await response.get_data(as_text=True)
+
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_requests_total{endpoint="main.index",method="GET",status="200"}' in body
+    assert 'http_request_duration_seconds_bucket{endpoint="main.index",le="+Inf"}' in body
+    assert 'db_pool_connections{state="in_use"}' in body
+    assert 'background_queue_depth{queue="outbox"}' in body
+    assert 'background_queue_depth{queue="reports"} 0' in body
+    # Сам /metrics в статистику запросов не попадает
+    assert 'endpoint="metrics"' not in body
+
+
+# --- /healthz показывает пул, не занимая соединение ---
+
+@pytest.mark.asyncio
+async def test_healthz_reports_pool_state(app_instance):
+    from models import engine, warm_up_pool
+    await warm_up_pool(engine, 2)
+
+    response = await app_instance.test_client().get('/healthz')
+    assert response.status_code == 200
+    data = await response.get_json()
+    assert data['status'] == 'ok'
+    assert data['pool']['in_use'] == 0
+    assert data['pool']['idle'] >= 2
+    assert data['pool']['size'] == app_instance.config['DB_POOL_SIZE']
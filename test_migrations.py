@@ -0,0 +1,163 @@
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+import migrations
+
+
+# --- Миграции накатываются один раз, старт проверяет только версию ---
+
+@pytest.mark.asyncio
+async def test_migrate_then_check(tmp_path):
+    fresh = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'fresh.db'}")
+    try:
+        with pytest.raises(migrations.SchemaOutdated):
+            await migrations.check_schema(fresh)
+
+        applied = await migrations.migrate(fresh)
+        assert applied == [number for number, _, _ in migrations.MIGRATIONS]
+        assert await migrations.check_schema(fresh) == migrations.latest_version()
+        assert await migrations.migrate(fresh) == []
+
+        async with fresh.connect() as conn:
+            indexes = await conn.run_sync(
+                lambda c: {ix['name'] for t in ('order', 'car', 'client')
+                           for ix in inspect(c).get_indexes(t)}
+            )
+        assert {'ix_order_created_at_id', 'ix_car_client_id', 'ix_client_phone'} <= indexes
+    finally:
+        await fresh.dispose()
+
+
+@pytest.mark.asyncio
+async def test_migrations_build_current_schema(tmp_path):
+    # Миграция 1 заморожена: остальное в модели должны принести миграции 2+
+    from models import Base
+
+    def schema(c):
+        found = inspect(c)
+        return {table: ({col['name'] for col in found.get_columns(table)},
+                        {ix['name'] for ix in found.get_indexes(table)})
+                for table in Base.metadata.tables}
+
+    migrated = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migrated.db'}")
+    created = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'created.db'}")
+    try:
+        await migrations.migrate(migrated)
+        async with created.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with migrated.connect() as conn:
+            expected = await conn.run_sync(schema)
+        async with created.connect() as conn:
+            assert await conn.run_sync(schema) == expected
+    finally:
+        await migrated.dispose()
+        await created.dispose()
+
+
+@pytest.mark.asyncio
+async def test_part_sku_added_to_existing_table(tmp_path):
+    from sqlalchemy import text
+    legacy = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}")
+    try:
+        async with legacy.begin() as conn:
+            await conn.execute(text(
+                'CREATE TABLE part (id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, '
+                'price INTEGER NOT NULL, stock INTEGER NOT NULL)'))
+        await migrations.migrate(legacy)
+        async with legacy.connect() as conn:
+            columns, indexes = await conn.run_sync(lambda c: (
+                {col['name'] for col in inspect(c).get_columns('part')},
+                {ix['name'] for ix in inspect(c).get_indexes('part')},
+            ))
+        assert 'sku' in columns
+        assert 'ux_part_sku' in indexes
+    finally:
+        await legacy.dispose()
+
+
+@pytest.mark.asyncio
+async def test_part_stock_moves_to_ledger(tmp_path):
+    from sqlalchemy import text
+    legacy = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'legacy_stock.db'}")
+    try:
+        async with legacy.begin() as conn:
+            await conn.execute(text(
+                'CREATE TABLE part (id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, '
+                'price INTEGER NOT NULL, stock INTEGER NOT NULL)'))
+            await conn.execute(text("INSERT INTO part (id, name, price, stock) VALUES "
+                                    "(1, 'Масло', 500, 7), (2, 'Пусто', 10, 0)"))
+        await migrations.migrate(legacy)
+        async with legacy.connect() as conn:
+            columns = await conn.run_sync(
+                lambda c: {col['name'] for col in inspect(c).get_columns('part')})
+            snapshot = dict((await conn.execute(text('SELECT part_id, stock FROM stocksnapshot'))).all())
+            movements = (await conn.execute(text('SELECT part_id, kind, quantity FROM stockmovement'))).all()
+        assert 'stock' not in columns
+        assert snapshot == {1: 7}
+        assert movements == [(1, 'adjustment', 7)]
+    finally:
+        await legacy.dispose()
+
+
+@pytest.mark.asyncio
+async def test_order_totals_backfilled(tmp_path):
+    from sqlalchemy import text
+    legacy = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'legacy_totals.db'}")
+    try:
+        async with legacy.begin() as conn:
+            for ddl in (
+                'CREATE TABLE part (id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, price INTEGER NOT NULL)',
+                'CREATE TABLE "order" (id INTEGER PRIMARY KEY, client_id INTEGER, user_id INTEGER, '
+                'status VARCHAR(20), created_at DATETIME, description TEXT)',
+                'CREATE TABLE order_part (order_id INTEGER, part_id INTEGER, quantity INTEGER NOT NULL, '
+                'PRIMARY KEY (order_id, part_id))',
+                'CREATE TABLE orderdailystat (day DATE, status VARCHAR(20), orders INTEGER NOT NULL, '
+                'PRIMARY KEY (day, status))',
+            ):
+                await conn.execute(text(ddl))
+            await conn.execute(text("INSERT INTO part (id, name, price) VALUES (1, 'Масло', 500), (2, 'Фильтр', 300)"))
+            await conn.execute(text(
+                "INSERT INTO \"order\" (id, status, created_at) VALUES "
+                "(1, 'completed', '2024-03-05 10:00:00'), (2, 'completed', '2024-03-05 12:00:00')"))
+            await conn.execute(text("INSERT INTO order_part VALUES (1, 1, 2), (1, 2, 1), (2, 2, 3)"))
+            await conn.execute(text("INSERT INTO orderdailystat VALUES ('2024-03-05', 'completed', 2)"))
+        await migrations.migrate(legacy)
+        async with legacy.connect() as conn:
+            totals = (await conn.execute(text('SELECT id, total, parts_count FROM "order" ORDER BY id'))).all()
+            prices = (await conn.execute(text(
+                'SELECT order_id, part_id, unit_price FROM order_part ORDER BY order_id, part_id'))).all()
+            rollup = (await conn.execute(text('SELECT orders, revenue, parts FROM orderdailystat'))).all()
+        assert totals == [(1, 1300, 3), (2, 900, 3)]
+        assert prices == [(1, 1, 500), (1, 2, 300), (2, 2, 300)]
+        assert rollup == [(2, 2200, 6)]
+    finally:
+        await legacy.dispose()
+
+
+@pytest.mark.asyncio
+async def test_order_created_at_backfilled(tmp_path):
+    from sqlalchemy import text
+    legacy = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'legacy_created_at.db'}")
+    try:
+        async with legacy.begin() as conn:
+            for ddl in (
+                'CREATE TABLE "order" (id INTEGER PRIMARY KEY, client_id INTEGER, user_id INTEGER, '
+                'status VARCHAR(20), created_at DATETIME, description TEXT)',
+                'CREATE TABLE orderdailystat (day DATE, status VARCHAR(20), orders INTEGER NOT NULL, '
+                'PRIMARY KEY (day, status))',
+            ):
+                await conn.execute(text(ddl))
+            await conn.execute(text(
+                "INSERT INTO \"order\" (id, status, created_at) VALUES "
+                "(1, 'completed', '2024-03-05 10:00:00.000000'), (2, 'completed', NULL), (3, 'new', NULL)"))
+            await conn.execute(text("INSERT INTO orderdailystat VALUES ('2024-03-05', 'completed', 1)"))
+        await migrations.migrate(legacy)
+        async with legacy.connect() as conn:
+            dates = (await conn.execute(text('SELECT created_at FROM "order" ORDER BY id'))).scalars().all()
+            rollup = (await conn.execute(text(
+                'SELECT day, status, orders FROM orderdailystat ORDER BY status'))).all()
+        # Заказы без даты встают в конец списка и попадают в rollup
+        assert dates == ['2024-03-05 10:00:00.000000'] * 3
+        assert rollup == [('2024-03-05', 'completed', 2), ('2024-03-05', 'new', 1)]
+    finally:
+        await legacy.dispose()
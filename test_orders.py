@@ -0,0 +1,136 @@
+import asyncio
+import itertools
+import pytest
+from sqlalchemy import select, func
+from models import async_session, Client, User, order_part
+from routes import create_order, create_part
+from inventory import stock_levels, InsufficientStock
+
+_seq = itertools.count()
+
+async def make_client_and_user():
+    async with async_session() as s:
+        client = Client(full_name="Клиент для теста", phone="+70000000000")
+        user = User(full_name="Мастер для теста", email=f"master{next(_seq)}@test.ru",
+                    phone="+70000000000", password_hash="x", role="master")
+        s.add_all([client, user])
+        await s.commit()
+        return client.id, user.id
+
+async def make_part(name: str, stock: int, price: int = 100):
+    return (await create_part(name, price, stock)).id
+
+async def stock_of(part_id: int) -> int:
+    async with async_session() as s:
+        return (await stock_levels(s, [part_id]))[part_id]
+
+
+# --- Резервирование нескольких запчастей одним заказом ---
+
+@pytest.mark.asyncio
+async def test_create_order_reserves_all_parts():
+    client_id, user_id = await make_client_and_user()
+    oil = await make_part("Масло", stock=5)
+    filt = await make_part("Фильтр", stock=2)
+
+    order = await create_order(client_id, user_id, "ТО", [str(oil), str(oil), str(filt)])
+
+    assert await stock_of(oil) == 3
+    assert await stock_of(filt) == 1
+    async with async_session() as s:
+        rows = (await s.execute(
+            select(order_part.c.part_id, order_part.c.quantity)
+            .where(order_part.c.order_id == order.id)
+        )).all()
+    assert sorted(rows) == sorted([(oil, 2), (filt, 1)])
+
+
+@pytest.mark.asyncio
+async def test_create_order_shortfall_lists_every_part_and_keeps_stock():
+    client_id, user_id = await make_client_and_user()
+    ok = await make_part("Свеча", stock=10)
+    short = await make_part("Колодки", stock=1)
+
+    with pytest.raises(InsufficientStock) as excinfo:
+        await create_order(client_id, user_id, "", [str(ok), str(short), str(short), "999999"])
+
+    assert {(pid, need, have) for pid, _, need, have in excinfo.value.shortfalls} == {
+        (short, 2, 1), (999999, 1, 0)
+    }
+    assert "Колодки (нужно 2, в наличии 1)" in str(excinfo.value)
+    # Частичного списания быть не должно
+    assert await stock_of(ok) == 10
+    assert await stock_of(short) == 1
+
+
+# --- Конкурентные заказы не уводят остаток в минус ---
+
+@pytest.mark.asyncio
+async def test_parallel_orders_never_oversell():
+    client_id, user_id = await make_client_and_user()
+    stock = 50
+    part_id = await make_part("Ходовая запчасть", stock=stock)
+
+    async def attempt():
+        try:
+            await create_order(client_id, user_id, "Гонка", [str(part_id)])
+            return True
+        except InsufficientStock:
+            return False
+
+    results = await asyncio.gather(*(attempt() for _ in range(300)))
+
+    left = await stock_of(part_id)
+    async with async_session() as s:
+        reserved = await s.scalar(
+            select(func.coalesce(func.sum(order_part.c.quantity), 0))
+            .where(order_part.c.part_id == part_id)
+        )
+    assert left == 0
+    assert sum(results) == stock
+    assert reserved == stock
+
+
+# --- Повтор с тем же ключом идемпотентности не создаёт второй заказ ---
+
+@pytest.mark.asyncio
+async def test_idempotent_replays_return_first_order():
+    client_id, user_id = await make_client_and_user()
+    part_id = await make_part("Повторная запчасть", stock=5)
+    key = f'key-{next(_seq)}'
+
+    orders = await asyncio.gather(*(
+        create_order(client_id, user_id, "Двойной клик", [str(part_id)], idempotency_key=key)
+        for _ in range(5)
+    ))
+    assert len({order.id for order in orders}) == 1
+    assert await stock_of(part_id) == 4
+
+    # Тот же ключ у другого пользователя — это другой заказ
+    _, other_user = await make_client_and_user()
+    other = await create_order(client_id, other_user, "", [str(part_id)], idempotency_key=key)
+    assert other.id != orders[0].id
+    assert await stock_of(part_id) == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_order_does_not_burn_key(app_instance):
+    client_id, user_id = await make_client_and_user()
+    part_id = await make_part("Дефицитная запчасть", stock=1)
+    key = f'key-{next(_seq)}'
+    with pytest.raises(InsufficientStock):
+        await create_order(client_id, user_id, "", [str(part_id), str(part_id)], idempotency_key=key)
+
+    # Повтор через форму с заголовком: первый запрос создаёт заказ, второй его не дублирует
+    test_client = app_instance.test_client()
+    async with test_client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['user_role'] = 'master'
+    for _ in range(2):
+        response = await test_client.post('/add_order', form={'client_id': str(client_id), 'part_ids': str(part_id)},
+                                          headers={'Idempotency-Key': key})
+        assert response.status_code == 302
+    async with async_session() as s:
+        orders = await s.scalar(select(func.count()).select_from(order_part).where(order_part.c.part_id == part_id))
+    assert orders == 1
+    assert await stock_of(part_id) == 0
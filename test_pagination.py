@@ -0,0 +1,132 @@
+import html
+import itertools
+import re
+import pytest
+import pytest_asyncio
+from datetime import datetime
+from models import async_session, Order
+from pagination import PAGE_SIZE, MAX_PAGE_SIZE, parse_limit, decode_cursor, encode_cursor
+from routes import create_client, create_user
+
+ROW_ID = re.compile(r'<tr[^>]*>\s*<td>(\d+)</td>')
+NEXT_LINK = re.compile(r'<a href="([^"]+)" class="btn btn-sm">Дальше')
+
+TIE = datetime(2001, 2, 3, 10, 0)
+_dataset = itertools.count()
+
+
+async def add_orders(*orders) -> list:
+    # Заказы с заданной датой создания, в обход формы
+    async with async_session() as s:
+        rows = [Order(**fields) for fields in orders]
+        s.add_all(rows)
+        await s.commit()
+        return [row.id for row in rows]
+
+
+async def walk(test_client, url: str) -> list:
+    # Идём по ссылкам «Дальше», пока они есть; id строк всех страниц подряд
+    ids = []
+    while url:
+        page = (await (await test_client.get(url)).get_data()).decode('utf-8')
+        ids += [int(order_id) for order_id in ROW_ID.findall(page)]
+        link = NEXT_LINK.search(page)
+        url = html.unescape(link.group(1)) if link else None
+    return ids
+
+
+@pytest_asyncio.fixture
+async def dataset():
+    # Свои клиент, автор и мастер на каждый тест: фильтры отделяют их заказы от чужих
+    n = next(_dataset)
+    client = await create_client("Курсоров Кирилл", f"+7000000{n:04}")
+    other = await create_client("Чужой Клиент", f"+7000001{n:04}")
+    author = await create_user("Клиент Курсоров", f"cursor-client{n}@test.ru", "+7", "pw", role='client')
+    master = await create_user("Мастер Курсоров", f"cursor-master{n}@test.ru", "+7", "pw", role='master')
+    common = dict(client_id=client.id, user_id=author.id, assignee_id=master.id)
+    tied = await add_orders(*[dict(common, status='new', created_at=TIE) for _ in range(7)])
+    completed = await add_orders(*[dict(common, status='completed', created_at=TIE) for _ in range(2)])
+    last_second = await add_orders(dict(common, status='new', created_at=datetime(2001, 2, 3, 23, 59, 59)))
+    next_day = await add_orders(dict(common, status='new', created_at=datetime(2001, 2, 4)))
+    day_before = await add_orders(dict(common, status='new', created_at=datetime(2001, 2, 2, 23, 59)))
+    foreign = await add_orders(dict(common, client_id=other.id, status='new', created_at=TIE))
+    return {'client': client, 'author': author, 'master': master, 'tied': tied, 'completed': completed,
+            'last_second': last_second, 'next_day': next_day, 'day_before': day_before,
+            'foreign': foreign}
+
+
+# --- Разбор limit и курсора ---
+
+def test_parse_limit_clamps():
+    assert parse_limit(None) == PAGE_SIZE
+    assert parse_limit('abc') == PAGE_SIZE
+    assert parse_limit('0') == 1
+    assert parse_limit('-5') == 1
+    assert parse_limit('20') == 20
+    assert parse_limit(str(MAX_PAGE_SIZE * 10)) == MAX_PAGE_SIZE
+
+
+def test_malformed_cursor_is_ignored():
+    assert decode_cursor(encode_cursor(TIE, 42)) == (TIE, 42)
+    for cursor in ('', 'garbage', '2001-02-03T10:00:00_x', 'not-a-date_5'):
+        assert decode_cursor(cursor) is None
+
+
+# --- Обход /all_orders по страницам: совпадающие created_at не теряются и не повторяются ---
+
+@pytest.mark.asyncio
+async def test_all_orders_walk_with_ties(app_instance, login_as, dataset):
+    test_client = app_instance.test_client()
+    await login_as(test_client)
+    client_id = dataset['client'].id
+
+    # date_to включительно: последняя секунда дня есть, полночь следующего — нет
+    ids = await walk(test_client, f'/all_orders?client_id={client_id}&status=new'
+                                  f'&date_from=2001-02-03&date_to=2001-02-03&limit=2')
+    expected = dataset['last_second'] + sorted(dataset['tied'], reverse=True)
+    assert ids == expected
+
+    # Без фильтра по статусу и датам — все заказы клиента, и тоже без дублей
+    ids = await walk(test_client, f'/all_orders?client_id={client_id}&limit=3')
+    assert len(ids) == len(set(ids)) == 12
+    assert not set(ids) & set(dataset['foreign'])
+
+
+@pytest.mark.asyncio
+async def test_malformed_cursor_shows_first_page(app_instance, login_as, dataset):
+    test_client = app_instance.test_client()
+    await login_as(test_client)
+    url = f'/all_orders?client_id={dataset["client"].id}&limit=4'
+    first = (await (await test_client.get(url)).get_data()).decode('utf-8')
+    response = await test_client.get(url + '&cursor=garbage_')
+    assert response.status_code == 200
+    page = (await response.get_data()).decode('utf-8')
+    assert ROW_ID.findall(page) == ROW_ID.findall(first)
+
+
+# --- Те же фильтры в списках клиента и мастера ---
+
+@pytest.mark.asyncio
+async def test_my_orders_filters(app_instance, login_as, dataset):
+    test_client = app_instance.test_client()
+    await login_as(test_client, role='client', user_id=dataset['author'].id)
+
+    ids = await walk(test_client, '/my_orders?status=completed&limit=1')
+    assert ids == sorted(dataset['completed'], reverse=True)
+
+    ids = await walk(test_client, f'/my_orders?client_id={dataset["client"].id}'
+                                  f'&date_from=2001-02-04&limit=5')
+    assert ids == dataset['next_day']
+
+
+@pytest.mark.asyncio
+async def test_worker_orders_filters(app_instance, login_as, dataset):
+    test_client = app_instance.test_client()
+    await login_as(test_client, role='master', user_id=dataset['master'].id)
+
+    ids = await walk(test_client, '/worker_orders?date_to=2001-02-02&limit=2')
+    assert ids == dataset['day_before']
+
+    ids = await walk(test_client, f'/worker_orders?client_id={dataset["client"].id}&status=new'
+                                  f'&date_from=2001-02-03&date_to=2001-02-03&limit=2')
+    assert ids == dataset['last_second'] + sorted(dataset['tied'], reverse=True)
@@ -0,0 +1,138 @@
+import io
+import itertools
+import pytest
+from sqlalchemy import select
+from models import async_session, Part, StockSnapshot, StatCounter
+from parts_import import import_parts, open_csv
+from inventory import SNAPSHOT_STOCK
+from routes import create_part
+
+_batch = itertools.count()
+
+
+def csv_file(text: str):
+    return open_csv(io.BytesIO(text.encode('utf-8-sig')))
+
+
+async def parts_by_sku(prefix: str):
+    async with async_session() as s:
+        # Остаток из снимка склада: импорт сворачивает журнал сразу
+        rows = await s.execute(select(Part.sku, Part.name, Part.price, SNAPSHOT_STOCK)
+                               .outerjoin(StockSnapshot, StockSnapshot.part_id == Part.id)
+                               .where(Part.sku.like(f'{prefix}%')))
+        return {sku: (name, price, stock) for sku, name, price, stock in rows}
+
+
+async def stock_counter():
+    # Счётчик дашборда: импорт сворачивает журнал сразу, свёртка двигает parts_stock
+    async with async_session() as s:
+        return await s.scalar(select(StatCounter.value).where(StatCounter.name == 'parts_stock')) or 0
+
+
+# --- Загрузка пачками: новые и существующие артикулы, ошибки по строкам ---
+
+@pytest.mark.asyncio
+async def test_import_upserts_in_batches_and_reports_errors():
+    p = f'IMP{next(_batch)}-'
+    stock_before = await stock_counter()
+    rows = ''.join(f'{p}{i};Фильтр {i};{100 + i};{i % 5}\n' for i in range(25))
+    text = f'sku;name;price;stock\n{rows}{p}bad;Кривой;дорого;1\n{p}neg;Минус;10;-3\n'
+
+    result = await import_parts(csv_file(text), batch_size=7)
+    assert (result.inserted, result.updated) == (25, 0)
+    assert [line for line, _ in result.errors] == [27, 28]
+
+    parts = await parts_by_sku(p)
+    assert len(parts) == 25
+    assert parts[f'{p}3'] == ('Фильтр 3', 103, 3)
+
+    # Повторная загрузка обновляет, а не дублирует; в пачке побеждает последняя строка
+    result = await import_parts(csv_file(
+        f'sku,name,price,stock\n{p}3,Фильтр 3,150,1\n{p}3,Фильтр 3 (новый),160,9\n{p}new,Свеча {p},80,2\n'))
+    assert (result.inserted, result.updated, result.errors) == (1, 1, [])
+    parts = await parts_by_sku(p)
+    assert len(parts) == 26
+    assert parts[f'{p}3'] == ('Фильтр 3 (новый)', 160, 9)
+
+    expected = sum(i % 5 for i in range(25)) - 3 + 9 + 2
+    assert await stock_counter() == stock_before + expected
+
+
+@pytest.mark.asyncio
+async def test_import_deltas():
+    p = f'IMP{next(_batch)}-'
+    await import_parts(csv_file(f'sku,name,price,stock\n{p}a,Колодки,1000,4\n{p}b,Диск,3000,1\n'))
+    stock_before = await stock_counter()
+
+    result = await import_parts(csv_file(
+        f'sku,price,stock\n{p}a,,+6\n{p}a,-100,-2\n{p}b,,-5\n{p}missing,,1\n'), mode='delta')
+    assert (result.inserted, result.updated) == (0, 1)
+    assert [line for line, _ in result.errors] == [4, 5]
+
+    parts = await parts_by_sku(p)
+    assert parts[f'{p}a'] == ('Колодки', 900, 8)
+    assert parts[f'{p}b'] == ('Диск', 3000, 1)
+    assert await stock_counter() == stock_before + 4
+
+
+@pytest.mark.asyncio
+async def test_import_adopts_parts_without_sku():
+    name = f'Ручная запчасть {next(_batch)}'
+    await create_part(name, 10, 1)
+
+    result = await import_parts(csv_file(f'name,price,stock\n{name},20,3\n'))
+    assert (result.inserted, result.updated) == (0, 1)
+    async with async_session() as s:
+        rows = (await s.execute(select(Part.sku, Part.price, SNAPSHOT_STOCK)
+                                .outerjoin(StockSnapshot, StockSnapshot.part_id == Part.id)
+                                .where(Part.name == name))).all()
+    assert rows == [(name, 20, 3)]
+
+
+@pytest.mark.asyncio
+async def test_import_rejects_missing_columns():
+    result = await import_parts(csv_file('sku,price\nX,1\n'))
+    assert result.processed == 0
+    assert result.errors[0][0] == 1
+
+
+@pytest.mark.asyncio
+async def test_import_upload_form(app_instance, login_as):
+    from quart.datastructures import FileStorage
+    from tasks import runner, get_job
+    p = f'IMP{next(_batch)}-'
+    client = app_instance.test_client()
+    await login_as(client)
+
+    # Форма только ставит задачу, прайс загружает воркер
+    upload = FileStorage(io.BytesIO(f'sku,name,price,stock\n{p}1,Масло {p},500,10\n{p}2,,abc,1\n'.encode()),
+                         filename='price.csv', content_type='text/csv')
+    response = await client.post('/warehouse/import', form={'mode': 'set'}, files={'file': upload})
+    assert response.status_code == 302
+    job_id = int(response.headers['Location'].rstrip('/').rsplit('/', 1)[1])
+    assert await parts_by_sku(p) == {}
+
+    while await runner.run_next('default'):
+        pass
+    job = await get_job(job_id, with_result=True)
+    assert job.status == 'done' and job.result_name == 'import_report.txt'
+    report = job.result.decode('utf-8')
+    assert report.startswith('Добавлено: 1, обновлено: 0, ошибок: 1') and 'строка 3' in report
+    assert await parts_by_sku(p) == {f'{p}1': (f'Масло {p}', 500, 10)}
+
+
+@pytest.mark.asyncio
+async def test_import_upload_size_limit(app_instance, login_as, monkeypatch):
+    from quart.datastructures import FileStorage
+    from config import Config
+    monkeypatch.setattr(Config, 'IMPORT_MAX_BYTES', 1024)
+    client = app_instance.test_client()
+    await login_as(client)
+
+    upload = FileStorage(io.BytesIO(b'sku,name,price,stock\n' + b'X,Y,1,1\n' * 500),
+                         filename='price.csv', content_type='text/csv')
+    response = await client.post('/warehouse/import', form={'mode': 'set'}, files={'file': upload})
+    # Форма возвращается с ошибкой, задача не ставится
+    assert response.status_code == 200
+    async with client.session_transaction() as sess:
+        assert any('Файл больше 1 КБ' in message for _, message in sess.get('_flashes', []))
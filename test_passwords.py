@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import select
+from werkzeug.security import generate_password_hash
+from models import async_session, User
+import passwords
+
+
+# --- Вход пересчитывает хэш с устаревшими параметрами ---
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_hash(app_instance):
+    email = "old-hash@test.ru"
+    async with async_session() as s:
+        old = (await s.execute(select(User).where(User.email == email))).scalar_one_or_none()
+        if old:
+            await s.delete(old)
+        s.add(User(full_name="Старый Хэш", email=email, phone="+7",
+                   password_hash=generate_password_hash("secret", method="pbkdf2:sha256:1000"),
+                   role="client"))
+        await s.commit()
+
+    test_client = app_instance.test_client()
+    response = await test_client.post('/login', form={'email': email, 'password': 'secret'})
+    assert response.status_code == 302
+
+    async with async_session() as s:
+        user = (await s.execute(select(User).where(User.email == email))).scalar_one()
+    assert user.password_hash.startswith(await passwords.stored_method() + '$')
+    assert await passwords.verify_password(user.password_hash, "secret")
+
+
+@pytest.mark.asyncio
+async def test_verify_password_rejects_wrong_password():
+    password_hash = await passwords.hash_password("right")
+    assert not await passwords.needs_rehash(password_hash)
+    assert await passwords.verify_password(password_hash, "right")
+    assert not await passwords.verify_password(password_hash, "wrong")
+
+
+# --- Актуальный хэш при входе не пересчитывается, в том числе для сокращённого метода ---
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('method', ['pbkdf2:sha256', 'scrypt'])
+async def test_login_keeps_current_hash(app_instance, monkeypatch, method):
+    monkeypatch.setattr(passwords.Config, 'PASSWORD_HASH_METHOD', method)
+    email = f"current-hash-{method.replace(':', '-')}@test.ru"
+    current = await passwords.hash_password("secret")
+    assert current.split('$', 1)[0] != method  # werkzeug раскрыл сокращение
+    async with async_session() as s:
+        old = (await s.execute(select(User).where(User.email == email))).scalar_one_or_none()
+        if old:
+            await s.delete(old)
+        s.add(User(full_name="Свежий Хэш", email=email, phone="+7", password_hash=current, role="client"))
+        await s.commit()
+
+    response = await app_instance.test_client().post('/login', form={'email': email, 'password': 'secret'})
+    assert response.status_code == 302
+    async with async_session() as s:
+        stored = await s.scalar(select(User.password_hash).where(User.email == email))
+    assert stored == current
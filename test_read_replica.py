@@ -0,0 +1,45 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+import models
+from models import Base, Part
+
+
+@pytest_asyncio.fixture
+async def replica(tmp_path, monkeypatch):
+    """Вторая SQLite-база в роли реплики только для чтения."""
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    replica_session = async_sessionmaker(bind=replica_engine, class_=AsyncSession,
+                                         expire_on_commit=False)
+    async with replica_session() as s:
+        s.add(Part(name="Деталь только в реплике", price=1))
+        await s.commit()
+
+    monkeypatch.setattr(models, 'read_engine', replica_engine)
+    monkeypatch.setattr(models, 'read_session', replica_session)
+    yield replica_session
+    await replica_engine.dispose()
+
+
+# --- Списки читаются с реплики, после записи — с primary ---
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_until_a_write(app_instance, replica):
+    test_client = app_instance.test_client()
+    async with test_client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['user_role'] = 'admin'
+
+    body = await (await test_client.get('/warehouse')).get_data(as_text=True)
+    assert "Деталь только в реплике" in body
+
+    response = await test_client.post('/warehouse/add',
+                                      form={'name': 'Деталь на primary', 'price': '10', 'stock': '1'})
+    assert response.status_code == 302
+
+    # Окно после записи: читаем с primary и видим только что добавленное
+    body = await (await test_client.get('/warehouse')).get_data(as_text=True)
+    assert "Деталь на primary" in body
+    assert "Деталь только в реплике" not in body
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import pytest
+from io import BytesIO
+from zipfile import ZipFile
+from models import async_session, Client, Order
+from reports import ReportRenderer, ReportQueueFull, render_work_report
+from tasks import runner
+
+
+# --- Рендеринг в память, без временных файлов ---
+
+def test_render_work_report_returns_docx_bytes():
+    data = render_work_report(7, "Иванов Иван", "Замена масла", 3500)
+    with ZipFile(BytesIO(data)) as docx:
+        xml = docx.read('word/document.xml').decode('utf-8')
+    assert "Заказ №: 7" in xml
+    assert "Итого к оплате: 3500 руб." in xml
+
+
+# --- Ограниченная очередь отклоняет лишние задачи сразу ---
+
+@pytest.mark.asyncio
+async def test_renderer_rejects_when_queue_is_full():
+    renderer = ReportRenderer(kind='thread', workers=1, queue_size=1)
+    release = threading.Event()
+    try:
+        busy = [asyncio.ensure_future(renderer.submit(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(ReportQueueFull):
+            await renderer.submit(release.wait)
+        release.set()
+        await asyncio.gather(*busy)
+        assert renderer.pending == 0
+    finally:
+        release.set()
+        renderer.shutdown()
+
+
+# --- Отчёт собирается фоновой задачей, файл отдаётся по её номеру ---
+
+@pytest.mark.asyncio
+async def test_work_report_download(app_instance):
+    async with async_session() as s:
+        client = Client(full_name="Петров Пётр", phone="+70000000001")
+        s.add(client)
+        await s.flush()
+        order = Order(client_id=client.id, status='new')
+        s.add(order)
+        await s.commit()
+        order_id = order.id
+
+    test_client = app_instance.test_client()
+    async with test_client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['user_role'] = 'master'
+
+    response = await test_client.post(
+        f'/worker_orders/report/{order_id}',
+        form={'work_description': 'Диагностика', 'total_cost': '1200', 'action': 'download'},
+    )
+    assert response.status_code == 302
+    job_url = response.headers['Location']
+    job_id = int(job_url.rstrip('/').rsplit('/', 1)[1])
+
+    status = await (await test_client.get(f'/jobs/{job_id}/status')).get_json()
+    assert status['status'] == 'queued'
+
+    while await runner.run_next('reports'):
+        pass
+
+    status = await (await test_client.get(f'/jobs/{job_id}/status')).get_json()
+    assert status['status'] == 'done'
+    response = await test_client.get(status['result_url'])
+    assert response.status_code == 200
+    assert 'attachment' in response.headers['Content-Disposition']
+    data = await response.get_data()
+    assert data[:2] == b'PK'
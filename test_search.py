@@ -0,0 +1,82 @@
+import itertools
+import pytest
+from models import async_session, Client, Car, Order
+from routes import create_client
+from search import search
+
+_seq = itertools.count(1)
+
+
+async def add_client_with_car(name: str, phone: str, vin: str):
+    client = await create_client(name, phone, email=f'{vin.lower()}@example.ru')
+    async with async_session() as s:
+        s.add(Car(client_id=client.id, make='Лада', model='Веста', year=2021, vin=vin))
+        s.add(Order(client_id=client.id, user_id=1, status='new',
+                    description=f'Замена тормозных колодок {vin}'))
+        await s.commit()
+    return client
+
+
+# --- Префиксный поиск по всем трём сущностям, индекс следит за изменениями ---
+
+@pytest.mark.asyncio
+async def test_search_clients_cars_orders():
+    n = next(_seq)
+    vin = f'XTA{n:014d}'
+    client = await add_client_with_car(f'Поисковый Тимофей {n}', f'+7 (912) 555-{n:02d}-{n:02d}', vin)
+
+    results, _ = await search('поисков тимоф')
+    assert ('client', client.id) in {(r['kind'], r['id']) for r in results}
+
+    results, _ = await search(f'912555{n:02d}', kinds=('client',))
+    assert [r['id'] for r in results] == [client.id]
+
+    results, _ = await search(vin[:10].lower(), kinds=('car',))
+    assert [r['client_id'] for r in results] == [client.id]
+
+    results, _ = await search(f'тормозн {vin}', kinds=('order',))
+    assert [r['client_id'] for r in results] == [client.id]
+
+    async with async_session() as s:
+        row = await s.get(Client, client.id)
+        row.full_name = f'Переименованный {n}'
+        await s.commit()
+    assert not [r for r in (await search('поисковый тимофей', kinds=('client',)))[0]
+                if r['id'] == client.id]
+    assert [r['id'] for r in (await search(f'переименованный {n}', kinds=('client',)))[0]] == [client.id]
+
+
+@pytest.mark.asyncio
+async def test_search_pagination_and_short_queries():
+    tag = f'Пагинов{next(_seq)}'
+    for i in range(5):
+        await create_client(f'{tag} Клиент {i}', f'+7000111{i:04d}')
+
+    first, next_offset = await search(tag, kinds=('client',), limit=3)
+    assert len(first) == 3 and next_offset == 3
+    rest, next_offset = await search(tag, kinds=('client',), limit=3, offset=next_offset)
+    assert len(rest) == 2 and next_offset is None
+    assert not {r['id'] for r in first} & {r['id'] for r in rest}
+
+    assert await search('а') == ([], None)
+
+
+@pytest.mark.asyncio
+async def test_typeahead_endpoint(app_instance):
+    n = next(_seq)
+    client = await create_client(f'Подсказкин Олег {n}', f'+7999222{n:04d}')
+    test_client = app_instance.test_client()
+
+    response = await test_client.get('/search/typeahead', query_string={'kind': 'client', 'q': 'подсказкин'})
+    assert response.status_code == 401
+
+    async with test_client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['user_role'] = 'manager'
+    response = await test_client.get('/search/typeahead', query_string={'kind': 'client', 'q': 'подсказкин'})
+    data = await response.get_json()
+    assert client.id in [item['id'] for item in data['results']]
+
+    page = (await (await test_client.get('/add_order')).get_data()).decode('utf-8')
+    assert 'data-typeahead' in page
+    assert f'Подсказкин Олег {n}' not in page
@@ -0,0 +1,9 @@
+from bench_startup import measure_once
+
+
+# --- Тяжёлые зависимости не загружаются при старте воркера ---
+
+def test_heavy_modules_are_lazy():
+    sample = measure_once()
+    assert sample['loaded'] == []
+    assert sample['rss_mb'] > 0
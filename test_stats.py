@@ -0,0 +1,102 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import select, func, update
+from models import async_session, Client, User, Order, Part, StockMovement, order_part
+import stats
+import inventory
+import workflow
+from routes import create_client, create_part, create_order, create_user
+
+
+async def scanned_stats():
+    # Эталон: те же цифры полными сканированиями
+    async with async_session() as s:
+        return {
+            'clients_count': await s.scalar(select(func.count(Client.id))) or 0,
+            'users_count': await s.scalar(select(func.count(User.id)).where(User.role != 'client')) or 0,
+            'parts_count': await s.scalar(select(func.sum(StockMovement.quantity))) or 0,  # после compact()
+            'orders_count': await s.scalar(select(func.count(Order.id))) or 0,
+        }
+
+
+# --- Счётчики совпадают с полным пересчётом после записей ---
+
+@pytest.mark.asyncio
+async def test_counters_follow_writes(monkeypatch):
+    monkeypatch.setattr(stats.Config, 'STATS_CACHE_TTL', 0)
+    await inventory.compact()
+    async with async_session() as s:
+        await stats.rebuild(s)
+        await s.commit()
+    before = await stats.get_dashboard_stats()
+
+    client = await create_client("Сидоров Сидор", "+70000000002")
+    await create_user("Мастер Счётчиков", "counter-master@test.ru", "+7", "pw", role='master')
+    part = await create_part("Ремень ГРМ", 900, 4)
+    await create_order(client.id, 1, "Замена ремня", [str(part.id), str(part.id)])
+    # Счётчик parts_stock двигает свёртка, а не сам заказ
+    await inventory.compact()
+
+    after = await stats.get_dashboard_stats()
+    assert after['clients_count'] == before['clients_count'] + 1
+    assert after['users_count'] == before['users_count'] + 1
+    assert after['parts_count'] == before['parts_count'] + 2
+    assert after['orders_count'] == before['orders_count'] + 1
+    assert after['orders_by_status']['new'] == before['orders_by_status']['new'] + 1
+    assert after['orders_by_day'][0][2] >= 1
+
+    scanned = await scanned_stats()
+    assert {k: after[k] for k in scanned} == scanned
+
+
+# --- Цена фиксируется в заказе, выручка копится в rollup ---
+
+@pytest.mark.asyncio
+async def test_order_total_and_revenue_rollup(monkeypatch):
+    monkeypatch.setattr(stats.Config, 'STATS_CACHE_TTL', 0)
+    client = await create_client("Выручкин Влад", "+70000000004")
+    oil = await create_part("Масло моторное", 700, 10)
+    filt = await create_part("Фильтр масляный", 350, 10)
+    before = await stats.get_dashboard_stats()
+
+    order = await create_order(client.id, 1, "ТО", [str(oil.id), str(oil.id), str(filt.id)])
+    assert (order.total, order.parts_count) == (1750, 3)
+    async with async_session() as s:
+        await s.execute(update(Part).where(Part.id == oil.id).values(price=900))
+        await s.commit()
+        prices = dict((await s.execute(
+            select(order_part.c.part_id, order_part.c.unit_price).where(order_part.c.order_id == order.id)
+        )).all())
+    assert prices == {oil.id: 700, filt.id: 350}
+
+    # Новый заказ в выручку не входит, в расход запчастей — да
+    created = await stats.get_dashboard_stats()
+    assert created['revenue_period'] == before['revenue_period']
+    assert created['revenue_by_month'][0][3] == before['revenue_by_month'][0][3] + 3
+
+    await workflow.change_status(order.id, 'in_progress', 1, 'admin')
+    await workflow.change_status(order.id, 'completed', 1, 'admin')
+    after = await stats.get_dashboard_stats()
+    assert after['revenue_period'] == before['revenue_period'] + 1750
+    assert after['revenue_by_month'][0][1] == before['revenue_by_month'][0][1] + 1750
+    assert after['revenue_by_month'][0][2] == before['revenue_by_month'][0][2] + 1
+    assert after['revenue_by_month'][0][0] == stats.month_start(datetime.utcnow().date())
+
+    # Инкрементальный rollup совпадает с полным пересчётом
+    async with async_session() as s:
+        await stats.rebuild(s)
+        await s.commit()
+    assert (await stats.get_dashboard_stats())['revenue_by_month'] == after['revenue_by_month']
+
+
+# --- Повторные обращения в пределах TTL не ходят в базу ---
+
+@pytest.mark.asyncio
+async def test_dashboard_cache(monkeypatch):
+    monkeypatch.setattr(stats.Config, 'STATS_CACHE_TTL', 60)
+    stats.invalidate_cache()
+    first = await stats.get_dashboard_stats()
+    await create_client("Кэшев Кэш", "+70000000003")
+    assert await stats.get_dashboard_stats() is first
+    stats.invalidate_cache()
+    assert (await stats.get_dashboard_stats())['clients_count'] == first['clients_count'] + 1
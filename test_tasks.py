@@ -0,0 +1,164 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from models import async_session, Job
+from tasks import task, enqueue, get_job, runner, Result, TaskQueueFull
+from config import Config
+import events
+
+CALLS = []
+
+
+@task('test')
+async def echo_task(value: str):
+    CALLS.append(value)
+    return Result(value.encode('utf-8'), 'echo.txt', 'text/plain')
+
+
+@task('test', max_attempts=2)
+async def flaky_task(fail_times: int, key: str):
+    CALLS.append(key)
+    if CALLS.count(key) <= fail_times:
+        raise RuntimeError('сбой')
+
+
+@task('test')
+async def slow_task(delay: float):
+    await asyncio.sleep(delay)
+    return Result(b'slow', 'slow.txt', 'text/plain')
+
+
+async def drain(queue: str = 'test'):
+    while await runner.run_next(queue):
+        pass
+
+
+async def make_ready(job_id: int):
+    # Снимаем паузу перед повтором, чтобы не ждать backoff
+    async with async_session() as s:
+        await s.execute(update(Job).where(Job.id == job_id).values(run_after=datetime.utcnow()))
+        await s.commit()
+
+
+@pytest.mark.asyncio
+async def test_job_result_and_event():
+    await drain()
+    with events.broker.subscribe(events.viewer_filter('master', 42)) as mine, \
+            events.broker.subscribe(events.viewer_filter('admin', 1)) as other:
+        job_id = await enqueue('echo_task', user_id=42, value='привет')
+        assert (await get_job(job_id)).status == 'queued'
+        await drain()
+
+        job = await get_job(job_id, with_result=True)
+        assert job.status == 'done'
+        assert job.result.decode('utf-8') == 'привет'
+        assert job.result_name == 'echo.txt'
+
+        event = await asyncio.wait_for(mine.get(), timeout=1)
+        assert event['job']['id'] == job_id and event['job']['status'] == 'done'
+        # Чужие задачи не видны даже администратору
+        assert other.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_retry_then_fail():
+    await drain()
+    job_id = await enqueue('flaky_task', fail_times=1, key='retry-once')
+    await drain()
+    job = await get_job(job_id)
+    assert job.status == 'queued' and job.attempts == 1 and job.error == 'сбой'
+
+    await make_ready(job_id)
+    await drain()
+    assert (await get_job(job_id)).status == 'done'
+
+    job_id = await enqueue('flaky_task', fail_times=5, key='always')
+    await drain()
+    await make_ready(job_id)
+    await drain()
+    job = await get_job(job_id)
+    assert job.status == 'failed' and job.attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_picked_up_again():
+    # Воркер взял задачу и умер: после конца аренды её выполнит другой
+    await drain()
+    job_id = await enqueue('echo_task', value='после перезапуска')
+    async with async_session() as s:
+        await s.execute(update(Job).where(Job.id == job_id).values(
+            status='running', attempts=1, run_after=datetime.utcnow() - timedelta(seconds=1)))
+        await s.commit()
+    await drain()
+    job = await get_job(job_id)
+    assert job.status == 'done' and job.attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_lease_renewed_while_running():
+    # Задача дольше аренды: аренда продлевается, второй воркер её не берёт
+    await drain()
+    local = type(runner)({'test': 1}, lease=0.3)
+    job_id = await enqueue('slow_task', delay=1)
+    running = asyncio.create_task(local.run_next('test'))
+    await asyncio.sleep(0.6)
+    assert await type(runner)({'test': 1}, lease=0.3)._claim('test') is None
+    assert await running
+    job = await get_job(job_id)
+    assert job.status == 'done' and job.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_result_is_dropped():
+    # Аренду перехватили: результат первого воркера не перезаписывает задачу
+    await drain()
+    local = type(runner)({'test': 1}, lease=60)
+    job_id = await enqueue('slow_task', delay=0.3)
+    running = asyncio.create_task(local.run_next('test'))
+    await asyncio.sleep(0.1)
+    async with async_session() as s:
+        await s.execute(update(Job).where(Job.id == job_id).values(attempts=Job.attempts + 1))
+        await s.commit()
+    await running
+    job = await get_job(job_id, with_result=True)
+    assert job.status == 'running' and job.attempts == 2 and job.result is None
+
+
+@pytest.mark.asyncio
+async def test_queue_limit(monkeypatch):
+    await drain()
+    monkeypatch.setattr(Config, 'TASK_QUEUE_LIMIT', 2)
+    await enqueue('echo_task', value='1')
+    await enqueue('echo_task', value='2')
+    with pytest.raises(TaskQueueFull):
+        await enqueue('echo_task', value='3')
+    await drain()
+
+
+@pytest.mark.asyncio
+async def test_runner_processes_in_background():
+    local = type(runner)({'test': 2}, poll_interval=1)
+    await local.start()
+    try:
+        job_id = await enqueue('echo_task', value='фон')
+        local.notify('test')
+        for _ in range(100):
+            if (await get_job(job_id)).status == 'done':
+                break
+            await asyncio.sleep(0.05)
+        assert (await get_job(job_id)).status == 'done'
+    finally:
+        await local.stop()
+
+
+@pytest.mark.asyncio
+async def test_job_status_is_private(app_instance):
+    job_id = await enqueue('echo_task', user_id=1, value='чужое')
+    test_client = app_instance.test_client()
+    async with test_client.session_transaction() as sess:
+        sess['user_id'] = 2
+        sess['user_role'] = 'master'
+    response = await test_client.get(f'/jobs/{job_id}/status')
+    assert response.status_code == 404
+    await drain()
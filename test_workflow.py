@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from sqlalchemy import select, func
+from models import async_session, Order, StatCounter
+from routes import create_client, create_order, create_user, get_worker_orders
+from workflow import claim_next, change_status, assign_order, InvalidTransition
+
+
+async def free_orders() -> int:
+    async with async_session() as s:
+        return await s.scalar(select(func.count(Order.id))
+                              .where(Order.status == 'new', Order.assignee_id.is_(None)))
+
+
+async def counter(name: str) -> int:
+    async with async_session() as s:
+        return await s.scalar(select(StatCounter.value).where(StatCounter.name == name)) or 0
+
+
+# --- Параллельные мастера не берут один заказ дважды ---
+
+@pytest.mark.asyncio
+async def test_concurrent_claims_are_unique():
+    client = await create_client('Очередь Клиентов', '+70000000333')
+    mine = [(await create_order(client.id, 1, f'Очередь {i}', [])).id for i in range(5)]
+    masters = [await create_user(f'Мастер {i}', f'queue-master-{i}-{mine[0]}@test.ru', '+7', 'pw', role='master')
+               for i in range(3)]
+
+    attempts = await free_orders() + 3
+    claimed = await asyncio.gather(*(claim_next(masters[i % 3].id) for i in range(attempts)))
+
+    ids = [row.id for row in claimed if row is not None]
+    assert len(ids) == len(set(ids)) == attempts - 3
+    assert set(mine) <= set(ids)
+    assert all(row.status == 'in_progress' for row in claimed if row is not None)
+    assert await claim_next(masters[0].id) is None
+
+    # Очередь мастера — только его заказы
+    own = {row.id for row in claimed if row is not None and row.assignee_id == masters[0].id}
+    orders, _ = await get_worker_orders(masters[0].id, limit=200)
+    assert {o.id for o in orders} == own
+
+
+# --- Переходы статусов ---
+
+@pytest.mark.asyncio
+async def test_status_transitions():
+    client = await create_client('Статусный Клиент', '+70000000444')
+    order = await create_order(client.id, 1, 'Переходы', [])
+    master = await create_user('Мастер Статусов', f'status-master-{order.id}@test.ru', '+7', 'pw', role='master')
+    other = await create_user('Чужой Мастер', f'other-master-{order.id}@test.ru', '+7', 'pw', role='master')
+    in_progress = await counter('status:in_progress')
+
+    with pytest.raises(InvalidTransition):
+        await change_status(order.id, 'completed', master.id, 'master')
+
+    # Назначить можно только существующего мастера
+    customer = await create_user('Не Мастер', f'not-master-{order.id}@test.ru', '+7', 'pw')
+    for wrong_id in (customer.id, 10 ** 9):
+        with pytest.raises(InvalidTransition):
+            await assign_order(order.id, wrong_id)
+
+    await assign_order(order.id, master.id)
+    with pytest.raises(InvalidTransition):
+        await change_status(order.id, 'in_progress', other.id, 'master')
+
+    row = await change_status(order.id, 'in_progress', master.id, 'master')
+    assert (row.status, row.assignee_id) == ('in_progress', master.id)
+    assert await counter('status:in_progress') == in_progress + 1
+
+    with pytest.raises(InvalidTransition):
+        await assign_order(order.id, other.id)
+
+    await change_status(order.id, 'completed', master.id, 'master')
+    with pytest.raises(InvalidTransition):
+        await change_status(order.id, 'cancelled', master.id, 'admin')
+    assert await counter('status:in_progress') == in_progress
+
+
+@pytest.mark.asyncio
+async def test_worker_page_claims_for_master(app_instance):
+    client = await create_client('Страничный Клиент', '+70000000666')
+    await create_order(client.id, 1, 'Для кнопки', [])
+    master = await create_user('Мастер Кнопкин', 'button-master@test.ru', '+7', 'pw', role='master')
+
+    test_client = app_instance.test_client()
+    async with test_client.session_transaction() as sess:
+        sess['user_id'] = master.id
+        sess['user_role'] = 'master'
+    assert (await test_client.post('/worker_orders/claim')).status_code == 302
+
+    html = (await (await test_client.get('/worker_orders')).get_data()).decode('utf-8')
+    assert 'Взять следующий заказ' in html
+    assert 'value="completed"' in html
@@ -0,0 +1,118 @@
+# workflow.py
+# Назначение заказов мастерам и смена статусов.
+# Каждая операция — один условный UPDATE ... RETURNING: переход применяется,
+# только если заказ всё ещё в ожидаемом состоянии, поэтому два мастера
+# не возьмут один заказ и не перепишут статус друг другу.
+# "Взять следующий" на Postgres выбирает строку через FOR UPDATE SKIP LOCKED:
+# параллельные мастера не ждут друг друга, а берут следующие заказы очереди.
+# SQLite выполняет запись под блокировкой всей базы, там хватает условия в UPDATE.
+# Отмена заказа возвращает его запчасти на склад (inventory.py).
+from sqlalchemy import select, update
+from models import writer, Order, User, Client, ORDER_TRANSITIONS
+from stats import record_status_change
+import events
+import inventory
+
+MANAGER_ROLES = ('admin', 'manager')
+
+_RETURNING = (Order.id, Order.client_id, Order.user_id, Order.assignee_id,
+              Order.status, Order.created_at, Order.description, Order.total, Order.parts_count)
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def allowed_transitions(status: str) -> tuple:
+    return ORDER_TRANSITIONS.get(status, ())
+
+
+async def _client_name(s, row):
+    return await s.scalar(select(Client.full_name).where(Client.id == row.client_id))
+
+
+async def claim_next(master_id: int):
+    # Самый старый свободный новый заказ -> мастеру, статус in_progress.
+    # None, если очередь пуста.
+    async with writer() as s:
+        candidate = (
+            select(Order.id)
+            .where(Order.status == 'new', Order.assignee_id.is_(None))
+            .order_by(Order.created_at, Order.id)
+            .limit(1)
+        )
+        if s.get_bind().dialect.name != 'sqlite':
+            candidate = candidate.with_for_update(skip_locked=True)
+        row = (await s.execute(
+            update(Order)
+            .where(Order.id == candidate.scalar_subquery(),
+                   Order.status == 'new', Order.assignee_id.is_(None))
+            .values(assignee_id=master_id, status='in_progress')
+            .returning(*_RETURNING)
+            .execution_options(synchronize_session=False)
+        )).first()
+        if row is None:
+            return None
+        await record_status_change(s, row, 'new', 'in_progress')
+        client_name = await _client_name(s, row)
+        await s.commit()
+    # Имя клиента — чтобы строка появилась в открытом списке мастера целиком
+    await events.order_status_changed(row, 'new', client_name)
+    return row
+
+
+async def assign_order(order_id: int, master_id: int):
+    # Менеджер назначает мастера на ещё не начатый заказ
+    async with writer() as s:
+        role = await s.scalar(select(User.role).where(User.id == master_id))
+        if role != 'master':
+            raise InvalidTransition("Назначить можно только мастера.")
+        row = (await s.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.status == 'new')
+            .values(assignee_id=master_id)
+            .returning(*_RETURNING)
+            .execution_options(synchronize_session=False)
+        )).first()
+        if row is None:
+            raise InvalidTransition("Назначить мастера можно только на новый заказ.")
+        client_name = await _client_name(s, row)
+        await s.commit()
+    await events.order_status_changed(row, row.status, client_name)
+    return row
+
+
+async def change_status(order_id: int, new_status: str, user_id: int, role: str):
+    async with writer() as s:
+        current = (await s.execute(
+            select(Order.status, Order.assignee_id).where(Order.id == order_id)
+        )).first()
+        if current is None:
+            raise InvalidTransition("Заказ не найден.")
+        old_status, assignee_id = current
+        if new_status not in allowed_transitions(old_status):
+            raise InvalidTransition(f"Нельзя перевести заказ из «{old_status}» в «{new_status}».")
+        if role not in MANAGER_ROLES and assignee_id not in (None, user_id):
+            raise InvalidTransition("Заказ ведёт другой мастер.")
+
+        values = {'status': new_status}
+        if old_status == 'new' and new_status == 'in_progress' and assignee_id is None:
+            values['assignee_id'] = user_id
+        # Условие на старый статус: параллельное изменение не перетрётся
+        row = (await s.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.status == old_status)
+            .values(**values)
+            .returning(*_RETURNING)
+            .execution_options(synchronize_session=False)
+        )).first()
+        if row is None:
+            raise InvalidTransition("Статус заказа уже изменили, обновите страницу.")
+        if new_status == 'cancelled':
+            # Зарезервированные запчасти возвращаются на склад движением 'return'.
+            # До счётчиков: create_order тоже берёт блокировки запчастей раньше них
+            await inventory.return_order_parts(s, order_id)
+        await record_status_change(s, row, old_status, new_status)
+        await s.commit()
+    await events.order_status_changed(row, old_status)
+    return row